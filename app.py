@@ -7,12 +7,25 @@ It processes comments and returns sentiment predictions (positive, neutral, or n
 
 import os
 import sys
+import json
+import asyncio
+import time
+import queue
+import heapq
+import codecs
 import pickle
+import random
+import threading
+import zlib
+import hmac
 import logging
 import numpy as np
-from fastapi import FastAPI, HTTPException
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import Dict
+from typing import Dict, List, Optional
 import mlflow
 import mlflow.pyfunc
 from dotenv import load_dotenv
@@ -29,7 +42,11 @@ os.environ['AWS_DEFAULT_REGION'] = os.getenv('AWS_DEFAULT_REGION')
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import the preprocessing function
-from data_handling.data_preprocessing import process_comment_for_api
+from data_handling.data_preprocessing import extract_features_fused, featurize_comments, is_trivial_comment
+from model_creation.compiled_predictor import CompiledLGBMPredictor, compile_model, file_sha256
+from model_creation.calibration import TemperatureCalibrator
+from utilities.constants import (SENTIMENT_MAP, SENTIMENT_LABELS, PROBABILITY_LABELS,
+                                 PROBABILITY_SENTIMENTS, TRIVIAL_PROBABILITIES)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -46,21 +63,14 @@ app = FastAPI(
 local_model = None  # Model from local pickle file
 mlflow_model = None  # Model from MLflow registry
 vectorizer = None
-
-# Sentiment mapping
-# Model output: 0=neutral, 1=positive, 2=negative
-# API output: 0=neutral, 1=positive, -1=negative
-SENTIMENT_MAP = {
-    0: 0,   # neutral
-    1: 1,   # positive
-    2: -1   # negative
-}
-
-SENTIMENT_LABELS = {
-    0: "neutral",
-    1: "positive",
-    -1: "negative"
-}
+shadow_scorer = None  # Candidate model scored off the critical path (optional)
+model_pool = None  # Resident model versions behind /predict and /batch_predict
+calibrator = None  # Temperature scaling of the local model, fitted on the validation split (optional)
+mlflow_calibrator = None  # Calibration logged with the registry model's run (uncalibrated when absent)
+linear_model = None  # Fast tier of the cascade in front of the local model (optional)
+cascade_info = None  # Confidence threshold and TF-IDF width of the cascade
+linear_calibrator = None  # Temperature scaling of the linear model (cascade and linear fallback)
+fallback_linear_model = None  # Cheaper predictor used under overload (DEGRADED_PREDICTOR=linear)
 
 
 class CommentRequest(BaseModel):
@@ -70,12 +80,26 @@ class CommentRequest(BaseModel):
         description="The YouTube comment to analyze",
         example="This is an amazing video! I learned so much!"
     )
+    return_probabilities: bool = Field(
+        False,
+        description="Also return the calibrated probability of each sentiment and the confidence"
+    )
 
 
 class SentimentResponse(BaseModel):
     """Response model for sentiment prediction."""
     comment: str = Field(description="Original comment")
     sentiment: int = Field(description="Predicted sentiment (1=positive, 0=neutral, -1=negative)")
+    probabilities: Optional[Dict[str, float]] = Field(
+        None,
+        description="Calibrated probability per sentiment label (only with return_probabilities)"
+    )
+    confidence: Optional[float] = Field(
+        None,
+        description="Highest class probability; below CONFIDENCE_THRESHOLD the sentiment is neutral"
+    )
+    model_version: Optional[str] = Field(None, description="Model pool version that served the prediction")
+    degraded: bool = Field(False, description="Served by the cheaper fallback predictor because the API is overloaded")
 
 
 class BatchCommentRequest(BaseModel):
@@ -85,36 +109,330 @@ class BatchCommentRequest(BaseModel):
         description="List of YouTube comments to analyze",
         example=["This is an amazing video!", "Terrible content"]
     )
+    return_probabilities: bool = Field(
+        False,
+        description="Also return the calibrated probability of each sentiment and the confidence"
+    )
+
+
+class CompareRequest(BaseModel):
+    """Request model for scoring a batch with both models."""
+    comment: list[str] = Field(
+        ...,
+        description="List of YouTube comments to analyze",
+        example=["This is an amazing video!", "Terrible content"]
+    )
+    ensemble: bool = Field(
+        False,
+        description="Also return the soft-voting ensemble (average of both models' probabilities)"
+    )
+    return_probabilities: bool = Field(
+        False,
+        description="Also return the calibrated probabilities of each model"
+    )
+
+
+class CompareResult(BaseModel):
+    """Predictions of both models for one comment."""
+    comment: str = Field(description="Original comment")
+    local: int = Field(description="Sentiment predicted by the local model")
+    mlflow: int = Field(description="Sentiment predicted by the MLflow model")
+    ensemble: Optional[int] = Field(None, description="Sentiment of the soft-voting ensemble (only with ensemble)")
+    probabilities: Optional[Dict[str, Dict[str, float]]] = Field(
+        None,
+        description="Calibrated probabilities per model (only with return_probabilities)"
+    )
+
+
+class CompareResponse(BaseModel):
+    """Response model for scoring a batch with both models."""
+    results: List[CompareResult] = Field(description="Predictions in the order of the comments")
+    agreement_rate: float = Field(description="Share of model-scored comments on which both models agree")
+    n_scored: int = Field(description="Comments scored by the models (trivial comments are neutral for both)")
+
+
+class LoadVersionRequest(BaseModel):
+    """Request model for loading a model version into the pool."""
+    version: str = Field(..., description="Name of the version in the pool", example="v7")
+    model_uri: str = Field(
+        ...,
+        description="Pickle path under models/ or MLflow registry URI (models:/) of the model",
+        example="models:/yt_chrome_plugin_model/7"
+    )
+    vectorizer_path: Optional[str] = Field(
+        None,
+        description="Pickled vectorizer of the model under models/ (defaults to the shared vectorizer)"
+    )
+    calibration_path: Optional[str] = Field(
+        None,
+        description="Calibration of the model under models/ (none leaves its probabilities uncalibrated)"
+    )
+
+
+class TrafficRequest(BaseModel):
+    """Request model for shifting traffic to a canary version."""
+    canary: Optional[str] = Field(None, description="Canary version (null sends everything to stable)")
+    canary_percent: float = Field(0.0, description="Percentage of the traffic sent to the canary")
+
+
+class ExampleComment(BaseModel):
+    """One of the most confident comments of a sentiment."""
+    comment: str = Field(description="Comment (truncated to EXAMPLE_MAX_CHARS characters)")
+    confidence: float = Field(description="Calibrated probability of the predicted sentiment")
+
+
+class AggregateResponse(BaseModel):
+    """Response model for the per-video sentiment aggregate."""
+    total: int = Field(description="Number of comments received")
+    counts: Dict[str, int] = Field(description="Number of comments per sentiment label")
+    ratios: Dict[str, float] = Field(description="Share of comments per sentiment label")
+    top_examples: Optional[Dict[str, List[ExampleComment]]] = Field(
+        None,
+        description="Most confident comments per sentiment label (only with top_k > 0)"
+    )
+    degraded: bool = Field(False, description="Some chunks were scored by the fallback predictor under overload")
+
+
+# Compacted model/vectorizer pair produced by model_creation/model_compaction.py.
+# It only computes the TF-IDF columns the booster splits on. The MLflow model
+# expects the full feature layout, so it is disabled when the compact pair is used.
+USE_COMPACT_MODEL = os.getenv('USE_COMPACT_MODEL', 'false').lower() in ('1', 'true', 'yes')
+VECTORIZER_PATH = 'models/tfidf_vectorizer_compact.pkl' if USE_COMPACT_MODEL else 'models/tfidf_vectorizer.pkl'
+LOCAL_MODEL_PATH = 'models/lgbm_model_compact.pkl' if USE_COMPACT_MODEL else 'models/lgbm_model.pkl'
+
+# Inference backend for the local model:
+# - lightgbm: LGBMClassifier.predict (fastest for large batches)
+# - numpy: trees flattened into numpy arrays (no wrapper/C API overhead, fastest for single comments)
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'lightgbm').lower()
+COMPILED_MODEL_PATH = 'models/lgbm_model_compiled.npz'
+
+# Probability calibration produced by model_creation/calibration.py (used when present),
+# and the confidence under which the API abstains and returns neutral (0 disables it)
+CALIBRATION_PATH = 'models/calibration.json'
+CONFIDENCE_THRESHOLD = float(os.getenv('CONFIDENCE_THRESHOLD', '0'))
+
+# Two-tier cascade produced by model_creation/cascade.py: the linear model answers
+# when its confidence reaches the tuned threshold, the local model otherwise.
+# It reads the full TF-IDF layout, so it is disabled with the compact model.
+USE_CASCADE = os.getenv('USE_CASCADE', 'false').lower() in ('1', 'true', 'yes')
+LINEAR_MODEL_PATH = 'models/linear_model.pkl'
+CASCADE_PATH = 'models/cascade.json'
+
+# Overload control: past OVERLOAD_MAX_INFLIGHT requests in flight or a recent p95
+# latency over its endpoint's threshold on any endpoint, new requests are served by a
+# cheaper predictor (first DEGRADED_NUM_ITERATIONS boosting rounds, or the linear
+# model with DEGRADED_PREDICTOR=linear). Full quality resumes once both fall under
+# OVERLOAD_RECOVERY_RATIO of their threshold. Scoring runs in the threadpool, so
+# requests waiting for a worker count as in flight and their wait is part of the latency.
+# The p95 threshold is OVERLOAD_MAX_P95_MS, except for the endpoints listed in
+# OVERLOAD_ENDPOINT_MAX_P95_MS ("path=ms,path=ms"), whose requests score many comments.
+OVERLOAD_MAX_INFLIGHT = int(os.getenv('OVERLOAD_MAX_INFLIGHT', '32'))
+OVERLOAD_MAX_P95_MS = float(os.getenv('OVERLOAD_MAX_P95_MS', '500'))
+OVERLOAD_ENDPOINT_MAX_P95_MS = {
+    path.strip(): float(ms)
+    for path, _, ms in (item.partition('=') for item in os.getenv(
+        'OVERLOAD_ENDPOINT_MAX_P95_MS',
+        '/batch_predict=2000,/batch_predict_mlflow=2000,/compare_predict=2000,'
+        '/aggregate_predict=10000,/aggregate_predict_mlflow=10000'
+    ).split(',') if item.strip())
+}
+OVERLOAD_RECOVERY_RATIO = float(os.getenv('OVERLOAD_RECOVERY_RATIO', '0.5'))
+OVERLOAD_LATENCY_WINDOW = int(os.getenv('OVERLOAD_LATENCY_WINDOW', '200'))
+OVERLOAD_MIN_SAMPLES = int(os.getenv('OVERLOAD_MIN_SAMPLES', '20'))
+DEGRADED_PREDICTOR = os.getenv('DEGRADED_PREDICTOR', 'truncated').lower()
+DEGRADED_NUM_ITERATIONS = int(os.getenv('DEGRADED_NUM_ITERATIONS', '100'))
+
+
+class OverloadController:
+    """Switches new requests to the cheaper predictor while the API is overloaded.
+    
+    Load is the number of requests in flight and the p95 latency of the recent
+    requests, kept per endpoint so that a few large /aggregate_predict bodies do
+    not weigh on the /predict latency. Each endpoint's p95 is compared with its
+    own threshold (endpoint_max_p95_ms, else max_p95_ms), since a batch request
+    legitimately takes longer than a single comment, and only counts once it has
+    min_samples requests in its window. The thresholds have hysteresis: degraded
+    mode starts when either one is exceeded and ends when both are back under
+    OVERLOAD_RECOVERY_RATIO of their threshold, so the mode does not flap at the boundary.
+    """
+    
+    def __init__(self, max_inflight: int, max_p95_ms: float, recovery_ratio: float, window: int,
+                 min_samples: int = 20, endpoint_max_p95_ms: dict = None):
+        self.max_inflight = max_inflight
+        self.max_p95_ms = max_p95_ms
+        self.endpoint_max_p95_ms = endpoint_max_p95_ms or {}
+        self.recovery_ratio = recovery_ratio
+        self.window = window
+        self.min_samples = min_samples
+        self.latencies_ms = {}
+        self.inflight = 0
+        self.degraded = False
+        self.n_degraded_switches = 0
+    
+    def request_started(self) -> None:
+        self.inflight += 1
+        self._update()
+    
+    def request_finished(self, endpoint: str, latency_ms: float) -> None:
+        self.inflight -= 1
+        self.latencies_ms.setdefault(endpoint, deque(maxlen=self.window)).append(latency_ms)
+        self._update()
+    
+    def endpoint_p95_ms(self) -> dict:
+        """p95 latency of each endpoint with enough recent requests."""
+        return {endpoint: float(np.percentile(latencies, 95))
+                for endpoint, latencies in self.latencies_ms.items() if len(latencies) >= self.min_samples}
+    
+    def p95_ratio(self) -> float:
+        """Highest ratio of an endpoint's p95 latency to its threshold (above 1 is overloaded)."""
+        return max((p95_ms / self.endpoint_max_p95_ms.get(endpoint, self.max_p95_ms)
+                    for endpoint, p95_ms in self.endpoint_p95_ms().items()), default=0.0)
+    
+    def _update(self) -> None:
+        p95_ratio = self.p95_ratio()
+        if not self.degraded and (self.inflight > self.max_inflight or p95_ratio > 1):
+            self.degraded = True
+            self.n_degraded_switches += 1
+            logger.warning(f"Overload: {self.inflight} requests in flight, p95 at {p95_ratio:.0%} of its threshold, "
+                           f"switching to the fallback predictor")
+        elif self.degraded and self.inflight <= self.max_inflight * self.recovery_ratio \
+                and p95_ratio <= self.recovery_ratio:
+            self.degraded = False
+            logger.info(f"Load back to normal ({self.inflight} in flight, p95 at {p95_ratio:.0%} of its threshold), "
+                        f"full-quality inference resumed")
+    
+    def stats(self) -> dict:
+        return {
+            "degraded": self.degraded,
+            "inflight": self.inflight,
+            "p95_ratio": self.p95_ratio(),
+            "endpoint_p95_ms": self.endpoint_p95_ms(),
+            "degraded_switches": self.n_degraded_switches
+        }
+
+
+overload_controller = OverloadController(OVERLOAD_MAX_INFLIGHT, OVERLOAD_MAX_P95_MS, OVERLOAD_RECOVERY_RATIO,
+                                         OVERLOAD_LATENCY_WINDOW, OVERLOAD_MIN_SAMPLES, OVERLOAD_ENDPOINT_MAX_P95_MS)
+
+
+@app.middleware("http")
+async def track_load(request: Request, call_next):
+    """Feed the in-flight count and latency of prediction requests to the overload controller."""
+    if request.method != "POST" or request.url.path.startswith("/admin"):
+        return await call_next(request)
+    
+    overload_controller.request_started()
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        overload_controller.request_finished(request.url.path, (time.perf_counter() - start) * 1000)
+
+
+def load_registry_calibrator(model_uri: str) -> Optional[TemperatureCalibrator]:
+    """Calibration logged as calibration.json in the run of a registry model, None when it has none.
+
+    models/calibration.json is fitted on the local model, which need not be the
+    registered version, so it is never applied to the registry model.
+    """
+    try:
+        run_id = mlflow.models.get_model_info(model_uri).run_id
+        calibration_file = mlflow.artifacts.download_artifacts(run_id=run_id, artifact_path='calibration.json')
+        registry_calibrator = TemperatureCalibrator.load(calibration_file)
+        logger.info(f"✓ MLflow model calibration loaded from run {run_id} (temperature {registry_calibrator.temperature:.3f})")
+        return registry_calibrator
+    except Exception as e:
+        logger.warning(f"No calibration logged with {model_uri} ({e}), MLflow model probabilities are uncalibrated")
+        return None
 
 
 def load_models_and_vectorizer():
     """Load both local and MLflow models along with the vectorizer.
     
     This function loads:
-    - Local model from pickle file (lgbm_model.pkl)
+    - Local model from pickle file (lgbm_model.pkl, or lgbm_model_compact.pkl)
     - MLflow model from Model Registry (staging alias)
     - TF-IDF vectorizer from local pickle file
     """
-    global local_model, mlflow_model, vectorizer
+    global local_model, mlflow_model, vectorizer, calibrator, linear_model, cascade_info, fallback_linear_model, linear_calibrator
+    global mlflow_calibrator
     
     # Load TF-IDF vectorizer (shared by both models)
     try:
-        with open('models/tfidf_vectorizer.pkl', 'rb') as f:
+        with open(VECTORIZER_PATH, 'rb') as f:
             vectorizer = pickle.load(f)
-        logger.info("✓ TF-IDF vectorizer loaded from models/tfidf_vectorizer.pkl")
+        logger.info(f"✓ TF-IDF vectorizer loaded from {VECTORIZER_PATH}")
     except Exception as e:
         logger.error(f"Error loading vectorizer: {e}")
         raise
     
+    # Load probability calibration of the local model
+    if os.path.exists(CALIBRATION_PATH):
+        calibrator = TemperatureCalibrator.load(CALIBRATION_PATH)
+        logger.info(f"✓ Probability calibration loaded from {CALIBRATION_PATH} (temperature {calibrator.temperature:.3f})")
+    else:
+        logger.warning(f"No calibration found at {CALIBRATION_PATH}, probabilities are uncalibrated")
+    
     # Load local model
     try:
-        with open('models/lgbm_model.pkl', 'rb') as f:
+        with open(LOCAL_MODEL_PATH, 'rb') as f:
             local_model = pickle.load(f)
-        logger.info("✓ Local model loaded from models/lgbm_model.pkl")
+        logger.info(f"✓ Local model loaded from {LOCAL_MODEL_PATH}")
+        
+        if INFERENCE_BACKEND == 'numpy':
+            # The exported arrays are only used if they were compiled from this lgbm_model.pkl,
+            # the compact model (or a stale export) is compiled on the fly
+            compiled_model = None
+            if not USE_COMPACT_MODEL and os.path.exists(COMPILED_MODEL_PATH):
+                compiled_model = CompiledLGBMPredictor.load(COMPILED_MODEL_PATH)
+                if compiled_model.source_model_hash != file_sha256(LOCAL_MODEL_PATH):
+                    logger.warning(f"{COMPILED_MODEL_PATH} was not compiled from {LOCAL_MODEL_PATH}, ignoring it")
+                    compiled_model = None
+            if compiled_model is not None:
+                local_model = compiled_model
+                logger.info(f"✓ Compiled numpy predictor loaded from {COMPILED_MODEL_PATH}")
+            else:
+                local_model = compile_model(local_model)
+                logger.info("✓ Local model compiled into a numpy predictor")
     except Exception as e:
         logger.error(f"Error loading local model: {e}")
         logger.warning("Local model endpoints will not be available")
     
+    # Temperature of the linear model, fitted by the cascade stage with the threshold
+    if (USE_CASCADE or DEGRADED_PREDICTOR == 'linear') and not USE_COMPACT_MODEL and os.path.exists(CASCADE_PATH):
+        with open(CASCADE_PATH, 'r') as f:
+            linear_calibrator = TemperatureCalibrator(json.load(f).get('linear_temperature', 1.0))
+        logger.info(f"✓ Linear model calibration loaded from {CASCADE_PATH} (temperature {linear_calibrator.temperature:.3f})")
+    
+    # Load the fast tier of the cascade
+    if USE_CASCADE and not USE_COMPACT_MODEL:
+        try:
+            with open(LINEAR_MODEL_PATH, 'rb') as f:
+                linear_model = pickle.load(f)
+            with open(CASCADE_PATH, 'r') as f:
+                cascade_info = json.load(f)
+            if cascade_info.get('budget_met') is False:
+                raise ValueError(f"the cascade stage found no threshold within the accuracy budget ({CASCADE_PATH})")
+            logger.info(f"✓ Cascade enabled: linear model from {LINEAR_MODEL_PATH}, threshold {cascade_info['threshold']:.2f}")
+        except Exception as e:
+            linear_model = None
+            logger.error(f"Error loading cascade: {e}")
+            logger.warning("Cascade disabled, every comment goes to the local model")
+    
+    # Load the linear fallback used under overload (it reads the full TF-IDF layout)
+    if DEGRADED_PREDICTOR == 'linear' and not USE_COMPACT_MODEL:
+        try:
+            with open(LINEAR_MODEL_PATH, 'rb') as f:
+                fallback_linear_model = pickle.load(f)
+            logger.info(f"✓ Overload fallback model loaded from {LINEAR_MODEL_PATH}")
+        except Exception as e:
+            logger.error(f"Error loading overload fallback model: {e}")
+            logger.warning(f"Overload fallback uses the first {DEGRADED_NUM_ITERATIONS} boosting rounds")
+    
+    if USE_COMPACT_MODEL:
+        logger.warning("Compact model in use, MLflow model endpoints will not be available")
+        return
+    
     # Load MLflow model
     try:
         logger.info("Loading model from MLflow Model Registry...")
@@ -143,6 +461,7 @@ def load_models_and_vectorizer():
         try:
             mlflow_model = mlflow.sklearn.load_model(f"models:/{model_name}/{model_version}")
             logger.info("✓ MLflow model loaded from Model Registry (staging)")
+            mlflow_calibrator = load_registry_calibrator(f"models:/{model_name}/{model_version}")
         except Exception as model_err:
             logger.error(f"Failed to load model {model_name}: {model_err}")
             # Fallback to local model
@@ -154,11 +473,327 @@ def load_models_and_vectorizer():
         logger.warning("MLflow model endpoints will not be available")
 
 
+# Shadow mode: a sampled fraction of the requests to a shadow-eligible version (see
+# ModelVersion) is scored again by that version's model alone and by a candidate model
+# in a background thread, using the same feature matrix, so the cascade's linear tier
+# never enters the comparison. The candidate must use the shared vectorizer (a models:/
+# URI or a local pickle path), so only versions on the shared vectorizer are eligible.
+SHADOW_MODEL_URI = os.getenv('SHADOW_MODEL_URI')
+SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', '0.1'))
+SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', '100'))
+SHADOW_LATENCY_WINDOW = 1000
+
+
+class ShadowScorer:
+    """Scores sampled feature matrices with the primary and a candidate model in a background thread.
+    
+    The primary sentiments are recomputed from the primary model itself rather
+    than taken from the response, which may come from the cascade's linear
+    tier or the overload fallback. ``submit`` never blocks: when the bounded
+    queue is full the matrix is dropped and counted, so the primary requests
+    do not wait on the candidate.
+    """
+    
+    def __init__(self, candidate, sample_rate: float, queue_size: int):
+        self.candidate = candidate
+        self.sample_rate = sample_rate
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.n_batches = 0
+        self.n_rows = 0
+        self.n_disagreements = 0
+        self.n_dropped = 0
+        self.n_errors = 0
+        self.latencies_ms = deque(maxlen=SHADOW_LATENCY_WINDOW)
+        self.worker = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+        self.worker.start()
+    
+    def submit(self, X, primary_model, primary_calibrator=None) -> None:
+        """Queue a sampled request's feature matrix with the model (and its calibrator) that served it."""
+        if random.random() >= self.sample_rate:
+            return
+        try:
+            self.queue.put_nowait((X, primary_model, primary_calibrator))
+        except queue.Full:
+            with self.lock:
+                self.n_dropped += 1
+    
+    def _run(self) -> None:
+        while True:
+            X, primary_model, primary_calibrator = self.queue.get()
+            try:
+                # Each model with its own calibration: the candidate has none
+                primary_sentiments, _ = decide_sentiments(predict_probabilities(X, primary_model, primary_calibrator))
+                start = time.perf_counter()
+                candidate_sentiments, _ = decide_sentiments(predict_probabilities(X, self.candidate))
+                latency_ms = (time.perf_counter() - start) * 1000
+                n_disagreements = sum(a != b for a, b in zip(primary_sentiments, candidate_sentiments))
+                with self.lock:
+                    self.n_batches += 1
+                    self.n_rows += len(primary_sentiments)
+                    self.n_disagreements += n_disagreements
+                    self.latencies_ms.append(latency_ms)
+            except Exception as e:
+                logger.error(f"Shadow scoring failed: {e}")
+                with self.lock:
+                    self.n_errors += 1
+            finally:
+                self.queue.task_done()
+    
+    def stats(self) -> dict:
+        with self.lock:
+            latencies = np.asarray(self.latencies_ms)
+            return {
+                "candidate": SHADOW_MODEL_URI,
+                "sample_rate": self.sample_rate,
+                "batches": self.n_batches,
+                "rows": self.n_rows,
+                "disagreement_rate": self.n_disagreements / self.n_rows if self.n_rows else None,
+                "latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+                "latency_p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else None,
+                "queued": self.queue.qsize(),
+                "dropped": self.n_dropped,
+                "errors": self.n_errors
+            }
+
+
+def load_shadow_model():
+    """Load the candidate model of SHADOW_MODEL_URI and start the shadow worker."""
+    global shadow_scorer
+    
+    if not SHADOW_MODEL_URI or SHADOW_SAMPLE_RATE <= 0:
+        return
+    
+    try:
+        if SHADOW_MODEL_URI.endswith('.pkl'):
+            with open(SHADOW_MODEL_URI, 'rb') as f:
+                candidate = pickle.load(f)
+        else:
+            mlflow.set_tracking_uri(os.getenv('MLFLOW_TRACKING_URI', 'http://3.29.129.159:5000'))
+            candidate = mlflow.sklearn.load_model(SHADOW_MODEL_URI)
+        shadow_scorer = ShadowScorer(candidate, SHADOW_SAMPLE_RATE, SHADOW_QUEUE_SIZE)
+        logger.info(f"✓ Shadow model loaded from {SHADOW_MODEL_URI} (sample rate {SHADOW_SAMPLE_RATE})")
+    except Exception as e:
+        logger.error(f"Error loading shadow model: {e}")
+        logger.warning("Shadow mode will not be available")
+
+
+def submit_shadow(X, model_to_use, calibrator_to_use=None) -> None:
+    """Hand a request of a shadow-eligible version over to the shadow scorer, if shadow mode is on."""
+    if shadow_scorer is not None:
+        shadow_scorer.submit(X, model_to_use, calibrator_to_use)
+
+
+# Model pool: the MODEL_POOL_SIZE most recently loaded versions stay resident
+# with their vectorizers. /predict and /batch_predict go to the stable version,
+# except CANARY percent of the traffic which goes to the canary version; the
+# /admin endpoints load versions, shift traffic, promote and roll back.
+# They are disabled unless ADMIN_TOKEN is set, and only load files under
+# MODELS_DIR or models:/ registry URIs (loading a pickle runs its code).
+MODEL_POOL_SIZE = int(os.getenv('MODEL_POOL_SIZE', '3'))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+MODELS_DIR = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+VERSION_LATENCY_WINDOW = 1000
+
+
+class ModelVersion:
+    """A resident model version with its vectorizer, calibrator and serving metrics.
+    
+    ``cascade`` puts the linear tier in front of the model; the cascade
+    threshold is tuned against one model, so only that version gets it.
+    ``shadow`` makes its requests eligible for shadow scoring, which needs the
+    shared vectorizer.
+    """
+    
+    def __init__(self, name: str, model, vectorizer, source: str, calibrator=None,
+                 cascade: bool = False, shadow: bool = False):
+        self.name = name
+        self.model = model
+        self.vectorizer = vectorizer
+        self.calibrator = calibrator
+        self.cascade = cascade
+        self.shadow = shadow
+        self.source = source
+        self.loaded_at = time.time()
+        self.n_requests = 0
+        self.n_errors = 0
+        self.latencies_ms = deque(maxlen=VERSION_LATENCY_WINDOW)
+    
+    def stats(self) -> dict:
+        latencies = np.asarray(self.latencies_ms)
+        return {
+            "source": self.source,
+            "calibrated": self.calibrator is not None,
+            "cascade": self.cascade,
+            "shadow": self.shadow,
+            "loaded_at": self.loaded_at,
+            "requests": self.n_requests,
+            "errors": self.n_errors,
+            "error_rate": self.n_errors / self.n_requests if self.n_requests else None,
+            "latency_p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "latency_p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else None
+        }
+
+
+class ModelPool:
+    """Resident model versions and the stable/canary traffic split.
+    
+    Routing only reads references to already loaded versions, so shifting
+    traffic, promoting or rolling back takes effect on the next request.
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = max(capacity, 2)
+        self.versions = OrderedDict()
+        self.stable = None
+        self.previous_stable = None
+        self.canary = None
+        self.canary_percent = 0.0
+    
+    def add(self, name: str, model, vectorizer, source: str, calibrator=None,
+            cascade: bool = False, shadow: bool = False) -> ModelVersion:
+        """Make a version resident, evicting the oldest versions that carry no traffic."""
+        version = ModelVersion(name, model, vectorizer, source, calibrator, cascade, shadow)
+        self.versions.pop(name, None)
+        self.versions[name] = version
+        if self.stable is None:
+            self.stable = name
+        
+        in_use = {self.stable, self.canary, self.previous_stable}
+        for old_name in list(self.versions):
+            if len(self.versions) <= self.capacity:
+                break
+            if old_name not in in_use:
+                del self.versions[old_name]
+                logger.info(f"Model version {old_name} evicted from the pool")
+        return version
+    
+    def route(self, client_id: str = None) -> ModelVersion:
+        """Version serving a request; with a client id the choice is sticky per client."""
+        if self.canary is not None and self.canary_percent > 0:
+            # crc32 spreads client ids uniformly over 0-99 and is stable across processes
+            draw = zlib.crc32(client_id.encode('utf-8')) % 100 if client_id else random.random() * 100
+            if draw < self.canary_percent:
+                return self.versions[self.canary]
+        return self.versions[self.stable]
+    
+    def stable_version(self) -> ModelVersion:
+        return self.versions[self.stable]
+    
+    def track(self, version: ModelVersion):
+        """Context manager recording the latency and errors of a request on a version."""
+        return _VersionTracker(version)
+    
+    def set_traffic(self, canary: Optional[str], canary_percent: float) -> None:
+        if canary is not None and canary not in self.versions:
+            raise ValueError(f"Model version {canary} is not loaded")
+        if not 0 <= canary_percent <= 100:
+            raise ValueError("canary_percent must be between 0 and 100")
+        self.canary = canary
+        self.canary_percent = canary_percent if canary is not None else 0.0
+    
+    def promote(self) -> None:
+        """Make the canary the stable version (the old stable stays resident for rollback)."""
+        if self.canary is None:
+            raise ValueError("No canary version to promote")
+        self.previous_stable, self.stable = self.stable, self.canary
+        self.canary, self.canary_percent = None, 0.0
+    
+    def rollback(self) -> None:
+        """Send all traffic back: drop the canary, or else return to the previous stable version."""
+        if self.canary is not None:
+            self.canary, self.canary_percent = None, 0.0
+        elif self.previous_stable is not None and self.previous_stable in self.versions:
+            self.stable, self.previous_stable = self.previous_stable, None
+        else:
+            raise ValueError("Nothing to roll back")
+    
+    def state(self) -> dict:
+        return {
+            "stable": self.stable,
+            "canary": self.canary,
+            "canary_percent": self.canary_percent,
+            "previous_stable": self.previous_stable,
+            "capacity": self.capacity,
+            "versions": {name: version.stats() for name, version in self.versions.items()}
+        }
+
+
+class _VersionTracker:
+    def __init__(self, version: ModelVersion):
+        self.version = version
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.version
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.version.n_requests += 1
+        if exc_type is not None:
+            self.version.n_errors += 1
+        else:
+            self.version.latencies_ms.append((time.perf_counter() - self.start) * 1000)
+        return False
+
+
+def resolve_model_file(path: str) -> str:
+    """Real path of a file under MODELS_DIR; anything outside it is rejected."""
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([real_path, MODELS_DIR]) != MODELS_DIR:
+        raise ValueError(f"{path} is not under {MODELS_DIR}")
+    return real_path
+
+
+def load_model_version(model_uri: str, vectorizer_path: Optional[str] = None,
+                       calibration_path: Optional[str] = None) -> tuple:
+    """Load a model version from a pickle under MODELS_DIR or an MLflow registry URI (models:/).
+    
+    Returns:
+        tuple: (model, vectorizer, calibrator); the shared vectorizer when
+            vectorizer_path is None, no calibrator when calibration_path is None
+    """
+    if model_uri.startswith('models:/'):
+        mlflow.set_tracking_uri(os.getenv('MLFLOW_TRACKING_URI', 'http://3.29.129.159:5000'))
+        model = mlflow.sklearn.load_model(model_uri)
+    else:
+        with open(resolve_model_file(model_uri), 'rb') as f:
+            model = pickle.load(f)
+    
+    version_vectorizer = vectorizer
+    if vectorizer_path:
+        with open(resolve_model_file(vectorizer_path), 'rb') as f:
+            version_vectorizer = pickle.load(f)
+    version_calibrator = TemperatureCalibrator.load(resolve_model_file(calibration_path)) if calibration_path else None
+    return model, version_vectorizer, version_calibrator
+
+
+def mlflow_model_version() -> ModelVersion:
+    """The registry model as a version outside the pool (shared vectorizer, no cascade or shadow)."""
+    return ModelVersion('mlflow', mlflow_model, vectorizer, 'registry', mlflow_calibrator)
+
+
+def init_model_pool():
+    """Start the model pool with the local model as the stable version."""
+    global model_pool
+    
+    if local_model is None or vectorizer is None:
+        logger.warning("Local model not loaded, the model pool is not available")
+        return
+    
+    model_pool = ModelPool(MODEL_POOL_SIZE)
+    # The cascade threshold was tuned against the local model
+    model_pool.add('local', local_model, vectorizer, LOCAL_MODEL_PATH, calibrator,
+                   cascade=linear_model is not None, shadow=True)
+    logger.info(f"✓ Model pool started with version 'local' (capacity {model_pool.capacity})")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Load models and vectorizer when the API starts."""
     logger.info("Starting YouTube Sentiment Analysis API...")
     load_models_and_vectorizer()
+    init_model_pool()
+    load_shadow_model()
     logger.info("API is ready to accept requests!")
 
 
@@ -177,6 +812,14 @@ async def root():
             "/batch_predict": "POST - Batch predictions (local model)",
             "/predict_mlflow": "POST - Single prediction (MLflow model)",
             "/batch_predict_mlflow": "POST - Batch predictions (MLflow model)",
+            "/compare_predict": "POST - Batch predictions of both models on one feature matrix, with agreement rate",
+            "/aggregate_predict": "POST - Per-video sentiment counts and ratios (local model)",
+            "/aggregate_predict_mlflow": "POST - Per-video sentiment counts and ratios (MLflow model)",
+            "/shadow_stats": "GET - Disagreement rate and latency of the shadow candidate model",
+            "/admin/models": "GET/POST - Resident model versions and their metrics / load a version",
+            "/admin/traffic": "POST - Send a share of /predict and /batch_predict traffic to a canary version",
+            "/admin/promote": "POST - Make the canary the stable version",
+            "/admin/rollback": "POST - Drop the canary or return to the previous stable version",
             "/health": "GET - Check API health status",
             "/docs": "GET - Interactive API documentation"
         }
@@ -189,30 +832,177 @@ async def health_check():
     return {
         "status": "healthy",
         "local_model_loaded": local_model is not None,
+        "inference_backend": INFERENCE_BACKEND,
         "mlflow_model_loaded": mlflow_model is not None,
-        "vectorizer_loaded": vectorizer is not None
+        "vectorizer_loaded": vectorizer is not None,
+        "calibration_loaded": calibrator is not None,
+        "mlflow_calibration_loaded": mlflow_calibrator is not None,
+        "shadow_mode": shadow_scorer is not None,
+        # Share of batch comments that were duplicates and not scored again
+        "batch_dedup_ratio": 1 - dedup_stats["unique"] / dedup_stats["comments"] if dedup_stats["comments"] else 0.0,
+        # Share of model-scored comments answered by the linear tier of the cascade
+        "cascade_enabled": linear_model is not None,
+        "overload": overload_controller.stats(),
+        "cascade_fast_fraction": cascade_stats["fast"] / cascade_stats["rows"] if cascade_stats["rows"] else None,
+        "stable_version": model_pool.stable if model_pool else None,
+        "canary_version": model_pool.canary if model_pool else None,
+        "confidence_threshold": CONFIDENCE_THRESHOLD
     }
 
 
-def make_prediction(comment_text: str, model_to_use):
+def predict_probabilities(X, model_to_use, calibrator_to_use=None) -> np.ndarray:
+    """Probabilities of a feature matrix, columns in PROBABILITY_LABELS order.
+    
+    They are temperature-scaled with calibrator_to_use, the calibrator fitted
+    for model_to_use (None leaves them uncalibrated). Columns are aligned by
+    sentiment label, so the outputs of models with a different classes_ order
+    can be compared and averaged.
+    """
+    proba = model_to_use.predict_proba(X)
+    if calibrator_to_use is not None:
+        proba = calibrator_to_use.transform(proba)
+    return align_probabilities(proba, model_to_use.classes_)
+
+
+def align_probabilities(proba: np.ndarray, classes) -> np.ndarray:
+    """Reorder predict_proba columns (model classes_ order) into PROBABILITY_LABELS order."""
+    columns = [PROBABILITY_LABELS.index(SENTIMENT_LABELS[SENTIMENT_MAP.get(int(label), 0)])
+               for label in classes]
+    aligned = np.zeros((proba.shape[0], len(PROBABILITY_LABELS)))
+    aligned[:, columns] = proba
+    return aligned
+
+
+def linear_probabilities(X, model_to_use) -> np.ndarray:
+    """Calibrated probabilities of a linear model (TF-IDF columns of X only), in PROBABILITY_LABELS order."""
+    proba = model_to_use.predict_proba(X[:, :len(model_to_use.coef_[0])])
+    if linear_calibrator is not None:
+        proba = linear_calibrator.transform(proba)
+    return align_probabilities(proba, model_to_use.classes_)
+
+
+def cascade_probabilities(X, model_to_use, calibrator_to_use=None) -> np.ndarray:
+    """Probabilities from the linear model where it is confident, from model_to_use elsewhere.
+    
+    Both tiers are temperature-scaled with their own calibrator, and the
+    threshold was tuned on the calibrated linear confidence. Rows whose linear
+    confidence is under it are scored by model_to_use alone.
+    """
+    proba = linear_probabilities(X, linear_model)
+    fast_mask = proba.max(axis=1) >= cascade_info['threshold']
+    if not fast_mask.all():
+        proba[~fast_mask] = predict_probabilities(X[~fast_mask], model_to_use, calibrator_to_use)
+    
+    with stats_lock:
+        cascade_stats["rows"] += len(fast_mask)
+        cascade_stats["fast"] += int(fast_mask.sum())
+    return proba
+
+
+def decide_sentiments(proba: np.ndarray) -> tuple:
+    """Sentiments of probability rows (PROBABILITY_LABELS order), neutral under CONFIDENCE_THRESHOLD.
+    
+    Returns:
+        tuple: (sentiments, probabilities) with one {label: probability} dict per row
+    """
+    best = proba.argmax(axis=1)
+    confidence = proba[np.arange(len(best)), best]
+    sentiments = [
+        PROBABILITY_SENTIMENTS[index] if conf >= CONFIDENCE_THRESHOLD else 0
+        for index, conf in zip(best, confidence)
+    ]
+    probabilities = [dict(zip(PROBABILITY_LABELS, row.tolist())) for row in proba]
+    return sentiments, probabilities
+
+
+# Running totals of the batch deduplication and of the cascade (exposed on /health),
+# updated from the threadpool workers
+dedup_stats = {"comments": 0, "unique": 0}
+cascade_stats = {"rows": 0, "fast": 0}
+stats_lock = threading.Lock()
+
+
+def record_dedup(n_comments: int, n_unique: int) -> None:
+    with stats_lock:
+        dedup_stats["comments"] += n_comments
+        dedup_stats["unique"] += n_unique
+
+
+def degraded_probabilities(X, model_to_use, calibrator_to_use=None, shared_vectorizer: bool = True) -> np.ndarray:
+    """Cheaper probabilities used under overload.
+    
+    The linear fallback model when DEGRADED_PREDICTOR=linear and it is loaded,
+    otherwise LightGBM with only the first DEGRADED_NUM_ITERATIONS boosting
+    rounds. The linear model reads the columns of the shared vectorizer, so
+    versions with their own vectorizer (shared_vectorizer False) always take
+    the truncated path. Backends without truncated prediction (the numpy
+    predictor) keep the full model. Probabilities are calibrated like in normal mode.
+    """
+    if DEGRADED_PREDICTOR == 'linear' and fallback_linear_model is not None and shared_vectorizer:
+        return linear_probabilities(X, fallback_linear_model)
+    if hasattr(model_to_use, 'booster_'):
+        proba = model_to_use.predict_proba(X, num_iteration=DEGRADED_NUM_ITERATIONS)
+        if calibrator_to_use is not None:
+            proba = calibrator_to_use.transform(proba)
+        return align_probabilities(proba, model_to_use.classes_)
+    return predict_probabilities(X, model_to_use, calibrator_to_use)
+
+
+def score_features(X, model_to_use, degraded: bool = False, calibrator_to_use=None, cascade: bool = False,
+                   shared_vectorizer: bool = True) -> tuple:
+    """Sentiments and calibrated probabilities for a feature matrix.
+    
+    A single predict_proba call gives both: the class is the argmax of the
+    probabilities (temperature scaling does not change it), and comments whose
+    highest probability is under CONFIDENCE_THRESHOLD are returned as neutral.
+    
+    Args:
+        X: Feature matrix (TF-IDF + numerical)
+        model_to_use: The model to use for prediction (local_model or mlflow_model)
+        degraded: Use the cheaper fallback predictor (overload)
+        calibrator_to_use: Calibrator of the model (None for uncalibrated probabilities)
+        cascade: Put the linear tier in front of the model (ModelVersion.cascade)
+        shared_vectorizer: X comes from the shared vectorizer (required by the linear fallback)
+        
+    Returns:
+        tuple: (sentiments, probabilities) with one {label: probability} dict per row
+    """
+    if degraded:
+        return decide_sentiments(degraded_probabilities(X, model_to_use, calibrator_to_use, shared_vectorizer))
+    if cascade and linear_model is not None:
+        return decide_sentiments(cascade_probabilities(X, model_to_use, calibrator_to_use))
+    return decide_sentiments(predict_probabilities(X, model_to_use, calibrator_to_use))
+
+
+def make_prediction(comment_text: str, model_to_use, vectorizer_to_use=None, degraded: bool = False,
+                    calibrator_to_use=None, cascade: bool = False, shadow: bool = False):
     """Helper function to make a sentiment prediction.
     
     Args:
         comment_text: The comment to analyze
         model_to_use: The model to use for prediction (local_model or mlflow_model)
+        vectorizer_to_use: Vectorizer of the model (defaults to the shared vectorizer)
+        degraded: Use the cheaper fallback predictor (overload)
+        calibrator_to_use: Calibrator of the model (None for uncalibrated probabilities)
+        cascade: Put the linear tier in front of the model (ModelVersion.cascade)
+        shadow: Hand the features over to the shadow scorer (ModelVersion.shadow)
         
     Returns:
-        Sentiment value (1, 0, or -1)
+        tuple: (sentiment, probabilities) with the sentiment value (1, 0, or -1)
+            and the calibrated probability of each sentiment label
     """
-    # Process the comment and extract features
-    features = process_comment_for_api(comment_text)
+    # Blank, emoji-only and URL-only comments are neutral, skip preprocessing and the model
+    if is_trivial_comment(comment_text):
+        return 0, dict(TRIVIAL_PROBABILITIES)
+    
+    # Extract the numerical features and the TF-IDF row in a single pass
+    features, tfidf_row = extract_features_fused(comment_text, vectorizer_to_use or vectorizer)
     
     # Check if cleaned comment is empty
-    if not features['clean_comment'] or features['clean_comment'].strip() == '':
-        return 0  # neutral for empty comments
+    if features['num_chars_cleaned'] == 0:
+        return 0, dict(TRIVIAL_PROBABILITIES)  # neutral for empty comments
     
-    # Transform the cleaned comment using TF-IDF vectorizer
-    tfidf_features = vectorizer.transform([features['clean_comment']]).toarray()
+    tfidf_features = tfidf_row.toarray()
     
     # Prepare numerical features in the same order as during training
     numerical_features = np.array([[
@@ -220,50 +1010,311 @@ def make_prediction(comment_text: str, model_to_use):
         features['num_stop_words'],
         features['num_chars'],
         features['num_chars_cleaned']
-    ]])
+    ]], dtype=tfidf_features.dtype)
     
     # Combine TF-IDF features with numerical features
     X = np.hstack([tfidf_features, numerical_features])
     
     # Make prediction
-    prediction = model_to_use.predict(X)[0]
-    
-    # Map prediction to sentiment (1=positive, 0=neutral, -1=negative)
-    sentiment = SENTIMENT_MAP.get(int(prediction), 0)
+    sentiments, probabilities = score_features(X, model_to_use, degraded, calibrator_to_use, cascade,
+                                               shared_vectorizer=(vectorizer_to_use or vectorizer) is vectorizer)
+    if shadow and not degraded:
+        submit_shadow(X, model_to_use, calibrator_to_use)
+    sentiment = sentiments[0]
     sentiment_label = SENTIMENT_LABELS.get(sentiment, "unknown")
     
     logger.info(f"Predicted sentiment: {sentiment_label} ({sentiment})")
     
-    return sentiment
+    return sentiment, probabilities[0]
 
 
+def make_batch_prediction(comments, model_to_use, vectorizer_to_use=None, degraded: bool = False,
+                          calibrator_to_use=None, cascade: bool = False, shadow: bool = False):
+    """Helper function to make sentiment predictions for a batch of comments.
+    
+    Identical comments are scored once: the batch is reduced to its unique
+    comments, featurized at once with a single model call, and the results are
+    scattered back to every position. Comments left out by featurize_comments
+    are neutral.
+    
+    Args:
+        comments: List of comments to analyze
+        model_to_use: The model to use for prediction (local_model or mlflow_model)
+        vectorizer_to_use: Vectorizer of the model (defaults to the shared vectorizer)
+        degraded: Use the cheaper fallback predictor (overload)
+        calibrator_to_use: Calibrator of the model (None for uncalibrated probabilities)
+        cascade: Put the linear tier in front of the model (ModelVersion.cascade)
+        shadow: Hand the features over to the shadow scorer (ModelVersion.shadow)
+        
+    Returns:
+        tuple: (sentiments, probabilities) in the order of comments, with the
+            sentiment values (1, 0, or -1) and the calibrated probabilities
+    """
+    # The exact text is the key: num_chars and word_count are computed on the raw
+    # comment, so any further normalization could change the prediction
+    unique_index = {}
+    inverse = [unique_index.setdefault(comment, len(unique_index)) for comment in comments]
+    unique_comments = list(unique_index)
+    record_dedup(len(comments), len(unique_comments))
+    
+    unique_sentiments = [0] * len(unique_comments)
+    unique_probabilities = [TRIVIAL_PROBABILITIES] * len(unique_comments)
+    positions, X = featurize_comments(unique_comments, vectorizer_to_use or vectorizer)
+    
+    if len(positions) > 0:
+        scored_sentiments, scored_probabilities = score_features(
+            X, model_to_use, degraded, calibrator_to_use, cascade, shared_vectorizer=(vectorizer_to_use or vectorizer) is vectorizer
+        )
+        if shadow and not degraded:
+            submit_shadow(X, model_to_use, calibrator_to_use)
+        for position, sentiment, proba in zip(positions, scored_sentiments, scored_probabilities):
+            unique_sentiments[position] = sentiment
+            unique_probabilities[position] = proba
+    
+    sentiments = [unique_sentiments[index] for index in inverse]
+    probabilities = [dict(unique_probabilities[index]) for index in inverse]
+    
+    logger.info(f"Predicted {len(comments)} comments ({len(unique_comments)} unique, {len(positions)} scored by the model)")
+    
+    return sentiments, probabilities
+
+
+def build_response(comment_text: str, sentiment: int, probabilities: dict, return_probabilities: bool,
+                   model_version: str = None, degraded: bool = False) -> SentimentResponse:
+    """SentimentResponse with the probabilities and confidence when they are requested."""
+    if not return_probabilities:
+        return SentimentResponse(comment=comment_text, sentiment=sentiment, model_version=model_version, degraded=degraded)
+    return SentimentResponse(
+        comment=comment_text,
+        sentiment=sentiment,
+        probabilities=probabilities,
+        confidence=max(probabilities.values()),
+        model_version=model_version,
+        degraded=degraded
+    )
+
+
+# Both models run on the same feature matrix in parallel (LightGBM releases the GIL)
+MODEL_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='model')
+
+
+async def compare_models(comments, models: dict, ensemble: bool = False) -> tuple:
+    """Featurize a batch once and score it with every model on the same matrix.
+    
+    Featurization and the model calls run in worker threads, the event loop
+    only awaits them.
+    
+    Args:
+        comments: List of comments to analyze
+        models: {name: ModelVersion} to score with, each with its own vectorizer and calibrator
+        ensemble: Add an 'ensemble' entry averaging the models' probabilities (soft voting)
+        
+    Returns:
+        tuple: ({name: (sentiments, probabilities)} in the order of comments,
+            agreement rate of the models on the model-scored comments, number of scored comments)
+    """
+    # One feature matrix per distinct vectorizer (the rows left out do not depend on it)
+    matrices = {}
+    for version in models.values():
+        if id(version.vectorizer) not in matrices:
+            positions, matrices[id(version.vectorizer)] = await run_in_threadpool(
+                featurize_comments, comments, version.vectorizer
+            )
+    
+    probas = {}
+    if len(positions) > 0:
+        loop = asyncio.get_running_loop()
+        scored = await asyncio.gather(*(
+            loop.run_in_executor(MODEL_EXECUTOR, predict_probabilities, matrices[id(version.vectorizer)],
+                                 version.model, version.calibrator)
+            for version in models.values()
+        ))
+        probas = dict(zip(models, scored))
+        if ensemble:
+            probas['ensemble'] = np.mean([probas[name] for name in models], axis=0)
+    
+    results = {}
+    for name in list(models) + (['ensemble'] if ensemble else []):
+        sentiments = [0] * len(comments)
+        probabilities = [dict(TRIVIAL_PROBABILITIES) for _ in comments]
+        if name in probas:
+            for position, sentiment, proba in zip(positions, *decide_sentiments(probas[name])):
+                sentiments[position] = sentiment
+                probabilities[position] = proba
+        results[name] = (sentiments, probabilities)
+    
+    agreement_rate = 1.0
+    if len(positions) > 0:
+        predicted = np.array([[results[name][0][position] for position in positions] for name in models])
+        agreement_rate = float((predicted == predicted[0]).all(axis=0).mean())
+    
+    logger.info(f"Compared {len(models)} models on {len(comments)} comments ({len(positions)} scored), agreement {agreement_rate:.3f}")
+    
+    return results, agreement_rate, len(positions)
+
+
+# Aggregate endpoints: comments are scored AGGREGATE_CHUNK_SIZE at a time, and
+# example comments are truncated so the response size does not grow with the input
+AGGREGATE_CHUNK_SIZE = int(os.getenv('AGGREGATE_CHUNK_SIZE', '500'))
+EXAMPLE_MAX_CHARS = 200
+MAX_TOP_K = 10
+
+
+class SentimentAggregator:
+    """Running class counts and the top-k most confident comments per sentiment.
+    
+    Chunks are folded in as they are scored, so only the counts and k
+    examples per label are kept, never the per-comment results.
+    """
+    
+    def __init__(self, top_k: int = 0):
+        self.top_k = top_k
+        self.total = 0
+        self.n_seen = 0
+        self.counts = {label: 0 for label in SENTIMENT_LABELS.values()}
+        self.heaps = {label: [] for label in SENTIMENT_LABELS.values()}
+    
+    def update(self, comments, sentiments, probabilities) -> None:
+        self.total += len(comments)
+        for comment, sentiment, proba in zip(comments, sentiments, probabilities):
+            label = SENTIMENT_LABELS[sentiment]
+            self.counts[label] += 1
+            self.n_seen += 1
+            if self.top_k > 0:
+                # Min-heap on the confidence, the position in the stream breaks ties (earlier comments win)
+                entry = (proba[label], -self.n_seen, comment[:EXAMPLE_MAX_CHARS])
+                heap = self.heaps[label]
+                if len(heap) < self.top_k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+    
+    def result(self) -> AggregateResponse:
+        ratios = {label: count / self.total if self.total else 0.0 for label, count in self.counts.items()}
+        top_examples = None
+        if self.top_k > 0:
+            top_examples = {
+                label: [ExampleComment(comment=comment, confidence=confidence)
+                        for confidence, _, comment in sorted(heap, reverse=True)]
+                for label, heap in self.heaps.items()
+            }
+        return AggregateResponse(total=self.total, counts=self.counts, ratios=ratios, top_examples=top_examples)
+
+
+def check_comment(value, index: int) -> str:
+    """A comment of an aggregate request; anything but a JSON string is rejected with 422."""
+    if not isinstance(value, str):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Comment {index} must be a JSON string, got {type(value).__name__}."
+        )
+    return value
+
+
+async def iter_comment_chunks(request: Request, chunk_size: int):
+    """Read the comments of an aggregate request in chunks of at most chunk_size.
+    
+    Two body formats are accepted:
+    - application/json: {"comment": [...]} (or a bare list), like /batch_predict
+    - application/x-ndjson: one JSON string per line, read as the body streams in
+    """
+    content_type = request.headers.get('content-type', '')
+    if content_type.startswith('application/json'):
+        payload = await request.json()
+        comments = payload.get('comment', []) if isinstance(payload, dict) else payload
+        if not isinstance(comments, list):
+            raise HTTPException(status_code=422, detail="Comments must be a JSON list of strings.")
+        for start in range(0, len(comments), chunk_size):
+            yield [check_comment(comment, start + i) for i, comment in enumerate(comments[start:start + chunk_size])]
+        return
+    
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer, chunk, n_comments = '', [], 0
+    async for data in request.stream():
+        buffer += decoder.decode(data)
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                chunk.append(check_comment(json.loads(line), n_comments))
+                n_comments += 1
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    buffer += decoder.decode(b'', final=True)
+    if buffer.strip():
+        chunk.append(check_comment(json.loads(buffer), n_comments))
+    if chunk:
+        yield chunk
+
+
+async def aggregate_comments(request: Request, version: ModelVersion, top_k: int) -> AggregateResponse:
+    """Score the streamed comments chunk by chunk with a model version and fold them into a SentimentAggregator."""
+    if not 0 <= top_k <= MAX_TOP_K:
+        raise ValueError(f"top_k must be between 0 and {MAX_TOP_K}")
+    
+    aggregator = SentimentAggregator(top_k)
+    degraded = False
+    async for comments in iter_comment_chunks(request, AGGREGATE_CHUNK_SIZE):
+        # Checked per chunk, so a long stream follows the load as it changes
+        chunk_degraded = overload_controller.degraded
+        sentiments, probabilities = await run_in_threadpool(
+            make_batch_prediction, comments, version.model, version.vectorizer, chunk_degraded, version.calibrator,
+            cascade=version.cascade, shadow=version.shadow
+        )
+        aggregator.update(comments, sentiments, probabilities)
+        degraded = degraded or chunk_degraded
+    
+    logger.info(f"Aggregated {aggregator.total} comments: {aggregator.counts}")
+    result = aggregator.result()
+    result.degraded = degraded
+    return result
+
+
+@app.get("/shadow_stats")
+async def get_shadow_stats():
+    """Disagreement rate and latency of the shadow candidate model against the versions it shadows."""
+    if shadow_scorer is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Shadow mode is off (set SHADOW_MODEL_URI and SHADOW_SAMPLE_RATE)."
+        )
+    return shadow_scorer.stats()
+
 @app.post("/predict", response_model=SentimentResponse)
-async def predict_sentiment(request: CommentRequest):
+async def predict_sentiment(request: CommentRequest, x_client_id: Optional[str] = Header(None)):
     """
     Predict sentiment for a YouTube comment using LOCAL model.
     
-    This endpoint uses the model from local disk (models/lgbm_model.pkl).
+    This endpoint uses the model pool: the stable version (models/lgbm_model.pkl
+    at startup), or the canary version for its share of the traffic.
     
     Args:
         request: CommentRequest containing the comment to analyze
+        x_client_id: Optional client id, routes a client to the same version on every request
         
     Returns:
         SentimentResponse with prediction results
     """
     try:
         # Validate that model and vectorizer are loaded
-        if local_model is None or vectorizer is None:
+        if model_pool is None:
             raise HTTPException(
                 status_code=503,
                 detail="Local model or vectorizer not loaded. Please check server logs."
             )
         
-        sentiment = make_prediction(request.comment, local_model)
+        version = model_pool.route(x_client_id)
+        degraded = overload_controller.degraded
+        with model_pool.track(version):
+            sentiment, probabilities = await run_in_threadpool(
+                make_prediction, request.comment, version.model, version.vectorizer, degraded, version.calibrator,
+                cascade=version.cascade, shadow=version.shadow
+            )
+        
+        return build_response(request.comment, sentiment, probabilities, request.return_probabilities, version.name, degraded)
         
-        return SentimentResponse(
-            comment=request.comment,
-            sentiment=sentiment
-        )
+    except HTTPException:
+        raise
         
     except ValueError as ve:
         logger.error(f"Validation error: {ve}")
@@ -278,11 +1329,12 @@ async def predict_sentiment(request: CommentRequest):
 
 
 @app.post("/batch_predict")
-async def batch_predict(request: BatchCommentRequest):
+async def batch_predict(request: BatchCommentRequest, x_client_id: Optional[str] = Header(None)):
     """
     Predict sentiment for multiple comments using LOCAL model.
     
-    This endpoint uses the model from local disk (models/lgbm_model.pkl).
+    This endpoint uses the model pool: the stable version (models/lgbm_model.pkl
+    at startup), or the canary version for its share of the traffic.
     
     Request format:
     {
@@ -297,24 +1349,35 @@ async def batch_predict(request: BatchCommentRequest):
     
     Args:
         request: BatchCommentRequest containing list of comments
+        x_client_id: Optional client id, routes a client to the same version on every request
         
     Returns:
         List of SentimentResponse objects
     """
     try:
-        if local_model is None or vectorizer is None:
+        if model_pool is None:
             raise HTTPException(
                 status_code=503,
                 detail="Local model or vectorizer not loaded."
             )
         
-        results = []
-        for comment_text in request.comment:
-            sentiment = make_prediction(comment_text, local_model)
-            results.append(SentimentResponse(comment=comment_text, sentiment=sentiment))
+        version = model_pool.route(x_client_id)
+        degraded = overload_controller.degraded
+        with model_pool.track(version):
+            sentiments, probabilities = await run_in_threadpool(
+                make_batch_prediction, request.comment, version.model, version.vectorizer, degraded, version.calibrator,
+                cascade=version.cascade, shadow=version.shadow
+            )
+        results = [
+            build_response(comment_text, sentiment, proba, request.return_probabilities, version.name, degraded)
+            for comment_text, sentiment, proba in zip(request.comment, sentiments, probabilities)
+        ]
         
         return results
         
+    except HTTPException:
+        raise
+        
     except Exception as e:
         logger.error(f"Error during batch prediction: {e}")
         raise HTTPException(
@@ -344,13 +1407,13 @@ async def predict_sentiment_mlflow(request: CommentRequest):
                 detail="MLflow model or vectorizer not loaded. Please check server logs."
             )
         
-        sentiment = make_prediction(request.comment, mlflow_model)
-        
-        return SentimentResponse(
-            comment=request.comment,
-            sentiment=sentiment
+        degraded = overload_controller.degraded
+        sentiment, probabilities = await run_in_threadpool(
+            make_prediction, request.comment, mlflow_model, degraded=degraded, calibrator_to_use=mlflow_calibrator
         )
         
+        return build_response(request.comment, sentiment, probabilities, request.return_probabilities, degraded=degraded)
+        
     except ValueError as ve:
         logger.error(f"Validation error: {ve}")
         raise HTTPException(status_code=400, detail=str(ve))
@@ -394,10 +1457,14 @@ async def batch_predict_mlflow(request: BatchCommentRequest):
                 detail="MLflow model or vectorizer not loaded."
             )
         
-        results = []
-        for comment_text in request.comment:
-            sentiment = make_prediction(comment_text, mlflow_model)
-            results.append(SentimentResponse(comment=comment_text, sentiment=sentiment))
+        degraded = overload_controller.degraded
+        sentiments, probabilities = await run_in_threadpool(
+            make_batch_prediction, request.comment, mlflow_model, degraded=degraded, calibrator_to_use=mlflow_calibrator
+        )
+        results = [
+            build_response(comment_text, sentiment, proba, request.return_probabilities, degraded=degraded)
+            for comment_text, sentiment, proba in zip(request.comment, sentiments, probabilities)
+        ]
         
         return results
         
@@ -409,6 +1476,246 @@ async def batch_predict_mlflow(request: BatchCommentRequest):
         )
 
 
+@app.post("/compare_predict", response_model=CompareResponse)
+async def compare_predict(request: CompareRequest):
+    """
+    Predict sentiment for multiple comments with BOTH the local and the MLflow model.
+    
+    The batch is featurized once and both models score the same matrix in parallel.
+    
+    Request format:
+    {
+        "comment": ["This is great!", "Very bad video"],
+        "ensemble": true
+    }
+    
+    Response format:
+    {
+        "results": [
+            {"comment": "This is great!", "local": 1, "mlflow": 1, "ensemble": 1, "probabilities": null},
+            {"comment": "Very bad video", "local": -1, "mlflow": 0, "ensemble": -1, "probabilities": null}
+        ],
+        "agreement_rate": 0.5,
+        "n_scored": 2
+    }
+    
+    Args:
+        request: CompareRequest containing list of comments
+        
+    Returns:
+        CompareResponse with the predictions of both models and their agreement rate
+    """
+    try:
+        if model_pool is None or mlflow_model is None:
+            raise HTTPException(
+                status_code=503,
+                detail="Both the local and the MLflow model must be loaded."
+            )
+        
+        # 'local' is the stable version of the pool, which follows /admin/promote
+        results, agreement_rate, n_scored = await compare_models(
+            request.comment, {'local': model_pool.stable_version(), 'mlflow': mlflow_model_version()},
+            request.ensemble
+        )
+        
+        compared = []
+        for i, comment_text in enumerate(request.comment):
+            compared.append(CompareResult(
+                comment=comment_text,
+                local=results['local'][0][i],
+                mlflow=results['mlflow'][0][i],
+                ensemble=results['ensemble'][0][i] if request.ensemble else None,
+                probabilities={name: result[1][i] for name, result in results.items()} if request.return_probabilities else None
+            ))
+        
+        return CompareResponse(results=compared, agreement_rate=agreement_rate, n_scored=n_scored)
+        
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        logger.error(f"Error during model comparison: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred during model comparison: {str(e)}"
+        )
+
+
+@app.post("/aggregate_predict", response_model=AggregateResponse)
+async def aggregate_predict(request: Request, top_k: int = 0, x_client_id: Optional[str] = Header(None)):
+    """
+    Sentiment counts and ratios for all the comments of a video using LOCAL model.
+    
+    Like /predict, this endpoint uses the model pool (stable or canary version).
+    Comments are scored in chunks as the body is read and only the aggregate is
+    returned, so the response stays small whatever the number of comments.
+    
+    Request format (application/json, or application/x-ndjson with one JSON string per line):
+    {
+        "comment": ["This is great!", "Very bad video"]
+    }
+    
+    Response format:
+    {
+        "total": 2,
+        "counts": {"neutral": 0, "positive": 1, "negative": 1},
+        "ratios": {"neutral": 0.0, "positive": 0.5, "negative": 0.5},
+        "top_examples": null
+    }
+    
+    Args:
+        request: Comments of the video (JSON or NDJSON body)
+        top_k: Number of most confident comments to return per sentiment (0 for none)
+        x_client_id: Optional client id, routes a client to the same version on every request
+        
+    Returns:
+        AggregateResponse with the class counts and ratios
+    """
+    try:
+        if model_pool is None:
+            raise HTTPException(
+                status_code=503,
+                detail="Local model or vectorizer not loaded."
+            )
+        
+        return await aggregate_comments(request, model_pool.route(x_client_id), top_k)
+        
+    except HTTPException:
+        raise
+    
+    except ValueError as ve:
+        logger.error(f"Validation error: {ve}")
+        raise HTTPException(status_code=400, detail=str(ve))
+    
+    except Exception as e:
+        logger.error(f"Error during aggregate prediction: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred during aggregate prediction: {str(e)}"
+        )
+
+
+@app.post("/aggregate_predict_mlflow", response_model=AggregateResponse)
+async def aggregate_predict_mlflow(request: Request, top_k: int = 0):
+    """
+    Sentiment counts and ratios for all the comments of a video using MLFLOW model.
+    
+    Same request and response formats as /aggregate_predict.
+    
+    Args:
+        request: Comments of the video (JSON or NDJSON body)
+        top_k: Number of most confident comments to return per sentiment (0 for none)
+        
+    Returns:
+        AggregateResponse with the class counts and ratios
+    """
+    try:
+        if mlflow_model is None or vectorizer is None:
+            raise HTTPException(
+                status_code=503,
+                detail="MLflow model or vectorizer not loaded."
+            )
+        
+        return await aggregate_comments(request, mlflow_model_version(), top_k)
+        
+    except HTTPException:
+        raise
+    
+    except ValueError as ve:
+        logger.error(f"Validation error: {ve}")
+        raise HTTPException(status_code=400, detail=str(ve))
+    
+    except Exception as e:
+        logger.error(f"Error during aggregate prediction: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred during aggregate prediction: {str(e)}"
+        )
+
+
+def check_admin_token(x_admin_token: Optional[str]) -> None:
+    """Reject admin calls without the ADMIN_TOKEN; without one configured, all of them."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN).")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+def require_model_pool() -> ModelPool:
+    if model_pool is None:
+        raise HTTPException(status_code=503, detail="Model pool not available.")
+    return model_pool
+
+
+@app.get("/admin/models")
+async def get_model_pool(x_admin_token: Optional[str] = Header(None)):
+    """Resident model versions, the traffic split and per-version latency and error metrics."""
+    check_admin_token(x_admin_token)
+    return require_model_pool().state()
+
+
+@app.post("/admin/models")
+async def load_version(request: LoadVersionRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Load a model version into the pool, ahead of sending it traffic.
+    
+    The oldest versions that are neither stable, canary nor the rollback target
+    are evicted beyond MODEL_POOL_SIZE. The files are loaded in the threadpool,
+    requests keep being served meanwhile.
+    """
+    check_admin_token(x_admin_token)
+    pool = require_model_pool()
+    try:
+        model, version_vectorizer, version_calibrator = await run_in_threadpool(
+            load_model_version, request.model_uri, request.vectorizer_path, request.calibration_path
+        )
+        pool.add(request.version, model, version_vectorizer, request.model_uri, version_calibrator,
+                 shadow=version_vectorizer is vectorizer)
+        logger.info(f"✓ Model version {request.version} loaded from {request.model_uri}")
+        return pool.state()
+    except Exception as e:
+        logger.error(f"Error loading model version {request.version}: {e}")
+        raise HTTPException(status_code=400, detail=f"Could not load model version: {str(e)}")
+
+
+@app.post("/admin/traffic")
+async def set_traffic(request: TrafficRequest, x_admin_token: Optional[str] = Header(None)):
+    """Send canary_percent of the traffic to a resident canary version (takes effect immediately)."""
+    check_admin_token(x_admin_token)
+    pool = require_model_pool()
+    try:
+        pool.set_traffic(request.canary, request.canary_percent)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    logger.info(f"Traffic split: {pool.canary_percent}% to canary {pool.canary}, rest to {pool.stable}")
+    return pool.state()
+
+
+@app.post("/admin/promote")
+async def promote_canary(x_admin_token: Optional[str] = Header(None)):
+    """Make the canary the stable version; the previous stable stays resident for rollback."""
+    check_admin_token(x_admin_token)
+    pool = require_model_pool()
+    try:
+        pool.promote()
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    logger.info(f"Version {pool.stable} promoted to stable")
+    return pool.state()
+
+
+@app.post("/admin/rollback")
+async def rollback(x_admin_token: Optional[str] = Header(None)):
+    """Drop the canary, or if there is none return to the previous stable version."""
+    check_admin_token(x_admin_token)
+    pool = require_model_pool()
+    try:
+        pool.rollback()
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    logger.info(f"Rolled back, all traffic to {pool.stable}")
+    return pool.state()
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -0,0 +1,319 @@
+"""
+Bulk sentiment scoring of comment files
+
+Offline counterpart of /batch_predict for backfills. The input (CSV, JSONL or
+Parquet) is read in shards; a process pool scores them, each worker loading the
+model, vectorizer and calibration once. Every shard goes through the same
+featurize_comments path as the API batch endpoints and is written to a part
+file, so an interrupted run resumes from the last written shard. A manifest
+records the input file, sharding and model files of the parts, and resuming is
+refused when any of them changed. The parts are
+then merged into one output file in the input format, in input order, with the
+input row ids.
+
+Usage:
+    python bulk_score.py comments.parquet --text-column text --id-column comment_id --workers 8
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Add project root to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from data_handling.data_preprocessing import featurize_comments
+from model_creation.calibration import TemperatureCalibrator
+from model_creation.compiled_predictor import file_sha256
+from utilities.constants import SENTIMENT_MAP, SENTIMENT_LABELS, PROBABILITY_LABELS, PROBABILITY_SENTIMENTS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('bulk_score')
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.parquet': 'parquet'}
+
+# Loaded once per worker process by init_worker
+worker_model = None
+worker_vectorizer = None
+worker_calibrator = None
+
+
+def detect_format(path: str) -> str:
+    """File format from the extension (.csv, .jsonl or .parquet)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported file format {extension}, expected one of {list(FORMATS)}")
+    return FORMATS[extension]
+
+
+def iter_shards(path: str, file_format: str, columns: list, shard_size: int):
+    """Yield the input as DataFrames of at most shard_size rows, in file order."""
+    if file_format == 'csv':
+        yield from pd.read_csv(path, usecols=columns, chunksize=shard_size)
+    elif file_format == 'jsonl':
+        for chunk in pd.read_json(path, lines=True, chunksize=shard_size):
+            yield chunk[columns]
+    else:
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=shard_size, columns=columns):
+            yield batch.to_pandas()
+
+
+def write_frame(df: pd.DataFrame, path: str, file_format: str) -> None:
+    """Write a DataFrame atomically: to a temporary file, then renamed."""
+    tmp_path = path + '.tmp'
+    if file_format == 'csv':
+        df.to_csv(tmp_path, index=False)
+    elif file_format == 'jsonl':
+        df.to_json(tmp_path, orient='records', lines=True, force_ascii=False)
+    else:
+        df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def checkpoint_manifest(input_path: str, text_column: str, id_column: str, model_path: str, vectorizer_path: str,
+                        calibration_path: str, shard_size: int, confidence_threshold: float) -> dict:
+    """Everything the part files depend on: the input file, the sharding, the scoring options and the model files."""
+    input_stat = os.stat(input_path)
+    has_calibration = bool(calibration_path) and os.path.exists(calibration_path)
+    return {
+        'input_path': os.path.abspath(input_path),
+        'input_size': input_stat.st_size,
+        'input_mtime_ns': input_stat.st_mtime_ns,
+        'text_column': text_column,
+        'id_column': id_column,
+        'shard_size': shard_size,
+        'confidence_threshold': confidence_threshold,
+        'model_sha256': file_sha256(model_path),
+        'vectorizer_sha256': file_sha256(vectorizer_path),
+        'calibration_sha256': file_sha256(calibration_path) if has_calibration else None
+    }
+
+
+def check_checkpoint(checkpoint_dir: str, manifest: dict) -> None:
+    """Write the manifest of a new checkpoint, or refuse to resume one written for other inputs."""
+    manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        if any(name.startswith('part-') for name in os.listdir(checkpoint_dir)):
+            raise ValueError(f"{checkpoint_dir} holds part files without a manifest, delete it to score from scratch")
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(manifest_path + '.tmp', manifest_path)
+        return
+
+    with open(manifest_path, 'r') as f:
+        previous = json.load(f)
+    changed = sorted(key for key in set(manifest) | set(previous) if manifest.get(key) != previous.get(key))
+    if changed:
+        raise ValueError(f"Cannot resume from {checkpoint_dir}, changed since it was written: {', '.join(changed)}. "
+                         f"Delete it to score from scratch")
+    logger.info(f"Resuming from {checkpoint_dir}")
+
+
+def init_worker(model_path: str, vectorizer_path: str, calibration_path: str) -> None:
+    """Load the model, vectorizer and calibration once in each worker process."""
+    global worker_model, worker_vectorizer, worker_calibrator
+
+    with open(model_path, 'rb') as f:
+        worker_model = pickle.load(f)
+    with open(vectorizer_path, 'rb') as f:
+        worker_vectorizer = pickle.load(f)
+    if calibration_path and os.path.exists(calibration_path):
+        worker_calibrator = TemperatureCalibrator.load(calibration_path)
+
+
+def score_comments(comments: list, confidence_threshold: float) -> pd.DataFrame:
+    """Sentiment, confidence and calibrated probabilities of a list of comments.
+
+    Same steps as the API batch path: featurize_comments, one predict_proba call,
+    temperature scaling, and neutral for trivial comments or under the threshold.
+    """
+    proba = np.zeros((len(comments), len(PROBABILITY_LABELS)))
+    proba[:, PROBABILITY_LABELS.index('neutral')] = 1.0
+
+    positions, X = featurize_comments(comments, worker_vectorizer)
+    if len(positions) > 0:
+        model_proba = worker_model.predict_proba(X)
+        if worker_calibrator is not None:
+            model_proba = worker_calibrator.transform(model_proba)
+        columns = [PROBABILITY_LABELS.index(SENTIMENT_LABELS[SENTIMENT_MAP.get(int(label), 0)])
+                   for label in worker_model.classes_]
+        scored = np.zeros((len(positions), len(PROBABILITY_LABELS)))
+        scored[:, columns] = model_proba
+        proba[positions] = scored
+
+    best = proba.argmax(axis=1)
+    confidence = proba[np.arange(len(best)), best]
+    sentiment = np.where(confidence >= confidence_threshold, np.asarray(PROBABILITY_SENTIMENTS)[best], 0)
+
+    result = pd.DataFrame({'sentiment': sentiment, 'confidence': confidence})
+    for i, label in enumerate(PROBABILITY_LABELS):
+        result[f'proba_{label}'] = proba[:, i]
+    return result
+
+
+def score_shard(shard_index: int, shard: pd.DataFrame, id_column: str, text_column: str,
+                part_path: str, file_format: str, confidence_threshold: float) -> tuple:
+    """Score one shard and write it to its part file. Returns (shard_index, n_rows)."""
+    comments = shard[text_column].fillna('').astype(str).tolist()
+    result = score_comments(comments, confidence_threshold)
+    result.insert(0, id_column, shard[id_column].to_numpy())
+    write_frame(result, part_path, file_format)
+    return shard_index, len(result)
+
+
+def merge_parts(part_paths: list, output_path: str, file_format: str) -> None:
+    """Concatenate the part files, in shard order, into the output file."""
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = None
+        for part_path in part_paths:
+            table = pq.read_table(part_path)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path + '.tmp', table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+            os.replace(output_path + '.tmp', output_path)
+        return
+
+    # CSV and JSONL parts can be appended as they are (CSV without the repeated header)
+    with open(output_path + '.tmp', 'wb') as output:
+        for i, part_path in enumerate(part_paths):
+            with open(part_path, 'rb') as part:
+                if file_format == 'csv' and i > 0:
+                    part.readline()
+                output.write(part.read())
+    os.replace(output_path + '.tmp', output_path)
+
+
+def bulk_score(input_path: str, output_path: str, text_column: str, id_column: str = None,
+               model_path: str = 'models/lgbm_model.pkl', vectorizer_path: str = 'models/tfidf_vectorizer.pkl',
+               calibration_path: str = 'models/calibration.json', workers: int = None, shard_size: int = 50000,
+               checkpoint_dir: str = None, confidence_threshold: float = 0.0) -> dict:
+    """Score every comment of input_path into output_path, resuming from checkpoint_dir.
+
+    Without id_column, the 0-based row number of the input is used as the id
+    (column 'row_id'). Shards whose part file exists in checkpoint_dir are
+    not scored again, provided its manifest matches this run (see check_checkpoint).
+
+    Returns:
+        dict: Throughput stats of the run
+    """
+    file_format = detect_format(input_path)
+    if detect_format(output_path) != file_format:
+        raise ValueError("The output must use the same format as the input")
+
+    checkpoint_dir = checkpoint_dir or output_path + '.parts'
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    check_checkpoint(checkpoint_dir, checkpoint_manifest(
+        input_path, text_column, id_column, model_path, vectorizer_path, calibration_path, shard_size, confidence_threshold
+    ))
+    workers = workers or os.cpu_count()
+    columns = [text_column] + ([id_column] if id_column else [])
+    extension = os.path.splitext(input_path)[1].lower()
+
+    start = time.perf_counter()
+    part_paths, pending = [], set()
+    n_rows_scored = n_rows_skipped = n_shards_skipped = 0
+    next_row = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(model_path, vectorizer_path, calibration_path)) as executor:
+
+        def collect(done):
+            nonlocal n_rows_scored
+            for future in done:
+                shard_index, n_rows = future.result()
+                n_rows_scored += n_rows
+                elapsed = time.perf_counter() - start
+                logger.info(f"Shard {shard_index} done: {n_rows_scored + n_rows_skipped} rows "
+                            f"({n_rows_scored / elapsed:.0f} rows/s)")
+
+        for shard_index, shard in enumerate(iter_shards(input_path, file_format, columns, shard_size)):
+            if not id_column:
+                shard = shard.assign(row_id=np.arange(next_row, next_row + len(shard)))
+            next_row += len(shard)
+
+            part_path = os.path.join(checkpoint_dir, f'part-{shard_index:06d}{extension}')
+            part_paths.append(part_path)
+            if os.path.exists(part_path):
+                n_shards_skipped += 1
+                n_rows_skipped += len(shard)
+                continue
+
+            # At most two shards per worker in flight, so the input is never fully in memory
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(score_shard, shard_index, shard, id_column or 'row_id', text_column,
+                                        part_path, file_format, confidence_threshold))
+
+        done, _ = wait(pending)
+        collect(done)
+
+    merge_parts(part_paths, output_path, file_format)
+    elapsed = time.perf_counter() - start
+
+    stats = {
+        'rows': n_rows_scored + n_rows_skipped,
+        'rows_scored': n_rows_scored,
+        'rows_resumed': n_rows_skipped,
+        'shards': len(part_paths),
+        'shards_resumed': n_shards_skipped,
+        'workers': workers,
+        'seconds': elapsed,
+        'rows_per_sec': n_rows_scored / elapsed if elapsed else 0.0
+    }
+    logger.info(f"Scored {stats['rows']} rows into {output_path} in {elapsed:.1f} s ({stats['rows_per_sec']:.0f} rows/s)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a CSV, JSONL or Parquet file of comments offline.")
+    parser.add_argument('input', help="Input file (.csv, .jsonl or .parquet)")
+    parser.add_argument('--output', help="Output file, same format as the input (default: <input>_scored.<ext>)")
+    parser.add_argument('--text-column', default='comment', help="Column holding the comment text")
+    parser.add_argument('--id-column', help="Column holding the row id (default: row number, as 'row_id')")
+    parser.add_argument('--model', default='models/lgbm_model.pkl', help="Pickled model")
+    parser.add_argument('--vectorizer', default='models/tfidf_vectorizer.pkl', help="Pickled TF-IDF vectorizer")
+    parser.add_argument('--calibration', default='models/calibration.json', help="Calibration file (skipped if missing)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--shard-size', type=int, default=50000, help="Rows per shard and checkpoint")
+    parser.add_argument('--checkpoint-dir', help="Directory of the part files (default: <output>.parts)")
+    parser.add_argument('--confidence-threshold', type=float, default=float(os.getenv('CONFIDENCE_THRESHOLD', '0')),
+                        help="Neutral under this confidence, like the API's CONFIDENCE_THRESHOLD")
+    parser.add_argument('--stats', help="Write the throughput stats to this JSON file")
+    args = parser.parse_args()
+
+    root, extension = os.path.splitext(args.input)
+    output_path = args.output or f'{root}_scored{extension}'
+
+    stats = bulk_score(
+        args.input, output_path, args.text_column, args.id_column,
+        model_path=args.model, vectorizer_path=args.vectorizer, calibration_path=args.calibration,
+        workers=args.workers, shard_size=args.shard_size, checkpoint_dir=args.checkpoint_dir,
+        confidence_threshold=args.confidence_threshold
+    )
+
+    print(f"\n{'='*50}")
+    print(f"Rows: {stats['rows']} ({stats['rows_resumed']} resumed from checkpoint)")
+    print(f"Throughput: {stats['rows_per_sec']:.0f} rows/s with {stats['workers']} workers")
+    print(f"Output: {output_path}")
+    print(f"{'='*50}\n")
+
+    if args.stats:
+        with open(args.stats, 'w') as f:
+            json.dump(stats, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
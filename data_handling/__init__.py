@@ -1,4 +1,4 @@
 from .data_ingestion import download_and_copy_dataset
-from .data_preprocessing import preprocess_comment, feature_engineering, split_data
+from .data_preprocessing import preprocess_comment, feature_engineering, split_data, split_data_by_hash, stream_split_csv
 
-__all__ = ['download_and_copy_dataset', 'preprocess_comment', 'feature_engineering', 'save_data', 'split_data']
\ No newline at end of file
+__all__ = ['download_and_copy_dataset', 'preprocess_comment', 'feature_engineering', 'save_data', 'split_data', 'split_data_by_hash', 'stream_split_csv']
\ No newline at end of file
@@ -4,9 +4,13 @@ from os.path import dirname as up
 sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
 
 from pathlib import Path
+import pandas as pd
+import json
 import shutil
+import hashlib
 import logging
 import kagglehub
+from data_handling.data_preprocessing import assign_hash_splits
 
 # Logging configuration
 logger = logging.getLogger('data_ingestion')
@@ -25,14 +29,153 @@ file_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 logger.addHandler(file_handler)
 
+# Bookkeeping of the synced files and ingested comment drops, kept next to the splits
+MANIFEST_FILE = "ingestion_manifest.json"
+SPLIT_FILES = {"train": "train.csv", "val": "val.csv", "test": "test.csv"}
+
+
+def file_checksum(file_path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(raw_data_path: str) -> dict:
+    """Load the ingestion manifest, or an empty one on the first run."""
+    manifest_path = Path(raw_data_path) / MANIFEST_FILE
+    if not manifest_path.exists():
+        return {"files": {}, "drops": {}}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, raw_data_path: str) -> None:
+    """Write the ingestion manifest atomically (temporary file, then renamed)."""
+    manifest_path = Path(raw_data_path) / MANIFEST_FILE
+    tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, manifest_path)
+
+
+def rollback_pending_append(manifest: dict, raw_data_path: str) -> None:
+    """Truncate the splits back to their size before an append that did not complete.
+
+    ingest_comment_drops records the split sizes in manifest['pending_append']
+    before appending a shard and clears them once the shard is recorded, so
+    rows of an interrupted shard are removed before it is ingested again.
+    """
+    pending = manifest.pop("pending_append", None)
+    if not pending:
+        return
+    for file_name, size in pending.items():
+        split_path = Path(raw_data_path) / file_name
+        if split_path.exists() and split_path.stat().st_size > size:
+            os.truncate(split_path, size)
+            logger.warning('Removed the rows of an interrupted comment drop append from %s', split_path)
+    save_manifest(manifest, raw_data_path)
+
+
+def _reflink(src: Path, dest: Path) -> None:
+    """Copy-on-write clone of src (Linux FICLONE: btrfs, XFS, ...)."""
+    import fcntl
+    FICLONE = 0x40049409
+    with open(src, 'rb') as s, open(dest, 'wb') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def reflink_or_copy(src: Path, dest: Path) -> str:
+    """Place src at dest with a reflink, or a copy when the filesystem cannot clone.
+
+    Never a hard link: data/raw is a DVC output, and DVC's cache and permission
+    handling would then also change the shared source file (e.g. the kagglehub cache).
+    The file is staged next to dest and moved over it, so dest is never left half written.
+    
+    Returns:
+        str: 'reflink' or 'copy'
+    """
+    tmp_path = dest.with_name(dest.name + '.tmp')
+    tmp_path.unlink(missing_ok=True)
+    try:
+        _reflink(src, tmp_path)
+        method = 'reflink'
+    except (OSError, ImportError):
+        tmp_path.unlink(missing_ok=True)
+        shutil.copy2(src, tmp_path)
+        method = 'copy'
+    os.replace(tmp_path, dest)
+    return method
+
+
+def sync_dataset_files(source_path: str, raw_data_path: str, manifest: dict) -> list:
+    """Mirror the files of source_path into raw_data_path, skipping unchanged files.
+
+    A file is unchanged when its size and mtime match the manifest, or when its
+    checksum does; only new or modified files are reflinked or copied.
+    
+    Returns:
+        list: Paths of the CSV files now present in raw_data_path
+    """
+    raw_data_dir = Path(raw_data_path)
+    files = manifest.setdefault("files", {})
+    csv_files = []
+    counts = {'unchanged': 0, 'reflink': 0, 'copy': 0}
+
+    print(f"Syncing files to {raw_data_dir}/...")
+    print("="*60)
+    for item in sorted(Path(source_path).rglob('*')):
+        if not item.is_file():
+            continue
+        # Get relative path to preserve directory structure
+        rel_path = item.relative_to(source_path)
+        dest_path = raw_data_dir / rel_path
+        stat = item.stat()
+        record = files.get(str(rel_path))
+
+        if record and dest_path.exists() and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+            status = 'unchanged'
+        else:
+            checksum = file_checksum(item)
+            if record and dest_path.exists() and record['sha256'] == checksum:
+                status = 'unchanged'
+            else:
+                # Create parent directories if needed
+                dest_path.parent.mkdir(parents=True, exist_ok=True)
+                status = reflink_or_copy(item, dest_path)
+            files[str(rel_path)] = {'sha256': checksum, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+        counts[status] += 1
+        print(f"  ✓ {rel_path} ({stat.st_size / (1024 * 1024):.2f} MB, {status})")
+
+        # Collect csv files
+        if dest_path.suffix.lower() == '.csv':
+            csv_files.append(dest_path)
+
+    print("="*60)
+    print(f"✓ {counts['unchanged']} unchanged, "
+          f"{counts['reflink']} reflinked, {counts['copy']} copied")
+    logger.debug('Dataset files synced to %s: %s', raw_data_dir, counts)
+    return csv_files
+
+
 def download_and_copy_dataset(dataset_name: str = "atifaliak/youtube-comments-dataset", 
-                               raw_data_path: str = "data/raw") -> str:
+                               raw_data_path: str = "data/raw",
+                               source_dir: str = None) -> str:
     """
     Download dataset from Kaggle and copy to local directory.
+
+    Files are synced incrementally: unchanged files (by size/mtime, then SHA-256)
+    are skipped, the others are reflinked or copied.
     
     Args:
         dataset_name: Kaggle dataset identifier (default: "atifaliak/youtube-comments-dataset")
         raw_data_path: Local directory to store the dataset (default: "data/raw")
+        source_dir: Local directory to use instead of Kaggle, e.g. to work offline (default: None)
     
     Returns:
         str: Path to the CSV file, or None if not found or error occurred
@@ -42,38 +185,21 @@ def download_and_copy_dataset(dataset_name: str = "atifaliak/youtube-comments-da
     raw_data_dir.mkdir(parents=True, exist_ok=True)
     
     try:
-        # Download dataset to kagglehub cache
-        cache_path = kagglehub.dataset_download(dataset_name)
-        print("✓ Dataset downloaded successfully!")
-        print(f"Cache location: {cache_path}\n")
-        
-        # Copy files from cache to data/raw
-        print(f"Copying files to {raw_data_dir}/...")
-        print("="*60)
-        
-        copied_files = []
-        csv_files = []
-        for item in Path(cache_path).rglob('*'):
-            if item.is_file():
-                # Get relative path to preserve directory structure
-                rel_path = item.relative_to(cache_path)
-                dest_path = raw_data_dir / rel_path
-
-                # Create parent directories if needed
-                dest_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Copy file
-                shutil.copy2(item, dest_path)
-                file_size = item.stat().st_size / (1024 * 1024)  # MB
-                copied_files.append(str(dest_path))
-                print(f"  ✓ {rel_path} ({file_size:.2f} MB)")
-
-                # Collect csv files
-                if dest_path.suffix.lower() == '.csv':
-                    csv_files.append(dest_path)
+        if source_dir:
+            if not Path(source_dir).is_dir():
+                raise FileNotFoundError(f"Local dataset directory not found: {source_dir}")
+            cache_path = source_dir
+            print(f"Using local dataset directory: {cache_path}\n")
+        else:
+            # Download dataset to kagglehub cache
+            cache_path = kagglehub.dataset_download(dataset_name)
+            print("✓ Dataset downloaded successfully!")
+            print(f"Cache location: {cache_path}\n")
         
-        print("="*60)
-        print(f"✓ Successfully copied {len(copied_files)} file(s)")
+        # Sync files from cache to data/raw
+        manifest = load_manifest(raw_data_path)
+        csv_files = sync_dataset_files(cache_path, raw_data_path, manifest)
+        save_manifest(manifest, raw_data_path)
         print(f"\nDataset saved to: {raw_data_dir.absolute()}")
         
         # Find the csv file path
@@ -100,14 +226,85 @@ def download_and_copy_dataset(dataset_name: str = "atifaliak/youtube-comments-da
         print("1. Visit: https://www.kaggle.com/datasets")
         print("2. Search for 'youtube comments sentiment'")
         print("3. Download and place in data/raw/ directory")
+        print("4. Or set data_ingestion.source_dir in params.yaml to a local copy")
         return None
 
 
+def read_comment_shard(shard_path: Path) -> pd.DataFrame:
+    """Read a CSV or JSONL comment drop with the raw dataset columns."""
+    if shard_path.suffix.lower() == '.jsonl':
+        return pd.read_json(shard_path, lines=True)
+    return pd.read_csv(shard_path)
+
+
+def ingest_comment_drops(drops_dir: str, raw_data_path: str, manifest: dict,
+                         test_size: float, val_size: float, key_column: str = 'Comment', salt: str = '') -> dict:
+    """Append new rows from append-only comment drops to the existing splits.
+
+    Shards (*.csv / *.jsonl) are processed in file name order. The manifest
+    remembers how many rows of each shard were ingested, so a new shard is
+    ingested entirely, a shard that grew only contributes its new rows, and
+    existing split rows are never moved. Each new row goes to the split given
+    by the hash of its key_column (see assign_hash_splits), like the rows of
+    the base dataset. The manifest is saved after every shard, and an append
+    interrupted before that is rolled back (see rollback_pending_append), so
+    no row is appended twice.
+    
+    Returns:
+        dict: Number of rows appended to each split
+    """
+    appended = {split: 0 for split in SPLIT_FILES}
+    drops_path = Path(drops_dir)
+    if not drops_path.is_dir():
+        logger.debug('No comment drops directory at %s', drops_dir)
+        return appended
+
+    try:
+        rollback_pending_append(manifest, raw_data_path)
+        drops = manifest.setdefault("drops", {})
+        shards = sorted(p for p in drops_path.rglob('*') if p.is_file() and p.suffix.lower() in ('.csv', '.jsonl'))
+
+        for shard_path in shards:
+            name = str(shard_path.relative_to(drops_path))
+            checksum = file_checksum(shard_path)
+            record = drops.get(name, {'sha256': None, 'n_rows': 0})
+            if record['sha256'] == checksum:
+                continue
+
+            shard = read_comment_shard(shard_path)
+            if len(shard) < record['n_rows']:
+                raise ValueError(f"Comment drop {name} lost rows ({len(shard)} < {record['n_rows']}), drops must be append-only")
+            new_rows = shard.iloc[record['n_rows']:]
+
+            splits = assign_hash_splits(new_rows[key_column], test_size, val_size, salt)
+            manifest["pending_append"] = {file_name: (Path(raw_data_path) / file_name).stat().st_size
+                                          for file_name in SPLIT_FILES.values()}
+            save_manifest(manifest, raw_data_path)
+            for split, file_name in SPLIT_FILES.items():
+                rows = new_rows[splits == split]
+                if len(rows) > 0:
+                    split_path = Path(raw_data_path) / file_name
+                    # Shards may order their columns differently, follow the split's header
+                    columns = pd.read_csv(split_path, nrows=0).columns
+                    rows[columns].to_csv(split_path, mode='a', header=False, index=False)
+                    appended[split] += len(rows)
+
+            drops[name] = {'sha256': checksum, 'n_rows': len(shard)}
+            del manifest["pending_append"]
+            save_manifest(manifest, raw_data_path)
+            logger.debug('Ingested %d new rows from comment drop %s', len(new_rows), name)
+
+        return appended
+    except Exception as e:
+        logger.error('Error ingesting comment drops: %s', e)
+        raise
+
+
 if __name__ == "__main__":
     from data_handling import download_and_copy_dataset
     from utilities import load_params, load_data, save_data
     from utilities import KAGGLE_DATASET_NAME, RAW_DATA_PATH, INTERIM_DATA_PATH
-    from data_handling import preprocess_comment, feature_engineering, split_data
+    from data_handling import preprocess_comment, feature_engineering, split_data, stream_split_csv
 
 
     print(">>> Stage 1: Starting the data handling pipeline...")
@@ -119,16 +316,51 @@ if __name__ == "__main__":
     random_state = params["data_ingestion"]["random_state"]
     stratify_column = params["data_ingestion"]["stratify_column"]
 
-    # 1. Download and copy dataset
-    csv_path = download_and_copy_dataset(dataset_name=KAGGLE_DATASET_NAME, raw_data_path=RAW_DATA_PATH)
+    source_dir = params["data_ingestion"].get("source_dir")
+    drops_dir = params["data_ingestion"].get("drops_dir")
+    split_method = params["data_ingestion"].get("split_method", "random")
+    split_key_column = params["data_ingestion"].get("split_key_column", "Comment")
+    split_chunksize = params["data_ingestion"].get("split_chunksize", 100_000)
 
-    # 2. Load the dataset
-    df = load_data(csv_path)
+    # 1. Download (or take from source_dir) and sync the dataset
+    csv_path = download_and_copy_dataset(dataset_name=KAGGLE_DATASET_NAME, raw_data_path=RAW_DATA_PATH,
+                                         source_dir=source_dir)
+    if csv_path is None:
+        # The download failed (see errors.log) or the dataset has no CSV file
+        raise FileNotFoundError(f"No CSV file could be ingested from {source_dir or KAGGLE_DATASET_NAME}")
+    manifest = load_manifest(RAW_DATA_PATH)
+
+    # 2. Split the dataset, only when the base CSV or the split parameters changed
+    split_config = {"base_sha256": manifest["files"][os.path.relpath(csv_path, RAW_DATA_PATH)]["sha256"],
+                    "test_size": test_size, "val_size": val_size,
+                    "random_state": random_state, "stratify_column": stratify_column,
+                    "split_method": split_method, "split_key_column": split_key_column}
+    splits_exist = all(os.path.exists(os.path.join(RAW_DATA_PATH, f)) for f in SPLIT_FILES.values())
+
+    if manifest.get("split") == split_config and splits_exist:
+        print("✓ Base dataset unchanged, keeping the existing splits")
+    else:
+        if split_method == "hash":
+            # Stable per-row assignment, streamed so the CSV never has to fit in memory
+            report = stream_split_csv(csv_path, RAW_DATA_PATH, test_size, val_size, key_column=split_key_column,
+                                      salt=str(random_state), stratify_column=stratify_column, chunksize=split_chunksize)
+            print(f"✓ Hash split: {report['counts']}")
+        else:
+            df = load_data(csv_path)
+            train_data, val_data, test_data = split_data(df, test_size, val_size, random_state, stratify_column)
+            save_data(train_data, val_data, test_data, data_path=RAW_DATA_PATH)
+        # Fresh splits: every comment drop has to be appended again
+        manifest["split"] = split_config
+        manifest["drops"] = {}
+        manifest.pop("pending_append", None)
+        save_manifest(manifest, RAW_DATA_PATH)
 
-    # 3. Split the Dataset
-    train_data, val_data, test_data = split_data(df, test_size, val_size, random_state, stratify_column)
+    # 3. Append new rows from the comment drops
+    if drops_dir:
+        appended = ingest_comment_drops(drops_dir, RAW_DATA_PATH, manifest, test_size, val_size,
+                                        key_column=split_key_column, salt=str(random_state))
+        print(f"✓ Comment drops appended: {appended}")
 
-    # 4. Save the dataset
-    save_data(train_data, val_data, test_data, data_path=RAW_DATA_PATH)
+    save_manifest(manifest, RAW_DATA_PATH)
 
     print(">>> Stage 1: Data handling pipeline completed successfully...")
\ No newline at end of file
@@ -38,6 +38,52 @@ nltk.download('wordnet')
 nltk.download('stopwords')
 nltk.download('omw-1.4')  # For better lemmatization
 
+# URL patterns removed by preprocess_comment (applied in this order on the lowercased comment)
+HTTP_URL_PATTERN = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+WWW_URL_PATTERN = r'www\.(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),])+'
+
+# Characters that survive the character filter of preprocess_comment
+CONTENT_CHAR_PATTERN = re.compile(r'[a-z0-9!?.,]')
+NON_CONTENT_CHAR_PATTERN = re.compile(r'[^A-Za-z0-9\s!?.,]')
+
+# Numerical model features, in the order they follow the TF-IDF columns
+NUMERICAL_FEATURES = ['word_count', 'num_stop_words', 'num_chars', 'num_chars_cleaned']
+
+# Stopwords (minus the ones that matter for sentiment) and lemmatizer, built once
+STOP_WORDS = set(stopwords.words('english')) - {'not', 'but', 'however', 'no', 'yet'}
+LEMMATIZER = WordNetLemmatizer()
+
+
+def is_trivial_comment(comment):
+    """Check whether a comment has nothing left to classify after cleaning.
+
+    A comment is trivial when it is blank, or when it contains no letter, digit
+    or basic punctuation once URLs are removed (emoji-only, symbol-only or
+    URL-only comments). preprocess_comment would reduce such a comment to an
+    empty string, so it can be answered as neutral without any NLTK work.
+    
+    Args:
+        comment (str): Raw comment text
+        
+    Returns:
+        bool: True if the comment can be classified as neutral right away
+    """
+    if not comment or comment.isspace():
+        return True
+
+    comment = comment.lower()
+    if not CONTENT_CHAR_PATTERN.search(comment):
+        return True
+
+    # Only pay for the URL regexes when the comment could be a bare link
+    if 'http' in comment or 'www.' in comment:
+        comment = re.sub(HTTP_URL_PATTERN, '', comment)
+        comment = re.sub(WWW_URL_PATTERN, '', comment)
+        return not CONTENT_CHAR_PATTERN.search(comment)
+
+    return False
+
+
 def preprocess_comment(comment):
     """Apply preprocessing transformations to a comment.
     
@@ -62,8 +108,8 @@ def preprocess_comment(comment):
         comment = comment.strip()
 
         # Remove URLs (http, https, www links)
-        comment = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', comment)
-        comment = re.sub(r'www\.(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),])+', '', comment)
+        comment = re.sub(HTTP_URL_PATTERN, '', comment)
+        comment = re.sub(WWW_URL_PATTERN, '', comment)
 
         # Remove newline characters
         comment = re.sub(r'\n', ' ', comment)
@@ -73,12 +119,10 @@ def preprocess_comment(comment):
         comment = re.sub(r'[^A-Za-z0-9\s!?.,]', '', comment)
 
         # Remove stopwords but retain important ones for sentiment analysis
-        stop_words = set(stopwords.words('english')) - {'not', 'but', 'however', 'no', 'yet'}
-        comment = ' '.join([word for word in comment.split() if word not in stop_words])
+        comment = ' '.join([word for word in comment.split() if word not in STOP_WORDS])
 
         # Lemmatize the words
-        lemmatizer = WordNetLemmatizer()
-        comment = ' '.join([lemmatizer.lemmatize(word) for word in comment.split()])
+        comment = ' '.join([LEMMATIZER.lemmatize(word) for word in comment.split()])
 
         return comment
     
@@ -125,11 +169,11 @@ def process_comment_for_api(comment):
         
         # Extract features from original comment (before preprocessing)
         original_comment = comment.strip()
-        word_count = len(original_comment.split())
+        original_words = original_comment.split()
+        word_count = len(original_words)
         
         # Count stopwords in original comment
-        stop_words = set(stopwords.words('english')) - {'not', 'but', 'however', 'no', 'yet'}
-        num_stop_words = len([word for word in original_comment.split() if word in stop_words])
+        num_stop_words = sum(1 for word in original_words if word in STOP_WORDS)
         
         num_chars = len(original_comment)
         
@@ -152,8 +196,359 @@ def process_comment_for_api(comment):
         logger.error(f"Error in processing comment for API: {e}")
         raise
 
-def feature_engineering(df, preprocess_comment) -> pd.DataFrame:
-    """Apply preprocessing to the text data in the dataframe."""
+def _word_ngrams(tokens, ngram_range):
+    """Word n-grams in the same order as sklearn's CountVectorizer."""
+    min_n, max_n = ngram_range
+    ngrams = list(tokens) if min_n == 1 else []
+    for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+        for i in range(len(tokens) - n + 1):
+            ngrams.append(' '.join(tokens[i:i + n]))
+    return ngrams
+
+
+def tfidf_row_weights(counts, vectorizer) -> tuple:
+    """Columns and TF-IDF weights of one document from its term counts.
+
+    Follows the arithmetic of TfidfVectorizer.transform in the vectorizer's
+    dtype: tf, idf and their product in vectorizer.dtype, the squared weights
+    summed in float64 in column order and the l2 division in float64 before
+    the cast back (sklearn's normalize). Columns are in sorted term order,
+    which is the column order of a fitted vocabulary. Compacted vectorizers
+    (``norm_idf_``) include the terms they dropped in the norm.
+
+    Returns:
+        tuple: (columns, weights) as int32 and vectorizer.dtype arrays
+    """
+    dtype = np.dtype(vectorizer.dtype)
+    vocabulary = vectorizer.vocabulary_
+    norm_idf = getattr(vectorizer, 'norm_idf_', None)
+    one = dtype.type(1)
+
+    columns, weights, norm_weights = [], [], []
+    for term in sorted(counts):
+        column = vocabulary.get(term)
+        if norm_idf is not None:
+            term_idf = norm_idf.get(term)
+        else:
+            term_idf = vectorizer.idf_[column] if column is not None else None
+        if term_idf is None:
+            continue
+
+        count = dtype.type(counts[term])
+        tf = one + np.log(count) if vectorizer.sublinear_tf else count
+        weight = tf * dtype.type(term_idf)
+        norm_weights.append(weight)
+        if column is not None:
+            columns.append(column)
+            weights.append(weight)
+
+    weights = np.asarray(weights, dtype=dtype)
+    if vectorizer.norm == 'l2':
+        squared_norm = 0.0
+        for weight in norm_weights:
+            squared_norm += float(weight * weight)
+        if squared_norm > 0:
+            weights = (weights.astype(np.float64) / np.sqrt(squared_norm)).astype(dtype)
+    return np.asarray(columns, dtype=np.int32), weights
+
+
+def extract_features_fused(comment, vectorizer):
+    """Extract the numerical features and the TF-IDF row of a comment in a single pass.
+
+    Produces the same features as process_comment_for_api followed by
+    vectorizer.transform, without building the cleaned comment string:
+    the original comment is split once for word_count and num_stop_words,
+    the cleaned words are lemmatized once, and the vectorizer's n-grams are
+    built directly from the resulting token stream. num_chars_cleaned is
+    derived from the word lengths.
+
+    num_chars counts the comment as received, like feature_engineering does
+    for the training data (process_comment_for_api counts the stripped comment).
+    
+    Args:
+        comment (str): Raw comment text
+        vectorizer: Fitted TfidfVectorizer (word analyzer, default preprocessing)
+        
+    Returns:
+        tuple: (features, tfidf_row) where features holds 'word_count',
+            'num_stop_words', 'num_chars' and 'num_chars_cleaned', and tfidf_row
+            is a 1 x n_terms scipy.sparse CSR matrix
+    """
+    import scipy.sparse as sp
+
+    try:
+        if not isinstance(comment, str):
+            raise ValueError("Comment must be a string")
+        
+        original_comment = comment.strip()
+        if not original_comment:
+            raise ValueError("Comment cannot be empty")
+
+        # Features from the original comment, from a single split
+        original_words = original_comment.split()
+        word_count = len(original_words)
+        num_stop_words = sum(1 for word in original_words if word in STOP_WORDS)
+        num_chars = len(comment)
+
+        # Same cleaning as preprocess_comment, the regexes only run when they can match
+        text = original_comment.lower()
+        if 'http' in text:
+            text = re.sub(HTTP_URL_PATTERN, '', text)
+        if 'www.' in text:
+            text = re.sub(WWW_URL_PATTERN, '', text)
+        text = NON_CONTENT_CHAR_PATTERN.sub('', text)
+        words = [LEMMATIZER.lemmatize(word) for word in text.split() if word not in STOP_WORDS]
+        num_chars_cleaned = sum(len(word) for word in words) + max(len(words) - 1, 0)
+
+        # Tokens never span the spaces between cleaned words, so tokenize word by word
+        token_pattern = re.compile(vectorizer.token_pattern)
+        tokens = [token for word in words for token in token_pattern.findall(word)]
+
+        counts = {}
+        for term in _word_ngrams(tokens, vectorizer.ngram_range):
+            counts[term] = counts.get(term, 0) + 1
+
+        columns, weights = tfidf_row_weights(counts, vectorizer)
+        tfidf_row = sp.csr_matrix(
+            (weights, columns, np.array([0, len(columns)], dtype=np.int32)),
+            shape=(1, len(vectorizer.vocabulary_))
+        )
+
+        features = {
+            'word_count': word_count,
+            'num_stop_words': num_stop_words,
+            'num_chars': num_chars,
+            'num_chars_cleaned': num_chars_cleaned
+        }
+        return features, tfidf_row
+
+    except Exception as e:
+        logger.error(f"Error in fused feature extraction: {e}")
+        raise
+
+
+def verify_fused_features(raw_df, interim_df, vectorizer, atol=0.0) -> dict:
+    """Check extract_features_fused against the features stored in an interim CSV.
+
+    The raw split is filtered exactly like feature_engineering does, so its rows
+    line up with the rows of the corresponding interim (processed) split.
+    
+    Args:
+        atol (float): Largest accepted absolute TF-IDF difference with vectorizer.transform
+    
+    Returns:
+        dict: Number of compared rows, mismatching numerical features and the
+            maximum absolute TF-IDF difference
+    
+    Raises:
+        ValueError: If a numerical feature differs or the TF-IDF differs by more than atol
+    """
+    import scipy.sparse as sp
+
+    try:
+        numerical_features = NUMERICAL_FEATURES
+        raw_df = raw_df.dropna().drop_duplicates()
+        comments = raw_df['Comment'][raw_df['Comment'].str.strip() != '']
+
+        rows, tfidf_rows = [], []
+        for comment in comments:
+            features, tfidf_row = extract_features_fused(comment, vectorizer)
+            # feature_engineering drops comments that are empty after cleaning
+            if features['num_chars_cleaned'] > 0:
+                rows.append([features[name] for name in numerical_features])
+                tfidf_rows.append(tfidf_row)
+
+        if len(rows) != len(interim_df):
+            raise ValueError(f"Row count mismatch: {len(rows)} fused rows vs {len(interim_df)} interim rows")
+
+        fused_numerical = np.asarray(rows)
+        expected_tfidf = vectorizer.transform(interim_df['clean_comment'].values)
+        tfidf_diff = abs(sp.vstack(tfidf_rows, format='csr') - expected_tfidf)
+
+        report = {
+            'n_rows': len(rows),
+            'numerical_mismatches': {
+                name: int((fused_numerical[:, i] != interim_df[name].values).sum())
+                for i, name in enumerate(numerical_features)
+            },
+            'max_tfidf_diff': float(tfidf_diff.max()) if tfidf_diff.nnz else 0.0
+        }
+        logger.debug(f'Fused feature verification: {report}')
+
+        mismatched = {name: n for name, n in report['numerical_mismatches'].items() if n > 0}
+        if mismatched:
+            raise ValueError(f"Fused numerical features differ from the interim data: {mismatched}")
+        if report['max_tfidf_diff'] > atol:
+            raise ValueError(f"Fused TF-IDF differs from vectorizer.transform by {report['max_tfidf_diff']:.2e} (atol {atol:.0e})")
+        return report
+    except Exception as e:
+        logger.error(f"Error during fused feature verification: {e}")
+        raise
+
+
+def compute_numeric_features(comments, clean_comments=None) -> pd.DataFrame:
+    """Numerical features for a column of comments, in a single pass over the rows.
+
+    Shared by feature_engineering (training) and featurize_comments (API batches).
+    It is a per-row Python loop: each comment is split once for both word_count
+    and num_stop_words, the stopword membership runs through set.__contains__
+    without building per-row lists, and the results are written straight into
+    numpy arrays. benchmark_numeric_features times it against the per-row apply
+    version and a token explode + isin + groupby, which spends its time creating
+    one object per token.
+    
+    Args:
+        comments (pd.Series): Original comments
+        clean_comments (pd.Series, optional): Preprocessed comments, aligned with comments
+        
+    Returns:
+        pd.DataFrame: 'word_count', 'num_stop_words' and 'num_chars' (plus
+            'num_chars_cleaned' when clean_comments is given), indexed like comments
+    """
+    try:
+        values = comments.tolist()
+        word_count = np.empty(len(values), dtype=np.int64)
+        num_stop_words = np.empty(len(values), dtype=np.int64)
+
+        is_stop_word = STOP_WORDS.__contains__
+        for i, comment in enumerate(values):
+            words = comment.split()
+            word_count[i] = len(words)
+            num_stop_words[i] = sum(map(is_stop_word, words))
+
+        features = pd.DataFrame({
+            'word_count': word_count,
+            'num_stop_words': num_stop_words,
+            'num_chars': comments.str.len().to_numpy(dtype=np.int64)
+        }, index=comments.index)
+
+        if clean_comments is not None:
+            features['num_chars_cleaned'] = clean_comments.str.len().to_numpy(dtype=np.int64)
+
+        return features
+    except Exception as e:
+        logger.error(f"Error computing numerical features: {e}")
+        raise
+
+
+def featurize_comments(comments, vectorizer) -> tuple:
+    """Build the model input for a batch of raw comments.
+
+    Batch counterpart of extract_features_fused: comments are cleaned with
+    preprocess_comment, the numerical features come from the vectorized
+    compute_numeric_features kernel, and the TF-IDF matrix is built with a
+    single vectorizer.transform call. Trivial comments, and comments that are
+    empty after cleaning, are left out because they are neutral.
+    
+    Args:
+        comments (list[str]): Raw comments
+        vectorizer: Fitted TF-IDF vectorizer
+        
+    Returns:
+        tuple: (positions, X) where positions are the indices in comments of the
+            rows of X, and X is the dense feature matrix (TF-IDF + numerical)
+    """
+    try:
+        positions = [i for i, comment in enumerate(comments) if not is_trivial_comment(comment)]
+        originals = pd.Series([comments[i] for i in positions], dtype=object)
+        cleaned = originals.map(preprocess_comment)
+
+        # Same rule as feature_engineering: drop comments that are empty after cleaning
+        keep = (cleaned.str.strip() != '').to_numpy(dtype=bool)
+        positions = np.asarray(positions, dtype=np.int64)[keep]
+        originals, cleaned = originals[keep], cleaned[keep]
+
+        if len(positions) == 0:
+            return positions, np.empty((0, len(vectorizer.vocabulary_) + len(NUMERICAL_FEATURES)), dtype=vectorizer.dtype)
+
+        numeric = compute_numeric_features(originals, cleaned)
+        tfidf = vectorizer.transform(cleaned.values).toarray()
+        # Numerical features take the vectorizer's dtype (float32 by default) instead of promoting to float64
+        X = np.hstack([tfidf, numeric.values.astype(tfidf.dtype)])
+        return positions, X
+    except Exception as e:
+        logger.error(f"Error featurizing comments: {e}")
+        raise
+
+
+def benchmark_numeric_features(n_rows=1_000_000, seed=42) -> dict:
+    """Time compute_numeric_features against the per-row apply version and explode + isin on synthetic comments."""
+    import time
+
+    rng = np.random.default_rng(seed)
+    words = np.array(sorted(STOP_WORDS)[:50] + ['great', 'video', 'love', 'bad', 'boring', 'thanks', '😊', 'lol'])
+    lengths = rng.integers(1, 30, size=n_rows)
+    flat = rng.choice(words, size=int(lengths.sum()))
+    comments = pd.Series([' '.join(chunk) for chunk in np.split(flat, np.cumsum(lengths)[:-1])], dtype=object)
+
+    start = time.perf_counter()
+    legacy = pd.DataFrame({
+        'word_count': comments.apply(lambda x: len(x.split())),
+        'num_stop_words': comments.apply(lambda x: len([word for word in x.split() if word in STOP_WORDS])),
+        'num_chars': comments.apply(len)
+    })
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tokens = comments.str.split().explode()
+    exploded = pd.DataFrame({
+        'word_count': tokens.notna().groupby(level=0).sum(),
+        'num_stop_words': tokens.isin(STOP_WORDS).groupby(level=0).sum(),
+        'num_chars': comments.str.len()
+    })
+    explode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    features = compute_numeric_features(comments)
+    kernel_seconds = time.perf_counter() - start
+
+    return {
+        'n_rows': n_rows,
+        'apply_seconds': round(legacy_seconds, 3),
+        'explode_isin_seconds': round(explode_seconds, 3),
+        'kernel_seconds': round(kernel_seconds, 3),
+        'speedup': round(legacy_seconds / kernel_seconds, 2),
+        'speedup_vs_explode_isin': round(explode_seconds / kernel_seconds, 2),
+        'identical': bool((legacy.values == features.values).all() and (exploded.values == features.values).all())
+    }
+
+
+def preprocessing_code_version(preprocess_comment) -> str:
+    """Fingerprint of everything that determines the cleaned comment and its features.
+
+    Covers the source of preprocess_comment and compute_numeric_features, the
+    URL/character patterns, the stopword list and the NLTK version (lemmatizer
+    data), so the preprocessing cache invalidates itself when any of them changes.
+    """
+    import hashlib
+    import inspect
+
+    parts = [
+        inspect.getsource(preprocess_comment),
+        inspect.getsource(compute_numeric_features),
+        HTTP_URL_PATTERN,
+        WWW_URL_PATTERN,
+        NON_CONTENT_CHAR_PATTERN.pattern,
+        ' '.join(sorted(STOP_WORDS)),
+        nltk.__version__
+    ]
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def preprocess_comments(comments, preprocess_comment) -> pd.DataFrame:
+    """Cleaned comments and numerical features for a column of raw comments."""
+    clean_comments = comments.apply(preprocess_comment)
+    features = compute_numeric_features(comments, clean_comments)
+    features.insert(0, 'clean_comment', clean_comments)
+    return features
+
+
+def feature_engineering(df, preprocess_comment, cache=None) -> pd.DataFrame:
+    """Apply preprocessing to the text data in the dataframe.
+
+    When a PreprocessingCache is given, only the comments missing from it are
+    preprocessed; the others are read back from the cache.
+    """
     try:
         # Removing missing values
         df.dropna(inplace=True)
@@ -164,22 +559,24 @@ def feature_engineering(df, preprocess_comment) -> pd.DataFrame:
         # Removing rows with empty strings
         df = df[df['Comment'].str.strip() != '']
         
-        # Features from original text (before preprocessing)
-        df['word_count'] = df['Comment'].apply(lambda x: len(x.split()))
-        
-        stop_words = set(stopwords.words('english')) - {'not', 'but', 'however', 'no', 'yet'}
-        df['num_stop_words'] = df['Comment'].apply(lambda x: len([word for word in x.split() if word in stop_words]))
-        
-        df['num_chars'] = df['Comment'].apply(len)
+        # Cleaned comments and features from the original text (before preprocessing)
+        if cache is not None:
+            processed = cache.get_or_compute(df['Comment'], lambda comments: preprocess_comments(comments, preprocess_comment))
+        else:
+            processed = preprocess_comments(df['Comment'], preprocess_comment)
 
-        # Applying the preprocessing to the comments
-        df['clean_comment'] = df['Comment'].apply(preprocess_comment)
+        df = df.assign(
+            word_count=processed['word_count'],
+            num_stop_words=processed['num_stop_words'],
+            num_chars=processed['num_chars'],
+            clean_comment=processed['clean_comment']
+        )
         df.drop(columns=['Comment'], inplace=True)
 
         # Remove rows with empty comment
         df = df[~(df['clean_comment'].str.strip() == '')]
         
-        df['num_chars_cleaned'] = df['clean_comment'].apply(len)
+        df = df.assign(num_chars_cleaned=processed['num_chars_cleaned'])
 
         df['category'] = df['Sentiment'].map({'positive': 1, 'neutral': 0, 'negative': 2})
         df.drop(columns=['Sentiment'], inplace=True)
@@ -269,20 +666,141 @@ def split_data(df, test_size=0.2, val_size=0.1, random_state=42, stratify_column
         logger.error(f"Error during data splitting: {e}")
         raise
 
+def assign_hash_splits(keys, test_size=0.2, val_size=0.1, salt='') -> np.ndarray:
+    """Assign each key to 'train', 'val' or 'test' from a stable hash of its value.
+
+    The first 8 bytes of blake2b(salt + key) are mapped to [0, 1) and compared
+    with the test_size / test_size + val_size thresholds. The split of a row
+    only depends on its own key, so equal comments always share a split and
+    adding rows never moves existing ones.
+    
+    Args:
+        keys (iterable): Comment texts or IDs
+        test_size (float): Proportion of keys assigned to test
+        val_size (float): Proportion of keys assigned to val
+        salt (str): Changes the whole assignment (e.g. the random_state)
+        
+    Returns:
+        np.ndarray: Split name of every key
+    """
+    import hashlib
+
+    prefix = f'{salt}\0'.encode('utf-8')
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(prefix + str(key).encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+         for key in keys),
+        dtype=np.uint64
+    )
+    position = hashes / np.float64(2 ** 64)
+    return np.where(position < test_size, 'test', np.where(position < test_size + val_size, 'val', 'train'))
+
+
+def split_balance_report(counts) -> dict:
+    """Share of each class in each split, from a class x split count table."""
+    counts = counts.reindex(columns=['train', 'val', 'test'], fill_value=0)
+    shares = counts.div(counts.sum(axis=1), axis=0).round(4)
+    return {str(label): row.to_dict() for label, row in shares.iterrows()}
+
+
+def split_data_by_hash(df, test_size=0.2, val_size=0.1, key_column='Comment', salt='', stratify_column=None):
+    """
+    Split the dataframe into train, validation, and test sets by hashing key_column.
+
+    Deterministic counterpart of split_data: see assign_hash_splits. Every class
+    is assigned independently of its label, so class proportions are preserved in
+    expectation; with stratify_column the per-class split shares are logged.
+    
+    Returns:
+    --------
+    tuple : (train_data, val_data, test_data)
+    """
+    try:
+        if not (0 < test_size < 1) or not (0 < val_size < 1) or test_size + val_size >= 1:
+            raise ValueError(f"Invalid split sizes: test_size={test_size}, val_size={val_size}")
+
+        splits = assign_hash_splits(df[key_column], test_size, val_size, salt)
+
+        if stratify_column and stratify_column in df.columns:
+            balance = split_balance_report(pd.crosstab(df[stratify_column], splits))
+            logger.debug(f"Hash split class balance: {balance}")
+
+        train_data, val_data, test_data = (df[splits == name] for name in ('train', 'val', 'test'))
+        logger.debug(f"Hash split completed: {len(train_data)} train, {len(val_data)} val, {len(test_data)} test")
+        return train_data, val_data, test_data
+
+    except Exception as e:
+        logger.error(f"Error during hash-based data splitting: {e}")
+        raise
+
+
+def stream_split_csv(csv_path, output_path, test_size=0.2, val_size=0.1, key_column='Comment', salt='',
+                     stratify_column=None, chunksize=100_000) -> dict:
+    """Hash-split a CSV chunk by chunk into output_path/{train,val,test}.csv.
+
+    Only one chunk is in memory at a time; rows keep their input order inside
+    each split, so splitting a CSV that only had rows appended reproduces the
+    previous splits plus the new rows.
+    
+    Returns:
+        dict: 'counts' (rows per split) and, with stratify_column, 'class_balance'
+    """
+    try:
+        os.makedirs(output_path, exist_ok=True)
+        paths = {name: os.path.join(output_path, f"{name}.csv") for name in ('train', 'val', 'test')}
+        counts = {name: 0 for name in paths}
+        class_counts = None
+        header_written = False
+
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            splits = assign_hash_splits(chunk[key_column], test_size, val_size, salt)
+            for name, path in paths.items():
+                rows = chunk[splits == name]
+                # The first chunk (re)creates the files with their header
+                rows.to_csv(path, mode='a' if header_written else 'w', header=not header_written, index=False)
+                counts[name] += len(rows)
+            header_written = True
+
+            if stratify_column:
+                chunk_counts = pd.crosstab(chunk[stratify_column], splits)
+                class_counts = chunk_counts if class_counts is None else class_counts.add(chunk_counts, fill_value=0)
+
+        report = {'counts': counts}
+        if class_counts is not None:
+            report['class_balance'] = split_balance_report(class_counts)
+        logger.debug(f"Streaming hash split of {csv_path} completed: {report}")
+        return report
+
+    except Exception as e:
+        logger.error(f"Error during streaming hash split: {e}")
+        raise
+
 def main():
-    from utilities import load_data, save_data
+    from utilities import load_params, load_data, save_data
     from utilities import RAW_DATA_PATH, INTERIM_DATA_PATH
+    from data_handling.preprocessing_cache import PreprocessingCache
     
     print(">>> Stage 2: Starting Data Preprocessing pipeline...")
+    params = load_params('params.yaml')['data_preprocessing']
+
     # 1. Loading the data
     train_data = load_data(os.path.join(RAW_DATA_PATH, "train.csv"))
     val_data = load_data(os.path.join(RAW_DATA_PATH, "val.csv"))
     test_data = load_data(os.path.join(RAW_DATA_PATH, "test.csv"))
     
-    # 2. Preprocess the dataset
-    train_df = feature_engineering(train_data, preprocess_comment)
-    val_df = feature_engineering(val_data, preprocess_comment)
-    test_df = feature_engineering(test_data, preprocess_comment)
+    # 2. Preprocess the dataset, reusing the comments preprocessed by earlier runs
+    cache = None
+    if params['use_cache']:
+        cache = PreprocessingCache(params['cache_path'], preprocessing_code_version(preprocess_comment))
+
+    train_df = feature_engineering(train_data, preprocess_comment, cache)
+    val_df = feature_engineering(val_data, preprocess_comment, cache)
+    test_df = feature_engineering(test_data, preprocess_comment, cache)
+
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Preprocessing cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.2%})")
+        cache.save_stats(params['cache_stats_path'])
+        cache.close()
 
     print(train_df.head())
     print(val_df.head())
@@ -293,5 +811,26 @@ def main():
 
     print(">>> Stage 2: Data Preprocessing pipeline completed successfully...")
 
+def verify_fused_main():
+    import pickle
+    from utilities import load_data
+    from utilities import RAW_DATA_PATH, INTERIM_DATA_PATH
+
+    with open('models/tfidf_vectorizer.pkl', 'rb') as f:
+        vectorizer = pickle.load(f)
+
+    for split in ['train', 'val', 'test']:
+        raw_df = load_data(os.path.join(RAW_DATA_PATH, f"{split}.csv"))
+        interim_df = load_data(os.path.join(INTERIM_DATA_PATH, f"{split}_processed.csv"))
+        report = verify_fused_features(raw_df, interim_df, vectorizer)
+        print(f"{split}: {report}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # python data_handling/data_preprocessing.py --verify-fused
+    # python data_handling/data_preprocessing.py --benchmark-numeric
+    if '--verify-fused' in sys.argv:
+        verify_fused_main()
+    elif '--benchmark-numeric' in sys.argv:
+        print(benchmark_numeric_features())
+    else:
+        main()
\ No newline at end of file
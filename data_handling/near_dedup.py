@@ -0,0 +1,272 @@
+import os, sys
+from os.path import dirname as up
+
+# Add parent directory to Python path to allow imports from utilities
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import numpy as np
+import pandas as pd
+import json
+import time
+import hashlib
+import logging
+
+# logging configuration
+logger = logging.getLogger('near_dedup')
+logger.setLevel('DEBUG')
+
+# Only add handlers if they don't already exist to prevent duplicate logging
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel('DEBUG')
+
+    file_handler = logging.FileHandler('near_dedup_errors.log')
+    file_handler.setLevel('ERROR')
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes, as in datasketch
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+NUMERICAL_FEATURES = ['word_count', 'num_stop_words', 'num_chars', 'num_chars_cleaned']
+
+
+def lsh_bands(num_perm: int, threshold: float) -> tuple:
+    """Number of bands and rows per band whose S-curve midpoint (1/b)^(1/r) is closest to threshold."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+def shingle_hashes(text: str, shingle_size: int) -> list:
+    """32-bit hashes of the word shingles of a cleaned comment.
+
+    Comments shorter than shingle_size words are a single shingle.
+    """
+    tokens = text.split()
+    if len(tokens) <= shingle_size:
+        shingles = [' '.join(tokens)]
+    else:
+        shingles = [' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+    return [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in set(shingles)]
+
+
+class MinHasher:
+    """MinHash signatures of many comments at once."""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 42):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def signatures(self, texts, block_size: int = 1024) -> np.ndarray:
+        """Signatures of texts, shape (len(texts), num_perm), dtype uint32.
+
+        Texts are hashed block_size at a time to bound the (n_shingles, num_perm) buffer.
+        """
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(texts), block_size):
+            hashes = [shingle_hashes(text, self.shingle_size) for text in texts[start:start + block_size]]
+            lengths = np.fromiter((len(h) for h in hashes), dtype=np.int64, count=len(hashes))
+            flat = np.fromiter((value for h in hashes for value in h), dtype=np.uint64, count=int(lengths.sum()))
+
+            # uint64 products wrap around, like datasketch's implementation
+            permuted = ((flat[:, None] * self.a + self.b) % MERSENNE_PRIME) & MAX_HASH
+            offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+            signatures[start:start + len(hashes)] = np.minimum.reduceat(permuted, offsets, axis=0)
+        return signatures
+
+
+class NearDuplicateIndex:
+    """Streaming LSH index that maps each comment to the first near-duplicate seen before it.
+
+    Comments only collapse onto a representative with the same label, and a
+    band collision is only accepted when the estimated Jaccard similarity of
+    the signatures reaches the threshold.
+    """
+
+    def __init__(self, num_perm: int, threshold: float):
+        self.threshold = threshold
+        self.n_bands, self.band_rows = lsh_bands(num_perm, threshold)
+        self.tables = [{} for _ in range(self.n_bands)]
+        self.signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self.weights = []
+        self.rows = []
+
+    def _band_keys(self, signature: np.ndarray, label) -> list:
+        return [
+            (label, signature[band * self.band_rows:(band + 1) * self.band_rows].tobytes())
+            for band in range(self.n_bands)
+        ]
+
+    def add(self, row: int, signature: np.ndarray, label) -> int:
+        """Insert a comment; returns the index of its representative."""
+        keys = self._band_keys(signature, label)
+        checked = set()
+        for table, key in zip(self.tables, keys):
+            candidate = table.get(key)
+            if candidate is None or candidate in checked:
+                continue
+            checked.add(candidate)
+            if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                self.weights[candidate] += 1
+                return candidate
+
+        representative = len(self.rows)
+        if representative == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.empty_like(self.signatures)])
+        self.signatures[representative] = signature
+        self.weights.append(1)
+        self.rows.append(row)
+        for table, key in zip(self.tables, keys):
+            table.setdefault(key, representative)
+        return representative
+
+
+def collapse_near_duplicates(input_path: str, output_path: str, threshold: float = 0.8, num_perm: int = 128,
+                             shingle_size: int = 3, chunksize: int = 50_000, seed: int = 42) -> dict:
+    """Collapse near-duplicate comments of a processed CSV into single weighted rows.
+
+    Two streaming passes over input_path: the first builds the LSH index chunk by
+    chunk, the second writes the representative rows (the first occurrence of
+    each cluster) with a 'weight' column holding the size of their cluster.
+    Memory grows with the number of representatives, not with the file size.
+
+    Returns:
+        dict: Deduplication report
+    """
+    try:
+        hasher = MinHasher(num_perm, shingle_size, seed)
+        index = NearDuplicateIndex(num_perm, threshold)
+
+        n_rows = 0
+        for chunk in pd.read_csv(input_path, chunksize=chunksize):
+            signatures = hasher.signatures(chunk['clean_comment'].astype(str).tolist())
+            for offset, (signature, label) in enumerate(zip(signatures, chunk['category'].tolist())):
+                index.add(n_rows + offset, signature, label)
+            n_rows += len(chunk)
+
+        weights = np.zeros(n_rows, dtype=np.int64)
+        weights[index.rows] = index.weights
+
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        start = 0
+        for i, chunk in enumerate(pd.read_csv(input_path, chunksize=chunksize)):
+            chunk_weights = weights[start:start + len(chunk)]
+            kept = chunk[chunk_weights > 0].assign(weight=chunk_weights[chunk_weights > 0])
+            kept.to_csv(output_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            start += len(chunk)
+
+        n_kept = len(index.rows)
+        report = {
+            'n_rows': n_rows,
+            'n_rows_kept': n_kept,
+            'n_rows_removed': n_rows - n_kept,
+            'removed_fraction': round((n_rows - n_kept) / n_rows, 4) if n_rows else 0.0,
+            'largest_cluster': int(max(index.weights, default=0)),
+            'threshold': threshold,
+            'num_perm': num_perm,
+            'lsh_bands': index.n_bands,
+            'lsh_rows_per_band': index.band_rows
+        }
+        logger.debug(f'Near-duplicate collapse of {input_path}: {report}')
+        return report
+    except Exception as e:
+        logger.error(f'Error while collapsing near-duplicates: {e}')
+        raise
+
+
+def benchmark_training_savings(full_data: pd.DataFrame, dedup_data: pd.DataFrame, max_features: int,
+                               ngram_range: tuple, n_rounds: int, num_leaves: int, learning_rate: float) -> dict:
+    """Time a fixed number of LightGBM rounds on the full and on the collapsed training data."""
+    import lightgbm as lgb
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    try:
+        timings = {}
+        for name, data, weight in (('full', full_data, None), ('dedup', dedup_data, dedup_data['weight'].values)):
+            start = time.perf_counter()
+            vectorizer = TfidfVectorizer(max_features=max_features, ngram_range=ngram_range)
+            X = sp.hstack([vectorizer.fit_transform(data['clean_comment'].values),
+                           sp.csr_matrix(data[NUMERICAL_FEATURES].values)], format='csr')
+            model = lgb.LGBMClassifier(objective='multiclass', num_class=3, class_weight='balanced',
+                                       n_estimators=n_rounds, num_leaves=num_leaves,
+                                       learning_rate=learning_rate, verbose=-1)
+            model.fit(X, data['category'].values, sample_weight=weight)
+            timings[f'{name}_train_seconds'] = round(time.perf_counter() - start, 3)
+
+        timings['benchmark_rounds'] = n_rounds
+        timings['train_time_saved_fraction'] = round(1 - timings['dedup_train_seconds'] / timings['full_train_seconds'], 4)
+        return timings
+    except Exception as e:
+        logger.error(f'Error while benchmarking the training time savings: {e}')
+        raise
+
+
+def main():
+    from utilities import load_params, load_data
+    from utilities import INTERIM_DATA_PATH, PROCESSED_DATA_PATH
+
+    print(">>> Stage: Near-duplicate collapsing...")
+    params = load_params('params.yaml')
+    dedup_params = params['near_dedup']
+
+    input_path = os.path.join(INTERIM_DATA_PATH, 'train_processed.csv')
+    output_path = os.path.join(PROCESSED_DATA_PATH, 'train_processed.csv')
+
+    if dedup_params['enabled']:
+        report = collapse_near_duplicates(
+            input_path, output_path,
+            threshold=dedup_params['threshold'],
+            num_perm=dedup_params['num_perm'],
+            shingle_size=dedup_params['shingle_size'],
+            chunksize=dedup_params['chunksize'],
+            seed=dedup_params['seed']
+        )
+    else:
+        # Same output layout, every row is its own cluster
+        os.makedirs(PROCESSED_DATA_PATH, exist_ok=True)
+        train_data = load_data(input_path).assign(weight=1)
+        train_data.to_csv(output_path, index=False)
+        report = {'n_rows': len(train_data), 'n_rows_kept': len(train_data), 'n_rows_removed': 0, 'removed_fraction': 0.0}
+
+    # Two extra TF-IDF + LightGBM fits, only on request
+    if dedup_params['enabled'] and dedup_params.get('benchmark', False) and dedup_params['benchmark_rounds'] > 0:
+        report.update(benchmark_training_savings(
+            load_data(input_path), load_data(output_path),
+            max_features=dedup_params['benchmark_max_features'],
+            ngram_range=tuple(dedup_params['benchmark_ngram_range']),
+            n_rounds=dedup_params['benchmark_rounds'],
+            num_leaves=dedup_params['benchmark_num_leaves'],
+            learning_rate=dedup_params['benchmark_learning_rate']
+        ))
+
+    print(f"\n{'='*50}")
+    print(f"Rows: {report['n_rows']} -> {report['n_rows_kept']} ({report['n_rows_removed']} collapsed)")
+    if 'train_time_saved_fraction' in report:
+        print(f"Training time ({report['benchmark_rounds']} rounds): {report['full_train_seconds']:.2f}s -> "
+              f"{report['dedup_train_seconds']:.2f}s ({report['train_time_saved_fraction']:.1%} saved)")
+    print(f"{'='*50}\n")
+
+    with open('data/near_dedup_report.json', 'w') as f:
+        json.dump(report, f, indent=4)
+
+    print(">>> Stage: Near-duplicate collapsing completed successfully...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os, sys
+from os.path import dirname as up
+
+# Add parent directory to Python path to allow imports from utilities
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import pandas as pd
+import json
+import sqlite3
+import hashlib
+import logging
+
+# logging configuration
+logger = logging.getLogger('preprocessing_cache')
+logger.setLevel('DEBUG')
+
+# Only add handlers if they don't already exist to prevent duplicate logging
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel('DEBUG')
+
+    file_handler = logging.FileHandler('preprocessing_cache_errors.log')
+    file_handler.setLevel('ERROR')
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+
+# Columns stored for every comment, in the order of the cache table
+CACHED_COLUMNS = ['clean_comment', 'word_count', 'num_stop_words', 'num_chars', 'num_chars_cleaned']
+
+# SQLite limits the number of bound parameters per statement
+LOOKUP_CHUNK_SIZE = 900
+
+
+class PreprocessingCache:
+    """Persistent content-addressed cache of preprocessed comments (SQLite).
+
+    Entries are keyed by sha256(code_version + raw comment) and hold the cleaned
+    comment and its numerical features. ``code_version`` identifies the
+    preprocessing logic: when it changes, no old key can match, and the stale
+    entries are deleted when the cache is opened.
+    """
+
+    def __init__(self, db_path: str, code_version: str):
+        self.db_path = db_path
+        self.code_version = code_version
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, code_version TEXT NOT NULL, clean_comment TEXT NOT NULL, '
+            'word_count INTEGER NOT NULL, num_stop_words INTEGER NOT NULL, '
+            'num_chars INTEGER NOT NULL, num_chars_cleaned INTEGER NOT NULL) WITHOUT ROWID'
+        )
+        self.n_invalidated = self._invalidate_stale_entries()
+
+    def _invalidate_stale_entries(self) -> int:
+        """Delete the entries written by another version of the preprocessing code."""
+        with self.connection:
+            cursor = self.connection.execute('DELETE FROM entries WHERE code_version != ?', (self.code_version,))
+        if cursor.rowcount > 0:
+            logger.debug(f'Preprocessing code changed, invalidated {cursor.rowcount} cached entries')
+        return cursor.rowcount
+
+    def make_key(self, comment: str) -> str:
+        """Content address of a raw comment for the current code version."""
+        return hashlib.sha256(f'{self.code_version}\0{comment}'.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def lookup(self, keys) -> dict:
+        """Cached rows for the given keys as {key: (clean_comment, word_count, ...)}; missing keys are absent."""
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            cursor = self.connection.execute(
+                f"SELECT key, {', '.join(CACHED_COLUMNS)} FROM entries WHERE key IN ({placeholders})", chunk
+            )
+            found.update((row[0], row[1:]) for row in cursor)
+        return found
+
+    def store(self, rows: dict) -> None:
+        """Insert rows given as {key: (clean_comment, word_count, ...)}."""
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((key, self.code_version, *values) for key, values in rows.items())
+            )
+
+    def get_or_compute(self, comments: pd.Series, compute) -> pd.DataFrame:
+        """Preprocessed features for comments, only calling compute on cache misses.
+
+        Args:
+            comments (pd.Series): Raw comments
+            compute (callable): Takes a Series of raw comments and returns a
+                DataFrame with the CACHED_COLUMNS columns, indexed like its input
+
+        Returns:
+            pd.DataFrame: CACHED_COLUMNS for every comment, indexed like comments
+        """
+        try:
+            values = comments.tolist()
+            keys = [self.make_key(comment) for comment in values]
+            unique = dict(zip(keys, values))
+
+            rows = self.lookup(unique)
+            missing = {key: comment for key, comment in unique.items() if key not in rows}
+
+            if missing:
+                computed = compute(pd.Series(list(missing.values()), index=list(missing.keys()), dtype=comments.dtype))
+                computed_rows = {
+                    key: (clean, int(words), int(stop_words), int(chars), int(chars_cleaned))
+                    for key, clean, words, stop_words, chars, chars_cleaned
+                    in computed[CACHED_COLUMNS].itertuples(index=True, name=None)
+                }
+                self.store(computed_rows)
+                rows.update(computed_rows)
+
+            self.hits += len(unique) - len(missing)
+            self.misses += len(missing)
+            logger.debug(f'Preprocessing cache: {len(unique) - len(missing)} hits, {len(missing)} misses')
+
+            result = pd.DataFrame.from_records([rows[key] for key in keys], columns=CACHED_COLUMNS, index=comments.index)
+            dtypes = {column: 'int64' for column in CACHED_COLUMNS[1:]}
+            dtypes['clean_comment'] = comments.dtype
+            return result.astype(dtypes)
+        except Exception as e:
+            logger.error(f'Error while reading through the preprocessing cache: {e}')
+            raise
+
+    def stats(self) -> dict:
+        """Hit-rate report of the lookups made since the cache was opened."""
+        lookups = self.hits + self.misses
+        (n_entries,) = self.connection.execute('SELECT COUNT(*) FROM entries').fetchone()
+        return {
+            'code_version': self.code_version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'invalidated': self.n_invalidated,
+            'entries': n_entries
+        }
+
+    def save_stats(self, file_path: str) -> None:
+        """Write the hit-rate report to a JSON file."""
+        try:
+            os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+            with open(file_path, 'w') as file:
+                json.dump(self.stats(), file, indent=4)
+            logger.debug('Preprocessing cache stats saved to %s', file_path)
+        except Exception as e:
+            logger.error('Error occurred while saving the cache stats: %s', e)
+            raise
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,155 @@
+import os, sys
+from os.path import dirname as up
+
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import numpy as np
+
+import json
+import pickle
+import logging
+from scipy.optimize import minimize_scalar
+
+# logging configuration
+logger = logging.getLogger('calibration')
+logger.setLevel('DEBUG')
+
+# Only add handlers if they don't already exist to prevent duplicate logging
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel('DEBUG')
+
+    file_handler = logging.FileHandler('calibration_errors.log')
+    file_handler.setLevel('ERROR')
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+
+# Probabilities are clipped before taking logs
+EPSILON = 1e-12
+
+
+class TemperatureCalibrator:
+    """Temperature scaling of multiclass probabilities.
+
+    ``softmax(log(p) / T)`` equals ``softmax(raw_score / T)``, so it can be applied
+    to the ``predict_proba`` output of any backend. A single temperature never
+    changes the argmax, so the predicted classes stay those of the model.
+    """
+
+    def __init__(self, temperature: float = 1.0):
+        self.temperature = float(temperature)
+
+    def transform(self, proba: np.ndarray) -> np.ndarray:
+        """Calibrated probabilities, same shape as proba."""
+        if self.temperature == 1.0:
+            return proba
+        scores = np.log(np.clip(proba, EPSILON, 1.0)) / self.temperature
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def fit(self, proba: np.ndarray, y_index: np.ndarray) -> 'TemperatureCalibrator':
+        """Pick the temperature minimizing the negative log-likelihood of the true classes."""
+        log_proba = np.log(np.clip(proba, EPSILON, 1.0))
+
+        def nll(log_temperature):
+            scores = log_proba / np.exp(log_temperature)
+            scores -= scores.max(axis=1, keepdims=True)
+            log_norm = np.log(np.exp(scores).sum(axis=1))
+            return float(np.mean(log_norm - scores[np.arange(len(y_index)), y_index]))
+
+        result = minimize_scalar(nll, bounds=(np.log(0.05), np.log(20.0)), method='bounded')
+        self.temperature = float(np.exp(result.x))
+        return self
+
+    def save(self, file_path: str, extra_info: dict = None) -> None:
+        with open(file_path, 'w') as f:
+            json.dump({'method': 'temperature', 'temperature': self.temperature, **(extra_info or {})}, f, indent=4)
+
+    @classmethod
+    def load(cls, file_path: str) -> 'TemperatureCalibrator':
+        with open(file_path, 'r') as f:
+            return cls(json.load(f)['temperature'])
+
+
+def negative_log_likelihood(proba: np.ndarray, y_index: np.ndarray) -> float:
+    """Mean negative log-likelihood of the true classes."""
+    return float(-np.mean(np.log(np.clip(proba[np.arange(len(y_index)), y_index], EPSILON, 1.0))))
+
+
+def expected_calibration_error(proba: np.ndarray, y_index: np.ndarray, n_bins: int = 15) -> float:
+    """Gap between confidence and accuracy, averaged over equal-width confidence bins."""
+    confidence = proba.max(axis=1)
+    correct = (proba.argmax(axis=1) == y_index).astype(np.float64)
+    bins = np.minimum((confidence * n_bins).astype(np.int64), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    gaps = np.abs(np.bincount(bins, weights=correct, minlength=n_bins) - np.bincount(bins, weights=confidence, minlength=n_bins))
+    return float(gaps.sum() / counts.sum())
+
+
+def fit_calibrator(model, X_val, y_val: np.ndarray, n_bins: int = 15) -> tuple:
+    """Fit a TemperatureCalibrator on the validation split.
+
+    Returns (calibrator, report) where the report compares NLL and ECE before and after.
+    """
+    try:
+        proba = model.predict_proba(X_val)
+        class_index = {label: i for i, label in enumerate(model.classes_)}
+        y_index = np.array([class_index[label] for label in y_val], dtype=np.int64)
+
+        calibrator = TemperatureCalibrator().fit(proba, y_index)
+        calibrated = calibrator.transform(proba)
+
+        report = {
+            'n_samples': int(len(y_index)),
+            'temperature': calibrator.temperature,
+            'nll_before': negative_log_likelihood(proba, y_index),
+            'nll_after': negative_log_likelihood(calibrated, y_index),
+            'ece_before': expected_calibration_error(proba, y_index, n_bins),
+            'ece_after': expected_calibration_error(calibrated, y_index, n_bins)
+        }
+        logger.debug(f'Calibration fitted: {report}')
+        return calibrator, report
+    except Exception as e:
+        logger.error('Error while fitting the calibrator: %s', e)
+        raise
+
+
+def main():
+    try:
+        from utilities import load_params
+        from model_creation.feature_store import load_split
+
+        params = load_params('params.yaml')
+        n_bins = params.get('calibration', {}).get('n_bins', 15)
+
+        with open('models/lgbm_model.pkl', 'rb') as f:
+            model = pickle.load(f)
+
+        # Validation features from the featurize stage
+        val_split = load_split('val')
+        calibrator, report = fit_calibrator(model, val_split['X'], val_split['y'], n_bins)
+
+        print(f"\n{'='*50}")
+        print(f"Temperature: {report['temperature']:.4f}")
+        print(f"Validation NLL: {report['nll_before']:.4f} -> {report['nll_after']:.4f}")
+        print(f"Validation ECE: {report['ece_before']:.4f} -> {report['ece_after']:.4f}")
+        print(f"{'='*50}\n")
+
+        calibrator.save('models/calibration.json', report)
+        logger.debug('Calibration saved to models/calibration.json')
+
+    except Exception as e:
+        logger.error('Failed to complete the calibration process: %s', e)
+        print(f"Error: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import os, sys
+from os.path import dirname as up
+
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import numpy as np
+import scipy.sparse as sp
+
+import json
+import pickle
+import logging
+from sklearn.linear_model import LogisticRegression
+from model_creation.calibration import TemperatureCalibrator, fit_calibrator
+
+# logging configuration
+logger = logging.getLogger('cascade')
+logger.setLevel('DEBUG')
+
+# Only add handlers if they don't already exist to prevent duplicate logging
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel('DEBUG')
+
+    file_handler = logging.FileHandler('cascade_errors.log')
+    file_handler.setLevel('ERROR')
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+
+NUMERICAL_FEATURES = ['word_count', 'num_stop_words', 'num_chars', 'num_chars_cleaned']
+
+# No probability reaches it, so every comment goes to LightGBM
+DISABLED_THRESHOLD = 1.01
+
+
+def train_linear(X_train_tfidf: sp.csr_matrix, y_train: np.ndarray, C: float, max_iter: int,
+                 sample_weight: np.ndarray = None) -> LogisticRegression:
+    """Fit the fast tier: multinomial logistic regression on the sparse TF-IDF columns only."""
+    try:
+        linear_model = LogisticRegression(C=C, max_iter=max_iter, class_weight='balanced')
+        linear_model.fit(X_train_tfidf, y_train, sample_weight=sample_weight)
+        logger.debug(f'Linear model trained on {X_train_tfidf.shape[1]} TF-IDF features')
+        return linear_model
+    except Exception as e:
+        logger.error('Error during linear model training: %s', e)
+        raise
+
+
+def cascade_predict(linear_model, model, X, n_text_features: int, threshold: float,
+                    linear_temperature: float = 1.0) -> tuple:
+    """Predict with the linear model where it is confident enough, LightGBM elsewhere.
+
+    ``X`` is the full feature matrix (TF-IDF columns followed by the numerical
+    features); the linear model only sees the first ``n_text_features`` columns.
+    Its confidence is temperature-scaled with ``linear_temperature`` before the
+    threshold, like in the API.
+    Returns (predictions, fast_mask) where fast_mask marks the rows answered by the linear model.
+    """
+    linear_proba = TemperatureCalibrator(linear_temperature).transform(linear_model.predict_proba(X[:, :n_text_features]))
+    fast_mask = linear_proba.max(axis=1) >= threshold
+    predictions = np.asarray(linear_model.classes_)[linear_proba.argmax(axis=1)]
+    if not fast_mask.all():
+        predictions = predictions.astype(np.asarray(model.classes_).dtype)
+        predictions[~fast_mask] = model.predict(X[~fast_mask])
+    return predictions, fast_mask
+
+
+def tune_threshold(linear_proba: np.ndarray, linear_classes: np.ndarray, model_pred: np.ndarray,
+                   y_val: np.ndarray, max_accuracy_drop: float) -> dict:
+    """Lowest confidence threshold whose cascade accuracy stays within max_accuracy_drop of LightGBM.
+
+    The lower the threshold, the more comments the linear model answers, so
+    the first threshold of an increasing grid that meets the accuracy budget
+    maximizes the traffic handled by the fast tier. When no threshold meets it,
+    ``budget_met`` is False and the threshold is DISABLED_THRESHOLD, which turns
+    the cascade off.
+    """
+    confidence = linear_proba.max(axis=1)
+    linear_pred = np.asarray(linear_classes)[linear_proba.argmax(axis=1)]
+    model_accuracy = float((model_pred == y_val).mean())
+
+    budget_met = False
+    for threshold in np.round(np.arange(0.34, 1.0001, 0.01), 2):
+        fast_mask = confidence >= threshold
+        cascade_pred = np.where(fast_mask, linear_pred, model_pred)
+        cascade_accuracy = float((cascade_pred == y_val).mean())
+        if cascade_accuracy >= model_accuracy - max_accuracy_drop:
+            budget_met = True
+            break
+
+    if not budget_met:
+        logger.warning(f'No threshold keeps the cascade within {max_accuracy_drop} of the LightGBM accuracy, cascade disabled')
+        threshold = DISABLED_THRESHOLD
+        fast_mask = np.zeros(len(y_val), dtype=bool)
+        cascade_accuracy = model_accuracy
+
+    return {
+        'threshold': float(threshold),
+        'budget_met': budget_met,
+        'val_fast_fraction': float(fast_mask.mean()),
+        'val_cascade_accuracy': cascade_accuracy,
+        'val_lgbm_accuracy': model_accuracy,
+        'val_linear_accuracy': float((linear_pred == y_val).mean())
+    }
+
+
+def main():
+    try:
+        from utilities import load_params
+        from model_creation.feature_store import load_split
+
+        params = load_params('params.yaml')
+        cascade_params = params.get('cascade', {})
+        n_bins = params.get('calibration', {}).get('n_bins', 15)
+
+        with open('models/lgbm_model.pkl', 'rb') as f:
+            model = pickle.load(f)
+
+        # Same training rows and weights as the LightGBM model, from the featurize stage
+        train_split = load_split('train')
+        n_text_features = train_split['X'].shape[1] - len(NUMERICAL_FEATURES)
+        linear_model = train_linear(train_split['X'][:, :n_text_features], train_split['y'],
+                                    C=cascade_params.get('C', 4.0), max_iter=cascade_params.get('max_iter', 1000),
+                                    sample_weight=train_split['weight'])
+
+        # The linear probabilities are temperature-scaled like LightGBM's (calibration stage),
+        # so both tiers return calibrated probabilities and the threshold is a calibrated confidence
+        val_split = load_split('val')
+        X_val = val_split['X']
+        linear_calibrator, calibration_report = fit_calibrator(linear_model, X_val[:, :n_text_features], val_split['y'], n_bins)
+        report = tune_threshold(
+            linear_calibrator.transform(linear_model.predict_proba(X_val[:, :n_text_features])), linear_model.classes_,
+            model.predict(X_val), val_split['y'], cascade_params.get('max_accuracy_drop', 0.005)
+        )
+        report['n_text_features'] = int(n_text_features)
+        report['linear_temperature'] = linear_calibrator.temperature
+        report['linear_ece_before'] = calibration_report['ece_before']
+        report['linear_ece_after'] = calibration_report['ece_after']
+
+        print(f"\n{'='*50}")
+        print(f"Linear model temperature: {report['linear_temperature']:.4f} "
+              f"(validation ECE {report['linear_ece_before']:.4f} -> {report['linear_ece_after']:.4f})")
+        if report['budget_met']:
+            print(f"Confidence threshold: {report['threshold']:.2f}")
+        else:
+            print(f"✗ No threshold meets max_accuracy_drop, cascade disabled (threshold {report['threshold']:.2f})")
+        print(f"Validation share answered by the linear model: {report['val_fast_fraction']:.2%}")
+        print(f"Validation accuracy: cascade {report['val_cascade_accuracy']:.4f}, "
+              f"LightGBM {report['val_lgbm_accuracy']:.4f}, linear {report['val_linear_accuracy']:.4f}")
+        print(f"{'='*50}\n")
+
+        with open('models/linear_model.pkl', 'wb') as f:
+            pickle.dump(linear_model, f)
+        with open('models/cascade.json', 'w') as f:
+            json.dump(report, f, indent=4)
+        logger.debug('Linear model and cascade threshold saved to models/')
+
+    except Exception as e:
+        logger.error('Failed to complete the cascade training process: %s', e)
+        print(f"Error: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+import os, sys
+from os.path import dirname as up
+
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import numpy as np
+
+import json
+import time
+import pickle
+import hashlib
+import logging
+import lightgbm as lgb
+
+# logging configuration
+logger = logging.getLogger('compiled_predictor')
+logger.setLevel('DEBUG')
+
+# Only add handlers if they don't already exist to prevent duplicate logging
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel('DEBUG')
+
+    file_handler = logging.FileHandler('compiled_predictor_errors.log')
+    file_handler.setLevel('ERROR')
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+
+# LightGBM missing value handling per split (see LightGBM's Tree::NumericalDecision)
+MISSING_TYPES = {'None': 0, 'Zero': 1, 'NaN': 2}
+K_ZERO_THRESHOLD = 1e-35
+
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 of a file, identifies the pickled model a predictor was compiled from."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CompiledLGBMPredictor:
+    """Numpy predictor over a LightGBM multiclass ensemble flattened into contiguous arrays.
+
+    Every node of every tree lives in the same arrays. Leaves have ``split_feature == -1``
+    and point to themselves, so a batch walks all trees level by level for exactly
+    ``max_depth`` steps without branching on leaves. ``source_model_hash`` is the
+    ``file_sha256`` of the pickled model it was compiled from, when known.
+    """
+
+    def __init__(self, split_feature, threshold, left_child, right_child, leaf_value,
+                 default_left, missing_type, roots, num_class, max_depth, classes, source_model_hash: str = ''):
+        self.split_feature = split_feature
+        self.threshold = threshold
+        self.left_child = left_child
+        self.right_child = right_child
+        self.leaf_value = leaf_value
+        self.default_left = default_left
+        self.missing_type = missing_type
+        self.roots = roots
+        self.num_class = int(num_class)
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.source_model_hash = str(source_model_hash)
+
+        self.has_missing = bool((missing_type != MISSING_TYPES['None']).any())
+
+    def raw_score(self, X: np.ndarray) -> np.ndarray:
+        """Per-class raw scores (sum of leaf values), shape (n_samples, num_class)."""
+        X = np.asarray(X, dtype=np.float64)
+        if not self.has_missing and np.isnan(X).any():
+            # Without missing value handling LightGBM treats NaN as zero
+            X = np.where(np.isnan(X), 0.0, X)
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_samples, dtype=np.int64) * n_features)[:, None]
+
+        nodes = np.broadcast_to(self.roots, (n_samples, len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            feature = self.split_feature[nodes]
+            values = flat_X[row_offsets + np.maximum(feature, 0)]
+            go_left = values <= self.threshold[nodes]
+
+            if self.has_missing:
+                missing_type = self.missing_type[nodes]
+                is_nan = np.isnan(values)
+                values = np.where(is_nan & (missing_type != MISSING_TYPES['NaN']), 0.0, values)
+                use_default = ((missing_type == MISSING_TYPES['Zero']) & (np.abs(values) <= K_ZERO_THRESHOLD)) | \
+                              ((missing_type == MISSING_TYPES['NaN']) & is_nan)
+                go_left = np.where(use_default, self.default_left[nodes], values <= self.threshold[nodes])
+
+            nodes = np.where(go_left, self.left_child[nodes], self.right_child[nodes])
+
+        # Trees are stored iteration by iteration, one tree per class
+        leaf_values = self.leaf_value[nodes]
+        return leaf_values.reshape(n_samples, -1, self.num_class).sum(axis=1)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Softmax over the raw scores, like LightGBM's multiclass objective."""
+        scores = self.raw_score(X)
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predicted class labels."""
+        return self.classes_[np.argmax(self.raw_score(X), axis=1)]
+
+    def save(self, file_path: str) -> None:
+        """Save the flattened arrays to an .npz file."""
+        np.savez(
+            file_path,
+            split_feature=self.split_feature, threshold=self.threshold,
+            left_child=self.left_child, right_child=self.right_child,
+            leaf_value=self.leaf_value, default_left=self.default_left,
+            missing_type=self.missing_type, roots=self.roots,
+            num_class=self.num_class, max_depth=self.max_depth, classes=self.classes_,
+            source_model_hash=np.asarray(self.source_model_hash)
+        )
+
+    @classmethod
+    def load(cls, file_path: str) -> 'CompiledLGBMPredictor':
+        """Load a predictor saved with ``save``."""
+        with np.load(file_path, allow_pickle=False) as data:
+            return cls(
+                data['split_feature'], data['threshold'], data['left_child'], data['right_child'],
+                data['leaf_value'], data['default_left'], data['missing_type'], data['roots'],
+                data['num_class'], data['max_depth'], data['classes'],
+                str(data['source_model_hash']) if 'source_model_hash' in data.files else ''
+            )
+
+
+def compile_model(model: lgb.LGBMClassifier, source_model_hash: str = '') -> CompiledLGBMPredictor:
+    """Flatten the trees of a fitted LGBMClassifier into a CompiledLGBMPredictor.
+
+    Raises:
+        ValueError: If a split uses a decision type other than ``<=`` (categorical splits)
+    """
+    try:
+        dump = model.booster_.dump_model()
+        split_feature, threshold, left_child, right_child = [], [], [], []
+        leaf_value, default_left, missing_type, roots = [], [], [], []
+        max_depth = 0
+
+        for tree in dump['tree_info']:
+            # Iterative pre-order walk, children indices are patched once they are known
+            roots.append(len(split_feature))
+            stack = [(tree['tree_structure'], None, None, 0)]
+            while stack:
+                node, parent, side, depth = stack.pop()
+                index = len(split_feature)
+                if parent is not None:
+                    (left_child if side == 'left' else right_child)[parent] = index
+                max_depth = max(max_depth, depth)
+
+                if 'split_index' in node:
+                    if node['decision_type'] != '<=':
+                        raise ValueError(f"Unsupported decision type {node['decision_type']}")
+                    split_feature.append(node['split_feature'])
+                    threshold.append(node['threshold'])
+                    default_left.append(node['default_left'])
+                    missing_type.append(MISSING_TYPES[node['missing_type']])
+                    leaf_value.append(0.0)
+                    left_child.append(-1)
+                    right_child.append(-1)
+                    stack.append((node['right_child'], index, 'right', depth + 1))
+                    stack.append((node['left_child'], index, 'left', depth + 1))
+                else:
+                    split_feature.append(-1)
+                    threshold.append(0.0)
+                    default_left.append(True)
+                    missing_type.append(MISSING_TYPES['None'])
+                    leaf_value.append(node['leaf_value'])
+                    left_child.append(index)
+                    right_child.append(index)
+
+        predictor = CompiledLGBMPredictor(
+            split_feature=np.asarray(split_feature, dtype=np.int32),
+            threshold=np.asarray(threshold, dtype=np.float64),
+            left_child=np.asarray(left_child, dtype=np.int32),
+            right_child=np.asarray(right_child, dtype=np.int32),
+            leaf_value=np.asarray(leaf_value, dtype=np.float64),
+            default_left=np.asarray(default_left, dtype=bool),
+            missing_type=np.asarray(missing_type, dtype=np.int8),
+            roots=np.asarray(roots, dtype=np.int32),
+            num_class=dump['num_tree_per_iteration'],
+            max_depth=max_depth,
+            classes=np.asarray(model.classes_),
+            source_model_hash=source_model_hash
+        )
+        logger.debug(f'Compiled {len(roots)} trees ({len(split_feature)} nodes, max depth {max_depth})')
+        return predictor
+    except Exception as e:
+        logger.error('Error while compiling the LightGBM model: %s', e)
+        raise
+
+
+def benchmark_predictors(model, predictor: CompiledLGBMPredictor, X: np.ndarray,
+                         batch_sizes: tuple = (1, 1024), repeats: int = 20) -> dict:
+    """Median latency in milliseconds of both backends for each batch size."""
+    results = {}
+    for batch_size in batch_sizes:
+        X_batch = X[np.arange(batch_size) % len(X)]
+        for backend, predict in (('lightgbm', model.predict), ('numpy', predictor.predict)):
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                predict(X_batch)
+                timings.append((time.perf_counter() - start) * 1000)
+            results[f'{backend}_batch_{batch_size}_ms'] = float(np.median(timings))
+    return results
+
+
+def main():
+    try:
+        from model_creation.feature_store import load_split
+
+        with open('models/lgbm_model.pkl', 'rb') as f:
+            model = pickle.load(f)
+
+        predictor = compile_model(model, file_sha256('models/lgbm_model.pkl'))
+
+        # Verify identical class outputs on the test set (stored features, densified like the API)
+        X_test = load_split('test')['X'].toarray()
+
+        n_mismatches = int((model.predict(X_test) != predictor.predict(X_test)).sum())
+        if n_mismatches > 0:
+            raise ValueError(f"Compiled predictor disagrees with LightGBM on {n_mismatches} test samples")
+
+        timings = benchmark_predictors(model, predictor, X_test)
+
+        print(f"\n{'='*50}")
+        print(f"Prediction mismatches on test set: {n_mismatches} / {len(X_test)}")
+        for batch_size in (1, 1024):
+            print(f"Batch {batch_size:>4}: lightgbm {timings[f'lightgbm_batch_{batch_size}_ms']:.3f} ms, "
+                  f"numpy {timings[f'numpy_batch_{batch_size}_ms']:.3f} ms")
+        print(f"{'='*50}\n")
+
+        predictor.save('models/lgbm_model_compiled.npz')
+        with open('models/compiled_predictor_report.json', 'w') as f:
+            json.dump({'n_samples': len(X_test), 'n_mismatches': n_mismatches, **timings}, f, indent=4)
+        logger.debug('Compiled predictor saved to models/lgbm_model_compiled.npz')
+
+    except Exception as e:
+        logger.error('Failed to complete the model compilation process: %s', e)
+        print(f"Error: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+# Feature store of the featurized splits (featurize stage)
+# The TF-IDF vectorizer is fitted once on the training split and every split is saved
+# as a compressed sparse matrix (TF-IDF columns followed by the numerical features)
+# with its labels, sample weights and the schema hash of the vectorizer:
+#   data/features/{train,val,test}.npz + data/features/schema.json
+# test_float64.npz holds the test split built by a float64 twin of the vectorizer,
+# the reference model_evaluation checks the pipeline's feature dtype against.
+# Tuning, training, calibration, cascade, compaction, compilation and evaluation load
+# these files, so changing only LightGBM parameters never re-runs the text processing.
+
+import os, sys
+from os.path import dirname as up
+
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import json
+import pickle
+import hashlib
+import logging
+from sklearn.base import clone
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# logging configuration
+logger = logging.getLogger('feature_store')
+logger.setLevel('DEBUG')
+
+# Only add handlers if they don't already exist to prevent duplicate logging
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel('DEBUG')
+
+    file_handler = logging.FileHandler('feature_store_errors.log')
+    file_handler.setLevel('ERROR')
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+
+NUMERICAL_FEATURES = ['word_count', 'num_stop_words', 'num_chars', 'num_chars_cleaned']
+
+FEATURES_DIR = 'data/features'
+SPLIT_PATHS = {
+    'train': 'data/processed/train_processed.csv',
+    'val': 'data/interim/val_processed.csv',
+    'test': 'data/interim/test_processed.csv'
+}
+
+
+def apply_tfidf(train_data: pd.DataFrame, max_features: int, ngram_range: tuple, dtype=np.float32) -> TfidfVectorizer:
+    """Fit the TF-IDF vectorizer with ngrams on the training split and save it to models/.
+
+    ``dtype`` is the feature dtype of the whole pipeline. It is pickled with the
+    vectorizer, so every stage and the API build their matrices in the same dtype.
+    """
+    try:
+        vectorizer = TfidfVectorizer(max_features=max_features, ngram_range=ngram_range, dtype=dtype)
+        vectorizer.fit(train_data['clean_comment'].values)
+        logger.debug(f"TF-IDF vectorizer fitted: {len(vectorizer.vocabulary_)} terms")
+
+        # Save the vectorizer in the models directory
+        os.makedirs('models', exist_ok=True)
+        with open(os.path.join('models', 'tfidf_vectorizer.pkl'), 'wb') as f:
+            pickle.dump(vectorizer, f)
+
+        return vectorizer
+    except Exception as e:
+        logger.error('Error during TF-IDF fitting: %s', e)
+        raise
+
+
+def float64_reference(vectorizer: TfidfVectorizer, train_data: pd.DataFrame) -> TfidfVectorizer:
+    """float64 twin of vectorizer: same vocabulary, IDF weights refitted in float64 on the training split."""
+    try:
+        reference = clone(vectorizer).set_params(dtype=np.float64, vocabulary=vectorizer.vocabulary_)
+        reference.fit(train_data['clean_comment'].values)
+        return reference
+    except Exception as e:
+        logger.error('Error while fitting the float64 reference vectorizer: %s', e)
+        raise
+
+
+def feature_schema(vectorizer: TfidfVectorizer) -> dict:
+    """Column layout of the feature matrices built with vectorizer, and its hash.
+
+    The hash covers the column names, the dtype and the fitted IDF weights, so
+    stored features only match the exact vectorizer they were built with.
+    """
+    feature_names = vectorizer.get_feature_names_out().tolist() + NUMERICAL_FEATURES
+    digest = hashlib.sha256()
+    digest.update(json.dumps(feature_names).encode('utf-8'))
+    digest.update(str(np.dtype(vectorizer.dtype)).encode('utf-8'))
+    digest.update(np.ascontiguousarray(vectorizer.idf_, dtype=np.float64).tobytes())
+    return {
+        'schema_hash': digest.hexdigest(),
+        'n_features': len(feature_names),
+        'n_text_features': len(feature_names) - len(NUMERICAL_FEATURES),
+        'numerical_features': NUMERICAL_FEATURES,
+        'dtype': str(np.dtype(vectorizer.dtype))
+    }
+
+
+def featurize_split(data_path: str, vectorizer: TfidfVectorizer, chunksize: int) -> tuple:
+    """Sparse feature matrix, labels and sample weights of a processed CSV, transformed in chunks."""
+    blocks, labels, weights = [], [], []
+    for chunk in pd.read_csv(data_path, chunksize=chunksize):
+        X_tfidf = vectorizer.transform(chunk['clean_comment'].values)
+        blocks.append(sp.hstack([X_tfidf, sp.csr_matrix(chunk[NUMERICAL_FEATURES].values, dtype=X_tfidf.dtype)], format='csr'))
+        labels.append(chunk['category'].values)
+        weights.append(chunk['weight'].values if 'weight' in chunk.columns else np.ones(len(chunk)))
+
+    return sp.vstack(blocks, format='csr'), np.concatenate(labels), np.concatenate(weights).astype(np.float64)
+
+
+def save_split(file_path: str, X: sp.csr_matrix, y: np.ndarray, weight: np.ndarray, schema_hash: str) -> None:
+    """Save a featurized split as one compressed .npz (CSR arrays, labels, weights and schema hash)."""
+    try:
+        tmp_path = file_path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path, data=X.data, indices=X.indices, indptr=X.indptr, shape=np.asarray(X.shape),
+            y=y, weight=weight, schema_hash=np.asarray(schema_hash)
+        )
+        os.replace(tmp_path, file_path)
+        logger.debug(f'Split saved to {file_path}: {X.shape[0]} rows, {X.nnz} non-zeros')
+    except Exception as e:
+        logger.error('Error occurred while saving the split %s: %s', file_path, e)
+        raise
+
+
+def load_split(split: str, features_dir: str = FEATURES_DIR, expected_hash: str = None) -> dict:
+    """Load a featurized split saved by the featurize stage.
+
+    The split's schema hash must match data/features/schema.json and, when
+    given, expected_hash (e.g. ``feature_schema(vectorizer)['schema_hash']``
+    of the vectorizer the model is served with).
+
+    Returns:
+        dict: X (sparse CSR), y, weight and schema_hash
+    """
+    try:
+        file_path = os.path.join(features_dir, f'{split}.npz')
+        with np.load(file_path, allow_pickle=False) as arrays:
+            X = sp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape']))
+            split_data = {'X': X, 'y': arrays['y'], 'weight': arrays['weight'], 'schema_hash': str(arrays['schema_hash'])}
+
+        with open(os.path.join(features_dir, 'schema.json'), 'r') as f:
+            schema_hash = json.load(f)['schema_hash']
+        for reference in (schema_hash, expected_hash):
+            if reference is not None and split_data['schema_hash'] != reference:
+                raise ValueError(f"Stale features in {file_path}: schema hash {split_data['schema_hash'][:12]} "
+                                 f"does not match {reference[:12]}, re-run the featurize stage")
+
+        logger.debug(f'Split {split} loaded from {file_path}: {X.shape}')
+        return split_data
+    except Exception as e:
+        logger.error('Error loading the %s split from %s: %s', split, features_dir, e)
+        raise
+
+
+def main():
+    try:
+        from utilities import load_params, load_data
+
+        params = load_params('params.yaml')
+        ngram_range = tuple(params['model_building']['ngram_range'])
+        max_features = params['model_building']['max_features']
+        feature_dtype = np.dtype(params['model_building'].get('feature_dtype', 'float32'))
+        chunksize = params.get('featurize', {}).get('chunksize', 50000)
+
+        # The vectorizer sees the training split only (near-duplicates collapsed)
+        train_data = load_data(SPLIT_PATHS['train'])
+        vectorizer = apply_tfidf(train_data, max_features, ngram_range, feature_dtype)
+        schema = feature_schema(vectorizer)
+
+        os.makedirs(FEATURES_DIR, exist_ok=True)
+        print(f"\n{'='*50}")
+        for split, data_path in SPLIT_PATHS.items():
+            X, y, weight = featurize_split(data_path, vectorizer, chunksize)
+            save_split(os.path.join(FEATURES_DIR, f'{split}.npz'), X, y, weight, schema['schema_hash'])
+            schema[f'{split}_rows'] = int(X.shape[0])
+            schema[f'{split}_nnz'] = int(X.nnz)
+            print(f"{split}: {X.shape[0]} rows x {X.shape[1]} features, {X.nnz} non-zeros")
+
+        # Same rows and columns as test.npz, in float64 (stored under the pipeline's schema hash)
+        X, y, weight = featurize_split(SPLIT_PATHS['test'], float64_reference(vectorizer, train_data), chunksize)
+        save_split(os.path.join(FEATURES_DIR, 'test_float64.npz'), X, y, weight, schema['schema_hash'])
+        print(f"test_float64: {X.shape[0]} rows x {X.shape[1]} features (dtype reference)")
+        print(f"Schema hash: {schema['schema_hash']}")
+        print(f"{'='*50}\n")
+
+        with open(os.path.join(FEATURES_DIR, 'schema.json'), 'w') as f:
+            json.dump(schema, f, indent=4)
+        logger.debug(f'Feature store written to {FEATURES_DIR}')
+
+    except Exception as e:
+        logger.error('Failed to complete the featurize process: %s', e)
+        print(f"Error: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+import os, sys
+from os.path import dirname as up
+
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import json
+import logging
+import optuna
+import lightgbm as lgb
+from model_creation.feature_store import FEATURES_DIR, load_split
+
+# logging configuration
+logger = logging.getLogger('hyperparameter_tuning')
+logger.setLevel('DEBUG')
+
+# Only add handlers if they don't already exist to prevent duplicate logging
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel('DEBUG')
+
+    file_handler = logging.FileHandler('hyperparameter_tuning_errors.log')
+    file_handler.setLevel('ERROR')
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+
+def load_feature_cache(features_dir: str = FEATURES_DIR) -> dict:
+    """Load the train/validation feature matrices of the featurize stage once so every trial can reuse them.
+
+    Matrices are kept sparse because each trial only reads them.
+    """
+    try:
+        train_split = load_split('train', features_dir)
+        val_split = load_split('val', features_dir)
+        logger.debug(f"Feature cache loaded. Train shape: {train_split['X'].shape}, Validation shape: {val_split['X'].shape}")
+        return {
+            'X_train': train_split['X'],
+            'y_train': train_split['y'],
+            'w_train': train_split['weight'],
+            'X_val': val_split['X'],
+            'y_val': val_split['y'],
+        }
+    except Exception as e:
+        logger.error('Error while loading the feature cache: %s', e)
+        raise
+
+
+def pruning_callback(trial: optuna.Trial, metric: str = 'multi_logloss', valid_name: str = 'valid'):
+    """LightGBM callback that reports the validation metric to Optuna and prunes bad trials."""
+    def _callback(env):
+        for result in env.evaluation_result_list:
+            data_name, eval_name, value = result[0], result[1], result[2]
+            if data_name == valid_name and eval_name == metric:
+                trial.report(value, step=env.iteration)
+                if trial.should_prune():
+                    raise optuna.TrialPruned(f"Trial pruned at iteration {env.iteration}")
+    _callback.order = 25
+    return _callback
+
+
+def suggest_params(trial: optuna.Trial) -> dict:
+    """Search space for the LightGBM parameters used by ``train_lgbm``.
+
+    ``subsample`` is not searched: ``train_lgbm`` leaves ``subsample_freq`` at 0,
+    so row bagging is disabled and the value has no effect.
+    """
+    return {
+        'max_depth': trial.suggest_int('max_depth', 3, 20),
+        'num_leaves': trial.suggest_int('num_leaves', 16, 256),
+        'min_child_samples': trial.suggest_int('min_child_samples', 5, 100),
+        'learning_rate': trial.suggest_float('learning_rate', 0.01, 0.3, log=True),
+        'colsample_bytree': trial.suggest_float('colsample_bytree', 0.3, 1.0),
+        'reg_alpha': trial.suggest_float('reg_alpha', 1e-4, 10.0, log=True),
+        'reg_lambda': trial.suggest_float('reg_lambda', 1e-4, 10.0, log=True),
+    }
+
+
+def make_objective(cache: dict, max_estimators: int, early_stopping_rounds: int, threads_per_trial: int):
+    """Create the Optuna objective: validation multi_logloss at the best iteration.
+
+    The classifier is configured like ``train_lgbm`` so the tuned parameters are
+    picked for the objective the final model is trained with.
+    """
+    def objective(trial: optuna.Trial) -> float:
+        params = suggest_params(trial)
+        model = lgb.LGBMClassifier(
+            objective='multiclass',
+            num_class=3,
+            metric='multi_logloss',
+            is_unbalance=True,
+            class_weight='balanced',
+            n_estimators=max_estimators,
+            n_jobs=threads_per_trial,
+            verbose=-1,
+            **params
+        )
+        model.fit(
+            cache['X_train'],
+            cache['y_train'],
+            sample_weight=cache['w_train'],
+            eval_set=[(cache['X_val'], cache['y_val'])],
+            eval_names=['valid'],
+            callbacks=[
+                lgb.early_stopping(early_stopping_rounds, verbose=False),
+                pruning_callback(trial),
+            ]
+        )
+        trial.set_user_attr('best_iteration', int(model.best_iteration_))
+        return float(model.best_score_['valid']['multi_logloss'])
+    return objective
+
+
+def run_study(cache: dict, n_trials: int, n_jobs: int, timeout: int, max_estimators: int,
+              early_stopping_rounds: int, pruner_startup_trials: int, pruner_warmup_steps: int,
+              random_state: int) -> optuna.Study:
+    """Run a parallel Optuna study with median pruning over the cached features."""
+    try:
+        threads_per_trial = max(1, (os.cpu_count() or 1) // n_jobs)
+        study = optuna.create_study(
+            direction='minimize',
+            sampler=optuna.samplers.TPESampler(seed=random_state),
+            pruner=optuna.pruners.MedianPruner(
+                n_startup_trials=pruner_startup_trials,
+                n_warmup_steps=pruner_warmup_steps
+            )
+        )
+        study.optimize(
+            make_objective(cache, max_estimators, early_stopping_rounds, threads_per_trial),
+            n_trials=n_trials,
+            n_jobs=n_jobs,
+            timeout=timeout
+        )
+
+        n_pruned = len([t for t in study.trials if t.state == optuna.trial.TrialState.PRUNED])
+        logger.debug(f"Study finished: {len(study.trials)} trials, {n_pruned} pruned, best value {study.best_value:.6f}")
+        return study
+    except Exception as e:
+        logger.error('Error during hyperparameter search: %s', e)
+        raise
+
+
+def save_best_params(study: optuna.Study, file_path: str) -> None:
+    """Save the best trial's parameters in the format expected by ``model_building``."""
+    try:
+        best_params = dict(study.best_params)
+        best_params['n_estimators'] = study.best_trial.user_attrs['best_iteration']
+
+        tuning_info = {
+            'best_params': best_params,
+            'best_value': study.best_value,
+            'n_trials': len(study.trials),
+            'n_pruned': len([t for t in study.trials if t.state == optuna.trial.TrialState.PRUNED])
+        }
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as file:
+            json.dump(tuning_info, file, indent=4)
+        logger.debug('Best parameters saved to %s', file_path)
+    except Exception as e:
+        logger.error('Error occurred while saving the best parameters: %s', e)
+        raise
+
+
+def main():
+    try:
+        from utilities import load_params
+
+        params = load_params('params.yaml')
+        tuning_params = params['tuning']
+
+        # Features come from the featurize stage and are shared by all trials
+        cache = load_feature_cache()
+
+        study = run_study(
+            cache,
+            n_trials=tuning_params['n_trials'],
+            n_jobs=tuning_params['n_jobs'],
+            timeout=tuning_params['timeout'],
+            max_estimators=tuning_params['max_estimators'],
+            early_stopping_rounds=tuning_params['early_stopping_rounds'],
+            pruner_startup_trials=tuning_params['pruner_startup_trials'],
+            pruner_warmup_steps=tuning_params['pruner_warmup_steps'],
+            random_state=tuning_params['random_state']
+        )
+
+        print(f"\n{'='*50}")
+        print(f"Best validation multi_logloss: {study.best_value:.6f}")
+        print(f"Best parameters: {study.best_params}")
+        print(f"Best iteration: {study.best_trial.user_attrs['best_iteration']}")
+        print(f"{'='*50}\n")
+
+        save_best_params(study, 'models/best_params.json')
+
+    except Exception as e:
+        logger.error('Failed to complete the hyperparameter tuning process: %s', e)
+        print(f"Error: {e}")
+
+
+if __name__ == '__main__':
+    main()
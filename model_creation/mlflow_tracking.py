@@ -0,0 +1,247 @@
+# Configurable MLflow tracking backend and buffered run logging
+# The tracking URI can point to the remote server, a SQLite database (sqlite:///mlflow.db)
+# or a local directory (file store), so the pipeline also runs on a box without network.
+# Runs logged locally can be synced to the remote server later:
+#   python model_creation/mlflow_tracking.py
+
+import os, sys
+from os.path import dirname as up
+
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import json
+import time
+import shutil
+import logging
+import tempfile
+import mlflow
+import mlflow.sklearn
+from mlflow.tracking import MlflowClient
+from mlflow.entities import Metric, Param, RunTag
+
+# logging configuration
+logger = logging.getLogger('mlflow_tracking')
+logger.setLevel('DEBUG')
+
+# Only add handlers if they don't already exist to prevent duplicate logging
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel('DEBUG')
+
+    file_handler = logging.FileHandler('mlflow_tracking_errors.log')
+    file_handler.setLevel('ERROR')
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+
+DEFAULT_TRACKING_URI = "http://3.29.129.159:5000/"
+DEFAULT_EXPERIMENT_NAME = 'dvc-pipeline-runs-2'
+
+# Limits of a single MLflow log_batch request
+MAX_METRICS_PER_BATCH = 1000
+MAX_PARAMS_TAGS_PER_BATCH = 100
+
+
+def resolve_tracking_uri(params: dict = None) -> str:
+    """Tracking URI from MLFLOW_TRACKING_URI, then params.yaml (mlflow.tracking_uri), then the remote server.
+
+    A plain directory path is turned into a file store URI.
+    """
+    tracking_uri = os.getenv('MLFLOW_TRACKING_URI') or (params or {}).get('mlflow', {}).get('tracking_uri') or DEFAULT_TRACKING_URI
+    if '://' not in tracking_uri and not tracking_uri.startswith('file:'):
+        tracking_uri = 'file:' + os.path.abspath(tracking_uri)
+    return tracking_uri
+
+
+def setup_tracking(params: dict = None) -> str:
+    """Point MLflow to the configured tracking backend and experiment."""
+    tracking_uri = resolve_tracking_uri(params)
+    mlflow.set_tracking_uri(tracking_uri)
+    experiment_name = (params or {}).get('mlflow', {}).get('experiment_name', DEFAULT_EXPERIMENT_NAME)
+    mlflow.set_experiment(experiment_name)
+    logger.debug(f'MLflow tracking URI: {tracking_uri} (experiment: {experiment_name})')
+    return tracking_uri
+
+
+class BufferedRunLogger:
+    """Collects params, metrics, tags and artifacts of a run and sends them in batches.
+
+    Each ``mlflow.log_*`` call is a round trip to the tracking server. Here they
+    are kept in memory and ``flush`` sends them with a few ``log_batch`` calls
+    (and the artifacts one by one). With ``buffered=False`` every call is
+    flushed right away, which is the previous behaviour.
+    """
+
+    def __init__(self, run_id: str, client: MlflowClient = None, buffered: bool = True):
+        self.run_id = run_id
+        self.client = client or MlflowClient()
+        self.buffered = buffered
+        self.params = {}
+        self.metrics = []
+        self.tags = {}
+        self.artifacts = []
+
+    def log_param(self, key: str, value) -> None:
+        self.params[key] = str(value)
+        self._autoflush()
+
+    def log_params(self, params: dict) -> None:
+        for key, value in params.items():
+            self.params[key] = str(value)
+        self._autoflush()
+
+    def log_metric(self, key: str, value: float, step: int = 0) -> None:
+        self.metrics.append(Metric(key, float(value), int(time.time() * 1000), step))
+        self._autoflush()
+
+    def log_metrics(self, metrics: dict, step: int = 0) -> None:
+        timestamp = int(time.time() * 1000)
+        self.metrics.extend(Metric(key, float(value), timestamp, step) for key, value in metrics.items())
+        self._autoflush()
+
+    def set_tag(self, key: str, value) -> None:
+        self.tags[key] = str(value)
+        self._autoflush()
+
+    def log_artifact(self, local_path: str, artifact_path: str = None) -> None:
+        # Copy now: the file may be overwritten (e.g. the confusion matrix plot) before the flush
+        staging_dir = tempfile.mkdtemp(prefix='mlflow_artifact_')
+        staged_path = os.path.join(staging_dir, os.path.basename(local_path))
+        shutil.copy2(local_path, staged_path)
+        self.artifacts.append((staged_path, artifact_path))
+        self._autoflush()
+
+    def _autoflush(self) -> None:
+        if not self.buffered:
+            self.flush()
+
+    def flush(self) -> None:
+        """Send everything collected so far to the tracking backend."""
+        try:
+            params = [Param(key, value) for key, value in self.params.items()]
+            tags = [RunTag(key, value) for key, value in self.tags.items()]
+            n_calls = 0
+            for start in range(0, max(len(params), len(tags)), MAX_PARAMS_TAGS_PER_BATCH):
+                self.client.log_batch(self.run_id, params=params[start:start + MAX_PARAMS_TAGS_PER_BATCH],
+                                      tags=tags[start:start + MAX_PARAMS_TAGS_PER_BATCH])
+                n_calls += 1
+            for start in range(0, len(self.metrics), MAX_METRICS_PER_BATCH):
+                self.client.log_batch(self.run_id, metrics=self.metrics[start:start + MAX_METRICS_PER_BATCH])
+                n_calls += 1
+            for local_path, artifact_path in self.artifacts:
+                self.client.log_artifact(self.run_id, local_path, artifact_path)
+                shutil.rmtree(os.path.dirname(local_path), ignore_errors=True)
+
+            if n_calls or self.artifacts:
+                logger.debug(f'Flushed {len(params)} params, {len(self.metrics)} metrics, {len(tags)} tags '
+                             f'in {n_calls} batch calls and {len(self.artifacts)} artifacts')
+            self.params, self.metrics, self.tags, self.artifacts = {}, [], {}, []
+        except Exception as e:
+            logger.error('Error while flushing the MLflow run buffer: %s', e)
+            raise
+
+
+def copy_logged_model(run_id: str, new_run_id: str, model_path: str, source_uri: str, target_uri: str) -> None:
+    """Log the sklearn model ``runs:/<run_id>/<model_path>`` of the source again in new_run_id on the target.
+
+    Since MLflow 3, log_model stores the model as a LoggedModel outside the
+    run's artifacts, so copying the artifacts does not bring it along.
+    """
+    model_uri = f"runs:/{run_id}/{model_path}"
+    previous_uri = mlflow.get_tracking_uri()
+    try:
+        mlflow.set_tracking_uri(source_uri)
+        model = mlflow.sklearn.load_model(model_uri)
+        signature = mlflow.models.get_model_info(model_uri).signature
+
+        mlflow.set_tracking_uri(target_uri)
+        with mlflow.start_run(run_id=new_run_id):
+            mlflow.sklearn.log_model(sk_model=model, artifact_path=model_path, signature=signature)
+        logger.debug(f'Model {model_uri} logged again as runs:/{new_run_id}/{model_path}')
+    finally:
+        mlflow.set_tracking_uri(previous_uri)
+
+
+def sync_run(run_id: str, source_uri: str, target_uri: str, experiment_name: str, model_path: str = None) -> str:
+    """Copy a run (params, full metric history, tags and artifacts) to another tracking backend.
+
+    With model_path, the model logged under that name is logged again on the
+    target (see copy_logged_model), so ``runs:/<new run>/<model_path>`` can be registered there.
+    Returns the id of the run created on the target.
+    """
+    try:
+        source = MlflowClient(tracking_uri=source_uri)
+        target = MlflowClient(tracking_uri=target_uri)
+        run = source.get_run(run_id)
+
+        experiment = target.get_experiment_by_name(experiment_name)
+        experiment_id = experiment.experiment_id if experiment else target.create_experiment(experiment_name)
+
+        # Internal mlflow.* tags (run name, source, ...) are set by create_run on the target
+        tags = {key: value for key, value in run.data.tags.items() if not key.startswith('mlflow.')}
+        tags['synced_from_run_id'] = run_id
+        new_run = target.create_run(experiment_id, start_time=run.info.start_time, tags=tags,
+                                    run_name=run.info.run_name)
+        new_run_id = new_run.info.run_id
+
+        buffer = BufferedRunLogger(new_run_id, client=target)
+        buffer.log_params(run.data.params)
+        for key in run.data.metrics:
+            buffer.metrics.extend(source.get_metric_history(run_id, key))
+        buffer.flush()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            local_dir = mlflow.artifacts.download_artifacts(run_id=run_id, dst_path=tmp_dir, tracking_uri=source_uri)
+            target.log_artifacts(new_run_id, local_dir)
+            # Before MLflow 3 the model is a plain run artifact and was copied above
+            model_copied = model_path is not None and os.path.isdir(os.path.join(local_dir, model_path))
+
+        if model_path and not model_copied:
+            copy_logged_model(run_id, new_run_id, model_path, source_uri, target_uri)
+
+        target.set_terminated(new_run_id, status=run.info.status, end_time=run.info.end_time)
+        logger.debug(f'Run {run_id} synced from {source_uri} to {target_uri} as {new_run_id}')
+        return new_run_id
+    except Exception as e:
+        logger.error('Error while syncing run %s to %s: %s', run_id, target_uri, e)
+        raise
+
+
+def main():
+    """Sync the run in experiment_info.json to the remote server and point the file to the new run."""
+    from utilities import load_params
+
+    try:
+        params = load_params('params.yaml')
+        source_uri = resolve_tracking_uri(params)
+        target_uri = params.get('mlflow', {}).get('sync_uri', DEFAULT_TRACKING_URI)
+        if source_uri.rstrip('/') == target_uri.rstrip('/'):
+            print(f"Runs are already logged to {target_uri}, nothing to sync")
+            return
+
+        with open('experiment_info.json', 'r') as file:
+            model_info = json.load(file)
+
+        experiment_name = params.get('mlflow', {}).get('experiment_name', DEFAULT_EXPERIMENT_NAME)
+        new_run_id = sync_run(model_info['run_id'], source_uri, target_uri, experiment_name,
+                              model_path=model_info.get('model_path'))
+
+        model_info['local_run_id'] = model_info['run_id']
+        model_info['run_id'] = new_run_id
+        model_info['tracking_uri'] = target_uri
+        with open('experiment_info.json', 'w') as file:
+            json.dump(model_info, file, indent=4)
+
+        print(f"✓ Run synced to {target_uri}: {new_run_id}")
+    except Exception as e:
+        logger.error('Failed to sync the MLflow run: %s', e)
+        print(f"Error: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,10 +7,11 @@ import numpy as np
 import pandas as pd
 
 import pickle
+import json
 import yaml
 import logging
 import lightgbm as lgb
-from sklearn.feature_extraction.text import TfidfVectorizer
+from model_creation.feature_store import load_split
 
 # logging configuration
 logger = logging.getLogger('model_building')
@@ -32,31 +33,6 @@ if not logger.handlers:
     logger.addHandler(file_handler)
 
 
-def apply_tfidf(train_data: pd.DataFrame, max_features: int, ngram_range: tuple) -> tuple:
-    """Apply TF-IDF with ngrams to the data."""
-    try:
-        vectorizer = TfidfVectorizer(max_features=max_features, ngram_range=ngram_range)
-
-        X_train = train_data['clean_comment'].values
-        y_train = train_data['category'].values
-
-        # Perform TF-IDF transformation
-        X_train_tfidf = vectorizer.fit_transform(X_train)
-
-        logger.debug(f"TF-IDF transformation complete. Train shape: {X_train_tfidf.shape}")
-
-        # Save the vectorizer in the models directory
-        os.makedirs('models', exist_ok=True)
-        with open(os.path.join('models', 'tfidf_vectorizer.pkl'), 'wb') as f:
-            pickle.dump(vectorizer, f)
-
-        logger.debug('TF-IDF applied with trigrams and data transformed')
-        return X_train_tfidf, y_train
-    except Exception as e:
-        logger.error('Error during TF-IDF transformation: %s', e)
-        raise
-
-
 def train_lgbm(
     X_train: np.ndarray,
     y_train: np.ndarray,
@@ -68,9 +44,20 @@ def train_lgbm(
     colsample_bytree: float,
     subsample: float,
     reg_alpha: float,
-    reg_lambda: float
+    reg_lambda: float,
+    X_val: np.ndarray = None,
+    y_val: np.ndarray = None,
+    early_stopping_rounds: int = None,
+    eval_log_period: int = 50,
+    sample_weight: np.ndarray = None
 ) -> lgb.LGBMClassifier:
-    """Train a LightGBM model with full parameter set."""
+    """Train a LightGBM model with full parameter set.
+
+    When a validation split is given, the validation multi_logloss is monitored and
+    training stops after ``early_stopping_rounds`` rounds without improvement. LightGBM
+    keeps only the trees up to the best iteration, so the saved model is already truncated.
+    ``sample_weight`` carries the cluster sizes of collapsed near-duplicate rows.
+    """
     try:
         best_model = lgb.LGBMClassifier(
             objective='multiclass',
@@ -88,8 +75,29 @@ def train_lgbm(
             reg_alpha=reg_alpha,
             reg_lambda=reg_lambda
         )
-        best_model.fit(X_train, y_train)
-        logger.debug('LightGBM model training completed')
+        if X_val is None or y_val is None or not early_stopping_rounds:
+            best_model.fit(X_train, y_train, sample_weight=sample_weight)
+            logger.debug('LightGBM model training completed')
+            return best_model
+
+        best_model.fit(
+            X_train,
+            y_train,
+            sample_weight=sample_weight,
+            eval_set=[(X_val, y_val)],
+            eval_names=['valid'],
+            callbacks=[
+                lgb.early_stopping(early_stopping_rounds, verbose=False),
+                lgb.log_evaluation(eval_log_period)
+            ]
+        )
+
+        # Record the achieved tree count as the model's n_estimators
+        best_model.set_params(n_estimators=best_model.best_iteration_)
+        logger.debug(
+            f'LightGBM model training completed with early stopping: best iteration {best_model.best_iteration_} '
+            f'of {n_estimators}, validation multi_logloss {best_model.best_score_["valid"]["multi_logloss"]:.6f}'
+        )
         return best_model
     except Exception as e:
         logger.error('Error during LightGBM model training: %s', e)
@@ -108,15 +116,58 @@ def save_model(model, file_path: str) -> None:
         raise
 
 
+def save_learning_curve(model: lgb.LGBMClassifier, file_path: str) -> None:
+    """Save the per-iteration validation metrics recorded during training."""
+    try:
+        # Without a validation split there is no curve, only the final tree count
+        evals_result = getattr(model, 'evals_result_', None) or {}
+        learning_curve = {
+            'best_iteration': int(model.n_estimators_),
+            'valid': {metric: [float(v) for v in values] for metric, values in evals_result.get('valid', {}).items()}
+        }
+        with open(file_path, 'w') as file:
+            json.dump(learning_curve, file, indent=4)
+        logger.debug('Learning curve saved to %s', file_path)
+    except Exception as e:
+        logger.error('Error occurred while saving the learning curve: %s', e)
+        raise
+
+
+def load_best_params(params: dict, file_path: str) -> dict:
+    """Overlay the tuned LightGBM parameters of the tuning stage on top of params.yaml.
+
+    Only with ``tuning.use_best_params: true``; every overridden value is printed.
+    """
+    try:
+        if not params.get('tuning', {}).get('use_best_params', False):
+            return params
+        if not os.path.exists(file_path):
+            logger.warning('Tuned parameters not found at %s, using params.yaml values', file_path)
+            return params
+
+        with open(file_path, 'r') as file:
+            best_params = json.load(file)['best_params']
+        if not best_params:
+            logger.warning('No tuned parameters in %s yet (run the tuning stage), using params.yaml values', file_path)
+            return params
+        for key, value in best_params.items():
+            print(f"Tuned {key}: {value} (params.yaml: {params['model_building'].get(key)})")
+        params['model_building'].update(best_params)
+        logger.info('Tuned parameters loaded from %s: %s', file_path, best_params)
+        return params
+    except Exception as e:
+        logger.error('Error loading tuned parameters from %s: %s', file_path, e)
+        raise
+
+
 def main():
     try:
-        from utilities import load_params, load_data
+        from utilities import load_params
         # from utilities import RAW_DATA_PATH, INTERIM_DATA_PATH
 
-        # Load parameters from the root directory
+        # Load parameters from the root directory, overridden by the tuning results when opted in
         params = load_params('params.yaml')
-        ngram_range = tuple(params['model_building']['ngram_range'])
-        max_features = params['model_building']['max_features']
+        params = load_best_params(params, 'models/best_params.json')
 
         # Tree structure
         n_estimators = params['model_building']['n_estimators']
@@ -135,8 +186,10 @@ def main():
         reg_alpha = params['model_building']['reg_alpha']
         reg_lambda = params['model_building']['reg_lambda']
 
-        # print(f"ngram_range: {ngram_range}")
-        # print(f"max_features: {max_features}")
+        # Early stopping on the validation split (0 disables it)
+        early_stopping_rounds = params['model_building']['early_stopping_rounds']
+        eval_log_period = params['model_building']['eval_log_period']
+
         # print(f"n_estimators: {n_estimators}")
         # print(f"max_depth: {max_depth}")
         # print(f"num_leaves: {num_leaves}")
@@ -147,27 +200,30 @@ def main():
         # print(f"reg_alpha: {reg_alpha}")
         # print(f"reg_lambda: {reg_lambda}")
 
-        # Load the preprocessed training data from the interim directory
-        train_data = load_data('data/interim/train_processed.csv')
-        print(train_data.head())
+        # Featurized training split from the featurize stage (near-duplicates collapsed
+        # into weighted rows), densified for training
+        train_split = load_split('train')
+        X_train = train_split['X'].toarray()
+        y_train = train_split['y']
+        sample_weight = train_split['weight']
+        print(f"Train features: {X_train.shape}")
 
-        # Apply TF-IDF feature engineering on training data
-        X_train_tfidf, y_train = apply_tfidf(train_data, max_features, ngram_range)
-
-        numerical_features = ['word_count', 'num_stop_words', 'num_chars', 'num_chars_cleaned']
-        X_train_numerical = train_data[numerical_features].values
-        
-        # Combine text features with numerical features
-        X_train_tfidf = X_train_tfidf.toarray()
-        X_train = np.hstack([X_train_tfidf, X_train_numerical])
-        # X_train = np.hstack([X_train_tfidf, X_train_numerical])
-        # print(X_train.shape)
+        # Validation split, featurized with the same vectorizer
+        val_split = load_split('val')
+        X_val = val_split['X'].toarray()
+        y_val = val_split['y']
 
         # Train the LightGBM model using hyperparameters from params.yaml
-        best_model = train_lgbm(X_train, y_train, n_estimators, max_depth, num_leaves, min_child_samples, learning_rate, colsample_bytree, subsample, reg_alpha, reg_lambda)
+        best_model = train_lgbm(
+            X_train, y_train, n_estimators, max_depth, num_leaves, min_child_samples, learning_rate,
+            colsample_bytree, subsample, reg_alpha, reg_lambda,
+            X_val=X_val, y_val=y_val, early_stopping_rounds=early_stopping_rounds, eval_log_period=eval_log_period,
+            sample_weight=sample_weight
+        )
 
         # Save the trained model in the models directory
         save_model(best_model, 'models/lgbm_model.pkl')
+        save_learning_curve(best_model, 'models/learning_curve.json')
 
     except Exception as e:
         logger.error('Failed to complete the feature engineering and model building process: %s', e)
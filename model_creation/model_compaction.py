@@ -0,0 +1,276 @@
+import os, sys
+from os.path import dirname as up
+
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import numpy as np
+import pandas as pd
+
+import copy
+import json
+import time
+import pickle
+import logging
+import lightgbm as lgb
+import scipy.sparse as sp
+from collections import Counter
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+from data_handling.data_preprocessing import tfidf_row_weights
+
+# logging configuration
+logger = logging.getLogger('model_compaction')
+logger.setLevel('DEBUG')
+
+# Only add handlers if they don't already exist to prevent duplicate logging
+if not logger.handlers:
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel('DEBUG')
+
+    file_handler = logging.FileHandler('model_compaction_errors.log')
+    file_handler.setLevel('ERROR')
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+
+
+class CompactTfidfVectorizer(TfidfVectorizer):
+    """TF-IDF vectorizer that only emits the columns the booster splits on.
+
+    ``vocabulary_`` and ``idf_`` are restricted to the kept terms. The row norm still
+    has to include every term of the original vocabulary, so ``norm_idf_`` keeps the
+    idf of all original terms; it is only used to accumulate the norm and no
+    column is allocated for the dropped terms. Weights are computed like
+    TfidfVectorizer in its dtype, so the kept columns equal those of the
+    original vectorizer exactly.
+
+    A single document goes through tfidf_row_weights. Batches are counted by
+    sklearn over the original vocabulary, weighted with ``full_idf_`` and
+    normalized by sklearn's l2 kernel before the kept columns
+    (``kept_columns_``) are sliced out, so the norm includes the dropped terms.
+    """
+
+    def _full_counter(self) -> CountVectorizer:
+        """Count vectorizer over the original vocabulary (the keys of norm_idf_, in column order)."""
+        if getattr(self, '_counter', None) is None:
+            count_params = CountVectorizer().get_params()
+            params = {key: value for key, value in self.get_params().items() if key in count_params}
+            params.update(vocabulary=list(self.norm_idf_), max_features=None, dtype=self.dtype)
+            self._counter = CountVectorizer(**params)
+        return self._counter
+
+    def transform(self, raw_documents):
+        """Transform documents to the reduced TF-IDF matrix."""
+        documents = list(raw_documents)
+        if len(documents) != 1:
+            return self._transform_batch(documents)
+
+        columns, weights = tfidf_row_weights(Counter(self.build_analyzer()(documents[0])), self)
+        return sp.csr_matrix(
+            (weights, columns, np.asarray([0, len(columns)], dtype=np.int32)),
+            shape=(1, len(self.vocabulary_))
+        )
+
+    def _transform_batch(self, documents: list) -> sp.csr_matrix:
+        X = self._full_counter().transform(documents)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+        X.data *= self.full_idf_[X.indices]
+        if self.norm == 'l2':
+            normalize(X, norm='l2', copy=False)
+        return X[:, self.kept_columns_]
+
+
+def get_used_features(model: lgb.LGBMClassifier) -> np.ndarray:
+    """Indices of the features the booster uses in at least one split."""
+    split_counts = model.booster_.feature_importance(importance_type='split')
+    return np.flatnonzero(split_counts > 0)
+
+
+def compact_vectorizer(vectorizer: TfidfVectorizer, kept_columns: np.ndarray) -> CompactTfidfVectorizer:
+    """Build a vectorizer restricted to the kept TF-IDF columns (in their original order)."""
+    try:
+        if vectorizer.norm not in ('l2', None):
+            raise ValueError(f"Compaction only supports norm='l2' or None, got {vectorizer.norm!r}")
+        compact = CompactTfidfVectorizer(**vectorizer.get_params())
+
+        feature_names = vectorizer.get_feature_names_out()
+        compact.norm_idf_ = {term: float(idf) for term, idf in zip(feature_names, vectorizer.idf_)}
+        compact.full_idf_ = np.asarray(vectorizer.idf_, dtype=vectorizer.dtype)
+        compact.kept_columns_ = np.asarray(kept_columns, dtype=np.int64)
+        compact.vocabulary_ = {feature_names[old]: new for new, old in enumerate(kept_columns)}
+        compact.idf_ = vectorizer.idf_[kept_columns]
+
+        logger.debug(f'Vectorizer compacted from {len(feature_names)} to {len(kept_columns)} terms')
+        return compact
+    except Exception as e:
+        logger.error('Error while compacting the vectorizer: %s', e)
+        raise
+
+
+def remap_booster(booster: lgb.Booster, kept_features: np.ndarray) -> lgb.Booster:
+    """Rewrite the model string so split features index into the kept feature list."""
+    try:
+        mapping = {int(old): new for new, old in enumerate(kept_features)}
+        old_names = booster.feature_name()
+        new_names = [f'Column_{i}' for i in range(len(kept_features))]
+        renamed = {old_names[old]: new_names[new] for old, new in mapping.items()}
+
+        lines = []
+        in_importances = False
+        for line in booster.model_to_string().split('\n'):
+            key, _, value = line.partition('=')
+            if key == 'max_feature_idx':
+                line = f'max_feature_idx={len(kept_features) - 1}'
+            elif key == 'feature_names':
+                line = 'feature_names=' + ' '.join(new_names)
+            elif key == 'feature_infos':
+                infos = value.split(' ')
+                line = 'feature_infos=' + ' '.join(infos[old] for old in kept_features)
+            elif key == 'tree_sizes':
+                # Tree blocks change length, LightGBM falls back to sequential parsing
+                continue
+            elif key == 'split_feature':
+                line = 'split_feature=' + ' '.join(str(mapping[int(f)]) for f in value.split(' '))
+            elif line == 'feature_importances:':
+                in_importances = True
+            elif in_importances:
+                if line == '':
+                    in_importances = False
+                else:
+                    line = f'{renamed[key]}={value}'
+            lines.append(line)
+
+        return lgb.Booster(model_str='\n'.join(lines))
+    except Exception as e:
+        logger.error('Error while remapping the booster features: %s', e)
+        raise
+
+
+def compact_model(model: lgb.LGBMClassifier, kept_features: np.ndarray) -> lgb.LGBMClassifier:
+    """Copy of the classifier whose booster only expects the kept features."""
+    try:
+        compact = copy.deepcopy(model)
+        compact._Booster = remap_booster(model.booster_, kept_features)
+        compact._n_features = len(kept_features)
+        compact._n_features_in = len(kept_features)
+        logger.debug(f'Model compacted from {model.n_features_in_} to {len(kept_features)} features')
+        return compact
+    except Exception as e:
+        logger.error('Error while compacting the model: %s', e)
+        raise
+
+
+def compact_model_and_vectorizer(model: lgb.LGBMClassifier, vectorizer: TfidfVectorizer) -> tuple:
+    """Prune TF-IDF columns the booster never splits on from both the model and the vectorizer.
+
+    The numerical features are always kept so the serving input layout
+    (TF-IDF columns followed by the numerical features) does not change.
+    """
+    n_tfidf = len(vectorizer.vocabulary_)
+    used = get_used_features(model)
+    kept_columns = used[used < n_tfidf]
+    kept_features = np.concatenate([kept_columns, np.arange(n_tfidf, model.n_features_in_)])
+
+    return compact_model(model, kept_features), compact_vectorizer(vectorizer, kept_columns)
+
+
+def verify_compaction(model, vectorizer, compacted_model, compacted_vectorizer, X_test: sp.csr_matrix, texts) -> dict:
+    """Check that the compacted pair predicts exactly like the original pair.
+
+    ``X_test`` holds the stored test features of the original vectorizer (see
+    feature_store.load_split) and ``texts`` the matching clean comments, which
+    only go through the compacted vectorizer. Its TF-IDF matrix must equal the
+    kept columns of the stored features, value for value, and single rows must
+    equal their batch rows. The batch transform times of both vectorizers are reported.
+    """
+    try:
+        n_tfidf = len(vectorizer.vocabulary_)
+        start = time.perf_counter()
+        X_tfidf_compact = compacted_vectorizer.transform(texts)
+        compact_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        vectorizer.transform(texts)
+        original_seconds = time.perf_counter() - start
+        single_rows = sp.vstack([compacted_vectorizer.transform([text]) for text in texts[:100]], format='csr')
+        single_row_diff = abs(single_rows - X_tfidf_compact[:single_rows.shape[0]])
+        kept_columns = [vectorizer.vocabulary_[term] for term, _ in
+                        sorted(compacted_vectorizer.vocabulary_.items(), key=lambda item: item[1])]
+        tfidf_diff = abs(X_test[:, kept_columns] - X_tfidf_compact)
+
+        X_full = X_test.toarray()
+        X_compact = np.hstack([X_tfidf_compact.toarray(), X_full[:, n_tfidf:]])
+
+        y_full = model.predict(X_full)
+        y_compact = compacted_model.predict(X_compact)
+        max_proba_diff = float(np.abs(model.predict_proba(X_full) - compacted_model.predict_proba(X_compact)).max())
+
+        report = {
+            'n_features': int(X_full.shape[1]),
+            'n_features_compact': int(X_compact.shape[1]),
+            'n_samples': int(len(y_full)),
+            'n_mismatches': int((y_full != y_compact).sum()),
+            'max_proba_diff': max_proba_diff,
+            'max_tfidf_diff': max(float(tfidf_diff.max()) if tfidf_diff.nnz else 0.0,
+                                  float(single_row_diff.max()) if single_row_diff.nnz else 0.0),
+            'transform_seconds': original_seconds,
+            'transform_seconds_compact': compact_seconds
+        }
+        logger.debug(f'Compaction verification: {report}')
+        return report
+    except Exception as e:
+        logger.error('Error while verifying the compacted model: %s', e)
+        raise
+
+
+def main():
+    try:
+        from utilities import load_data
+        from model_creation.feature_store import feature_schema, load_split
+
+        with open('models/lgbm_model.pkl', 'rb') as f:
+            model = pickle.load(f)
+        with open('models/tfidf_vectorizer.pkl', 'rb') as f:
+            vectorizer = pickle.load(f)
+
+        compacted_model, compacted_vectorizer = compact_model_and_vectorizer(model, vectorizer)
+
+        # Full features from the featurize stage, raw text only for the compacted vectorizer
+        X_test = load_split('test', expected_hash=feature_schema(vectorizer)['schema_hash'])['X']
+        test_data = load_data('data/interim/test_processed.csv')
+        report = verify_compaction(model, vectorizer, compacted_model, compacted_vectorizer,
+                                   X_test, test_data['clean_comment'].values)
+
+        print(f"\n{'='*50}")
+        print(f"Features: {report['n_features']} -> {report['n_features_compact']}")
+        print(f"Prediction mismatches on test set: {report['n_mismatches']} / {report['n_samples']}")
+        print(f"Max probability difference: {report['max_proba_diff']:.2e}")
+        print(f"Max TF-IDF difference: {report['max_tfidf_diff']:.2e}")
+        print(f"Test set transform: {report['transform_seconds']:.2f} s -> {report['transform_seconds_compact']:.2f} s")
+        print(f"{'='*50}\n")
+
+        if report['max_tfidf_diff'] > 0:
+            raise ValueError(f"Compacted vectorizer differs from the original by up to {report['max_tfidf_diff']:.2e}")
+        if report['n_mismatches'] > 0:
+            raise ValueError(f"Compacted model disagrees with the original on {report['n_mismatches']} test samples")
+
+        with open('models/lgbm_model_compact.pkl', 'wb') as f:
+            pickle.dump(compacted_model, f)
+        with open('models/tfidf_vectorizer_compact.pkl', 'wb') as f:
+            pickle.dump(compacted_vectorizer, f)
+        with open('models/compaction_report.json', 'w') as f:
+            json.dump(report, f, indent=4)
+        logger.debug('Compacted model and vectorizer saved to models/')
+
+    except Exception as e:
+        logger.error('Failed to complete the model compaction process: %s', e)
+        print(f"Error: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,18 +5,22 @@ sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
 
 import numpy as np
 import pandas as pd
+import time
 import pickle
 import logging
+import subprocess
 import yaml
+import scipy.sparse as sp
 import mlflow
 import mlflow.sklearn
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 from sklearn.feature_extraction.text import TfidfVectorizer
 import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 import json
 from mlflow.models import infer_signature
+from model_creation.mlflow_tracking import BufferedRunLogger, setup_tracking
+from model_creation.feature_store import SPLIT_PATHS, feature_schema, load_split
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -47,6 +51,9 @@ if not logger.handlers:
     logger.addHandler(file_handler)
 
 
+NUMERICAL_FEATURES = ['word_count', 'num_stop_words', 'num_chars', 'num_chars_cleaned']
+
+
 def load_model(model_path: str):
     """Load the trained model."""
     try:
@@ -71,28 +78,294 @@ def load_vectorizer(vectorizer_path: str) -> TfidfVectorizer:
         raise
 
 
-def evaluate_model(model, X_test: np.ndarray, y_test: np.ndarray):
-    """Evaluate the model and log classification metrics and confusion matrix."""
+def iter_feature_batches(X: sp.csr_matrix, y: np.ndarray, chunksize: int):
+    """Split a featurized split (see feature_store.load_split) into sparse (X, y) batches of at most chunksize rows.
+
+    The text was already transformed by the featurize stage, so a batch is a
+    row slice of the stored matrix. Yields (X, y, slice_seconds).
+    """
+    for start in range(0, X.shape[0], chunksize):
+        begin = time.perf_counter()
+        X_batch = X[start:start + chunksize]
+        yield X_batch, y[start:start + chunksize], time.perf_counter() - begin
+
+
+def build_features(data: pd.DataFrame, vectorizer: TfidfVectorizer) -> sp.csr_matrix:
+    """Sparse feature matrix of processed rows: TF-IDF columns followed by the numerical features."""
+    X_tfidf = vectorizer.transform(data['clean_comment'].values)
+    return sp.hstack([X_tfidf, sp.csr_matrix(data[NUMERICAL_FEATURES].values, dtype=X_tfidf.dtype)], format='csr')
+
+
+def report_from_confusion_matrix(cm: np.ndarray, labels) -> dict:
+    """Rebuild ``classification_report(..., output_dict=True)`` from a confusion matrix.
+
+    Like sklearn, only labels present in y_true or y_pred are reported and
+    undefined precision/recall/F1 are 0.0.
+    """
+    present = (cm.sum(axis=0) + cm.sum(axis=1)) > 0
+    cm = cm[np.ix_(present, present)]
+    labels = [label for label, keep in zip(labels, present) if keep]
+
+    true_positives = np.diag(cm).astype(np.float64)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, true_positives / predicted, 0.0)
+        recall = np.where(support > 0, true_positives / support, 0.0)
+        denominator = precision + recall
+        f1 = np.where(denominator > 0, 2 * precision * recall / denominator, 0.0)
+
+    report = {
+        str(label): {'precision': float(p), 'recall': float(r), 'f1-score': float(f), 'support': float(n)}
+        for label, p, r, f, n in zip(labels, precision, recall, f1, support)
+    }
+    total = support.sum()
+    report['accuracy'] = float(true_positives.sum() / total) if total else 0.0
+    report['macro avg'] = {
+        'precision': float(precision.mean()), 'recall': float(recall.mean()),
+        'f1-score': float(f1.mean()), 'support': float(total)
+    }
+    weights = support / total if total else np.zeros_like(support, dtype=np.float64)
+    report['weighted avg'] = {
+        'precision': float(precision @ weights), 'recall': float(recall @ weights),
+        'f1-score': float(f1 @ weights), 'support': float(total)
+    }
+    return report
+
+
+def evaluate_model_chunked(model, batches) -> tuple:
+    """Evaluate the model over streamed (X, y, slice_seconds) batches.
+
+    Predictions are folded into a confusion matrix as they come, so the test
+    set never has to be materialized. Returns (report, cm, accuracy) like
+    sklearn's classification_report/confusion_matrix/accuracy_score, plus
+    per-chunk prediction throughput (featurization is measured by
+    profile_model_performance, the stored features are already transformed).
+    """
+    try:
+        labels = list(model.classes_)
+        label_index = {label: i for i, label in enumerate(labels)}
+        cm = np.zeros((len(labels), len(labels)), dtype=np.int64)
+        chunk_stats = []
+
+        for X, y, slice_seconds in batches:
+            # Labels that the model never saw get their own row of the matrix
+            for label in np.unique(y):
+                if label not in label_index:
+                    label_index[label] = len(labels)
+                    labels.append(label)
+                    cm = np.pad(cm, ((0, 1), (0, 1)))
+
+            start = time.perf_counter()
+            y_pred = model.predict(X)
+            predict_seconds = time.perf_counter() - start
+
+            true_idx = np.fromiter((label_index[label] for label in y), dtype=np.int64, count=len(y))
+            pred_idx = np.fromiter((label_index[label] for label in y_pred), dtype=np.int64, count=len(y_pred))
+            np.add.at(cm, (true_idx, pred_idx), 1)
+
+            chunk_stats.append({
+                'rows': len(y),
+                'slice_seconds': slice_seconds,
+                'predict_seconds': predict_seconds,
+                'predict_rows_per_sec': len(y) / (slice_seconds + predict_seconds)
+            })
+            logger.debug(f"Evaluated chunk {len(chunk_stats)}: {len(y)} rows, {chunk_stats[-1]['predict_rows_per_sec']:.0f} rows/s")
+
+        # sklearn orders the report by sorted label
+        order = np.argsort(labels)
+        cm = cm[np.ix_(order, order)]
+        labels = [labels[i] for i in order]
+
+        report = report_from_confusion_matrix(cm, labels)
+        present = (cm.sum(axis=0) + cm.sum(axis=1)) > 0
+        cm = cm[np.ix_(present, present)]
+
+        logger.debug('Chunked model evaluation completed')
+        return report, cm, report['accuracy'], chunk_stats
+    except Exception as e:
+        logger.error('Error during chunked model evaluation: %s', e)
+        raise
+
+
+def evaluate_cascade(model, linear_model, threshold: float, n_text_features: int, batches,
+                     linear_temperature: float = 1.0) -> dict:
+    """Accuracy of the linear/LightGBM cascade against LightGBM alone over streamed batches."""
+    from model_creation.cascade import cascade_predict
+
     try:
-        # Predict and calculate classification metrics
-        y_pred = model.predict(X_test)
-        
-        # Calculate accuracy explicitly
-        accuracy = accuracy_score(y_test, y_pred)
-        
-        # Generate classification report and confusion matrix
-        report = classification_report(y_test, y_pred, output_dict=True)
-        cm = confusion_matrix(y_test, y_pred)
-        
-        logger.debug('Model evaluation completed')
-
-        return report, cm, accuracy
+        n_rows = n_fast = n_correct_model = n_correct_cascade = 0
+        for X, y, _ in batches:
+            cascade_pred, fast_mask = cascade_predict(linear_model, model, X, n_text_features, threshold, linear_temperature)
+            n_rows += len(y)
+            n_fast += int(fast_mask.sum())
+            n_correct_model += int((model.predict(X) == y).sum())
+            n_correct_cascade += int((cascade_pred == y).sum())
+
+        results = {
+            'cascade_threshold': threshold,
+            'cascade_fast_fraction': n_fast / n_rows if n_rows else 0.0,
+            'cascade_test_accuracy': n_correct_cascade / n_rows if n_rows else 0.0,
+            'cascade_accuracy_delta': (n_correct_cascade - n_correct_model) / n_rows if n_rows else 0.0
+        }
+        logger.debug(f'Cascade evaluation: {results}')
+        return results
     except Exception as e:
-        logger.error('Error during model evaluation: %s', e)
+        logger.error('Error during cascade evaluation: %s', e)
         raise
 
 
-def log_confusion_matrix(cm, dataset_name):
+def compare_feature_dtypes(model, X_test: sp.csr_matrix, X_reference: sp.csr_matrix, chunksize: int) -> dict:
+    """Predictions, memory and latency of the model on float64 vs float32 features of the test split.
+
+    The float32 side is the stored test features, the float64 side the same rows
+    built by the float64 twin of the vectorizer (test_float64.npz of the
+    featurize stage). Both are densified like in the API and scored by the same model.
+    """
+    try:
+        if X_reference.shape != X_test.shape:
+            raise ValueError(f"float64 reference features are {X_reference.shape}, the test features {X_test.shape}")
+        n_rows = X_test.shape[0]
+        n_mismatches = 0
+        nbytes = {'float64': 0, 'float32': 0}
+        seconds = {'float64': 0.0, 'float32': 0.0}
+        for start in range(0, n_rows, chunksize):
+            features = {
+                'float64': X_reference[start:start + chunksize].toarray(),
+                'float32': X_test[start:start + chunksize].toarray()
+            }
+            predictions = {}
+            for dtype, X in features.items():
+                begin = time.perf_counter()
+                predictions[dtype] = model.predict(X)
+                seconds[dtype] += time.perf_counter() - begin
+                nbytes[dtype] += X.nbytes
+            n_mismatches += int((predictions['float64'] != predictions['float32']).sum())
+
+        results = {
+            'dtype_n_rows': n_rows,
+            'dtype_n_mismatches': n_mismatches,
+            'dtype_mismatch_rate': n_mismatches / n_rows if n_rows else 0.0,
+            'dtype_float64_mb': nbytes['float64'] / (1024 * 1024),
+            'dtype_float32_mb': nbytes['float32'] / (1024 * 1024),
+            'dtype_float64_predict_seconds': seconds['float64'],
+            'dtype_float32_predict_seconds': seconds['float32']
+        }
+        logger.debug(f'Feature dtype comparison: {results}')
+        return results
+    except Exception as e:
+        logger.error('Error while comparing feature dtypes: %s', e)
+        raise
+
+
+# Run by serving_rss_mb in a fresh interpreter: argv = repo root, model, vectorizer, data, batch size
+SERVING_RSS_SCRIPT = """
+import sys, json, pickle, resource
+sys.path.insert(0, sys.argv[1])
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+def rss_mb():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+baseline = rss_mb()
+with open(sys.argv[2], 'rb') as f:
+    model = pickle.load(f)
+with open(sys.argv[3], 'rb') as f:
+    vectorizer = pickle.load(f)
+batch = pd.read_csv(sys.argv[4], nrows=int(sys.argv[5]))
+X_tfidf = vectorizer.transform(batch['clean_comment'].values)
+numerical = batch[%r].values
+model.predict(sp.hstack([X_tfidf, sp.csr_matrix(numerical, dtype=X_tfidf.dtype)], format='csr'))
+print(json.dumps({'baseline': baseline, 'peak': rss_mb()}))
+""" % NUMERICAL_FEATURES
+
+
+def serving_rss_mb(model_path: str, vectorizer_path: str, data_path: str, batch_size: int) -> dict:
+    """Peak RSS in MB of loading the model and vectorizer and scoring one batch, in a fresh process.
+
+    The evaluation process already holds the test features, mlflow and
+    matplotlib, so its own peak RSS says nothing about a serving process.
+    ``serving_rss_delta_mb`` excludes the interpreter and numpy/pandas/scipy.
+    """
+    repo_root = os.path.abspath(os.path.join(up(__file__), os.pardir))
+    result = subprocess.run(
+        [sys.executable, '-c', SERVING_RSS_SCRIPT, repo_root, model_path, vectorizer_path, data_path, str(batch_size)],
+        capture_output=True, text=True, check=True
+    )
+    rss = json.loads(result.stdout.strip().splitlines()[-1])
+    return {'serving_peak_rss_mb': rss['peak'], 'serving_rss_delta_mb': rss['peak'] - rss['baseline']}
+
+
+def profile_model_performance(model, model_path: str, vectorizer_path: str, data_path: str,
+                              batch_size: int = 1000, repeats: int = 50) -> dict:
+    """Measure the serving cost of the model next to its accuracy.
+
+    Single-row latency follows the /predict path (transform one comment, dense
+    row, predict) and batch latency the /batch_predict path (sparse batch, one
+    predict call). Latencies are in milliseconds, p50/p95 over ``repeats`` runs.
+    Memory is measured in a separate process (see serving_rss_mb).
+    """
+    try:
+        profile = {
+            'model_size_mb': os.path.getsize(model_path) / (1024 * 1024),
+            'vectorizer_size_mb': os.path.getsize(vectorizer_path) / (1024 * 1024)
+        }
+
+        start = time.perf_counter()
+        vectorizer = load_vectorizer(vectorizer_path)
+        profile['vectorizer_load_ms'] = (time.perf_counter() - start) * 1000
+
+        sample = pd.read_csv(data_path, nrows=batch_size)
+        batch = sample.iloc[np.arange(batch_size) % len(sample)]
+
+        timings = []
+        for i in range(repeats):
+            row = batch.iloc[[i % len(batch)]]
+            start = time.perf_counter()
+            X_tfidf = vectorizer.transform(row['clean_comment'].values).toarray()
+            model.predict(np.hstack([X_tfidf, row[NUMERICAL_FEATURES].values.astype(X_tfidf.dtype)]))
+            timings.append((time.perf_counter() - start) * 1000)
+        profile['single_row_latency_p50_ms'] = float(np.percentile(timings, 50))
+        profile['single_row_latency_p95_ms'] = float(np.percentile(timings, 95))
+
+        timings = []
+        for _ in range(max(1, repeats // 10)):
+            start = time.perf_counter()
+            model.predict(build_features(batch, vectorizer))
+            timings.append((time.perf_counter() - start) * 1000)
+        profile['batch_size'] = batch_size
+        profile['batch_latency_p50_ms'] = float(np.percentile(timings, 50))
+        profile['batch_latency_p95_ms'] = float(np.percentile(timings, 95))
+        profile['batch_rows_per_sec'] = batch_size / (profile['batch_latency_p50_ms'] / 1000)
+
+        profile.update(serving_rss_mb(model_path, vectorizer_path, data_path, batch_size))
+
+        logger.debug(f'Performance profile: {profile}')
+        return profile
+    except Exception as e:
+        logger.error('Error while profiling model performance: %s', e)
+        raise
+
+
+def check_performance_gates(profile: dict, gates: dict) -> list:
+    """Return the gates the profile exceeds; a gate ``max_<metric>`` set to null is disabled."""
+    violations = []
+    for gate, threshold in (gates or {}).items():
+        if threshold is None:
+            continue
+        metric = gate[len('max_'):]
+        if metric not in profile:
+            logger.warning(f'Unknown performance gate {gate}, ignored')
+            continue
+        if profile[metric] > threshold:
+            violations.append(f'{metric} = {profile[metric]:.3f} exceeds {threshold}')
+    return violations
+
+
+def log_confusion_matrix(cm, dataset_name, tracker: BufferedRunLogger):
     """Log confusion matrix as an artifact."""
     plt.figure(figsize=(8, 6))
     sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
@@ -103,16 +376,17 @@ def log_confusion_matrix(cm, dataset_name):
     # Save confusion matrix plot as a file and log it to MLflow
     cm_file_path = f'confusion_matrix_{dataset_name}.png'
     plt.savefig(cm_file_path)
-    mlflow.log_artifact(cm_file_path)
+    tracker.log_artifact(cm_file_path)
     plt.close()
 
-def save_model_info(run_id: str, artifact_path: str, file_path: str) -> None:
+def save_model_info(run_id: str, artifact_path: str, file_path: str, extra_info: dict = None) -> None:
     """Save the model run ID and artifact path to a JSON file.
     
     Args:
         run_id: MLflow run ID
         artifact_path: Relative artifact path (e.g., 'lgbm_model'), not the full S3 URI
         file_path: Path to save the JSON file
+        extra_info: Additional entries to report alongside (e.g., accuracy and tree count)
     """
     try:
         # Create a dictionary with the info you want to save
@@ -121,6 +395,7 @@ def save_model_info(run_id: str, artifact_path: str, file_path: str) -> None:
             'run_id': run_id,
             'model_path': artifact_path  # This should be just "lgbm_model", not the full S3 path
         }
+        model_info.update(extra_info or {})
         # Save the dictionary as a JSON file
         with open(file_path, 'w') as file:
             json.dump(model_info, file, indent=4)
@@ -131,45 +406,44 @@ def save_model_info(run_id: str, artifact_path: str, file_path: str) -> None:
 
 
 def main():
-    mlflow.set_tracking_uri("http://3.29.129.159:5000/")
+    from utilities import load_params
+
+    # Load parameters from YAML file
+    params = load_params('params.yaml')
+    tracking_uri = setup_tracking(params)
 
-    mlflow.set_experiment('dvc-pipeline-runs-2')
-    from utilities import load_params, load_data
-    
     with mlflow.start_run() as run:
+        # Params, metrics, tags and artifacts are sent in batches when the run ends
+        tracker = BufferedRunLogger(run.info.run_id, buffered=params.get('mlflow', {}).get('buffered', True))
         try:
-            # Load parameters from YAML file
-            params = load_params('params.yaml')
-
             # Log parameters
-            for key, value in params.items():
-                mlflow.log_param(key, value)
+            tracker.log_params(params)
             
             # Load model and vectorizer
             model = load_model('models/lgbm_model.pkl')
             vectorizer = load_vectorizer('models/tfidf_vectorizer.pkl')
 
-            # Load test data for signature inference
-            test_data = load_data('data/interim/test_processed.csv')
+            chunksize = params.get('model_evaluation', {}).get('chunksize', 5000)
+            # Raw test comments, for the serving latency profile and the float64 reference
+            test_path = SPLIT_PATHS['test']
 
-            # Prepare test data
-            X_test_tfidf = vectorizer.transform(test_data['clean_comment'].values)
-            X_test_tfidf = X_test_tfidf.toarray()
-            numerical_features = ['word_count', 'num_stop_words', 'num_chars', 'num_chars_cleaned']
-            X_test_numerical = test_data[numerical_features].values
-            X_test = np.hstack([X_test_tfidf, X_test_numerical])
-            
-            # print(X_test.shape)
-            y_test = test_data['category'].values
+            # Test features from the featurize stage, checked against the vectorizer the model is served with
+            schema = feature_schema(vectorizer)
+            test_split = load_split('test', expected_hash=schema['schema_hash'])
+            X_test, y_test = test_split['X'], test_split['y']
+            tracker.set_tag("feature_schema_hash", schema['schema_hash'])
+
+            # A few dense rows are enough for the signature and the input example
+            X_sample = X_test[:5].toarray()
 
-            # Create a DataFrame for signature inference (using first few rows as an example)
+            # Create a DataFrame for signature inference
             # Combine TF-IDF feature names with numerical feature names
             tfidf_feature_names = vectorizer.get_feature_names_out().tolist()
-            all_feature_names = tfidf_feature_names + numerical_features
-            input_example = pd.DataFrame(X_test[:5], columns=all_feature_names)
+            all_feature_names = tfidf_feature_names + NUMERICAL_FEATURES
+            input_example = pd.DataFrame(X_sample, columns=all_feature_names)
 
             # Infer the signature
-            signature = infer_signature(input_example, model.predict(X_test[:5]))
+            signature = infer_signature(input_example, model.predict(X_sample))
 
             # Log model to MLflow using sklearn.log_model
             # This properly registers the model with MLflow so it can be registered later
@@ -191,12 +465,16 @@ def main():
             artifact_path = "lgbm_model"  # This is the relative path within the run
             artifact_uri = mlflow.get_artifact_uri()  # Full S3 URI for logging purposes
             logger.debug(f'Model artifact URI: {artifact_uri}/{artifact_path}')
-            save_model_info(run.info.run_id, artifact_path, 'experiment_info.json')
             
             # Also log model pickle file and vectorizer as artifacts
             logger.debug('Logging additional artifacts...')
             # mlflow.log_artifact('models/lgbm_model.pkl')
-            mlflow.log_artifact('models/tfidf_vectorizer.pkl')
+            tracker.log_artifact('models/tfidf_vectorizer.pkl')
+            if os.path.exists('models/learning_curve.json'):
+                tracker.log_artifact('models/learning_curve.json')
+            # Served with the registered model (see load_registry_calibrator in app.py)
+            if os.path.exists('models/calibration.json'):
+                tracker.log_artifact('models/calibration.json')
             logger.debug('Additional artifacts logged')
             
             # Print model location for verification
@@ -207,8 +485,18 @@ def main():
             print(f"Model URI for registration: runs:/{run.info.run_id}/{artifact_path}")
             print(f"{'='*50}\n")
 
-            # Evaluate model and get metrics
-            report, cm, accuracy = evaluate_model(model, X_test, y_test)
+            # Evaluate model and get metrics, over the stored test features in sparse chunks
+            report, cm, accuracy, chunk_stats = evaluate_model_chunked(
+                model, iter_feature_batches(X_test, y_test, chunksize)
+            )
+
+            # Per-chunk and overall prediction throughput on the stored features
+            for step, stats in enumerate(chunk_stats):
+                tracker.log_metric("eval_chunk_predict_rows_per_sec", stats['predict_rows_per_sec'], step=step)
+            total_rows = sum(stats['rows'] for stats in chunk_stats)
+            total_seconds = sum(stats['slice_seconds'] + stats['predict_seconds'] for stats in chunk_stats)
+            tracker.log_metric("eval_predict_rows_per_sec", total_rows / total_seconds if total_seconds else 0.0)
+            tracker.log_metric("eval_n_chunks", len(chunk_stats))
 
             # Display accuracy in console
             print(f"\n{'='*50}")
@@ -216,28 +504,107 @@ def main():
             print(f"{'='*50}\n")
 
             # Log overall accuracy to MLflow
-            mlflow.log_metric("test_accuracy", accuracy)
+            tracker.log_metric("test_accuracy", accuracy)
+
+            # Report the achieved tree count (boosting rounds after early stopping)
+            n_estimators = int(model.n_estimators_)
+            n_trees = model.booster_.num_trees()
+            tracker.log_metric("n_estimators", n_estimators)
+            tracker.log_metric("n_trees", n_trees)
+            print(f"Boosting rounds: {n_estimators} ({n_trees} trees)")
+
+            # Serving cost of the model, checked against the latency/size budget
+            eval_params = params.get('model_evaluation', {})
+            profile = profile_model_performance(
+                model, 'models/lgbm_model.pkl', 'models/tfidf_vectorizer.pkl', test_path,
+                batch_size=eval_params.get('profile_batch_size', 1000),
+                repeats=eval_params.get('profile_repeats', 50)
+            )
+            violations = check_performance_gates(profile, eval_params.get('performance_gates'))
+            tracker.log_metrics({f"perf_{key}": value for key, value in profile.items()})
+            tracker.set_tag("performance_gates", "failed" if violations else "passed")
+
+            print(f"Single-row latency: {profile['single_row_latency_p50_ms']:.2f} ms (p95 {profile['single_row_latency_p95_ms']:.2f} ms)")
+            print(f"Batch of {profile['batch_size']}: {profile['batch_latency_p50_ms']:.2f} ms ({profile['batch_rows_per_sec']:.0f} rows/s)")
+            print(f"Model size: {profile['model_size_mb']:.2f} MB, serving peak RSS: {profile['serving_peak_rss_mb']:.0f} MB "
+                  f"(+{profile['serving_rss_delta_mb']:.0f} MB for model, vectorizer and one batch)")
+            for violation in violations:
+                logger.warning(f'Performance gate exceeded: {violation}')
+                print(f"✗ Performance gate exceeded: {violation}")
+
+            # float32 features must predict like float64 ones, at half the memory; registration
+            # is blocked past max_dtype_mismatch_rate of changed test predictions
+            X_reference = load_split('test_float64', expected_hash=schema['schema_hash'])['X']
+            dtype_results = compare_feature_dtypes(model, X_test, X_reference, chunksize)
+            del X_reference
+            dtype_gate_passed = dtype_results['dtype_mismatch_rate'] <= eval_params.get('max_dtype_mismatch_rate', 0.0)
+            tracker.log_metrics(dtype_results)
+            tracker.set_tag("feature_dtype", str(vectorizer.dtype))
+            tracker.set_tag("dtype_gate", "passed" if dtype_gate_passed else "failed")
+            print(f"Feature dtype {vectorizer.dtype}: float64 {dtype_results['dtype_float64_mb']:.0f} MB / "
+                  f"{dtype_results['dtype_float64_predict_seconds']:.2f} s, float32 {dtype_results['dtype_float32_mb']:.0f} MB / "
+                  f"{dtype_results['dtype_float32_predict_seconds']:.2f} s, "
+                  f"{dtype_results['dtype_n_mismatches']} / {dtype_results['dtype_n_rows']} predictions differ")
+            if not dtype_gate_passed:
+                logger.warning(f"{vectorizer.dtype} features change {dtype_results['dtype_mismatch_rate']:.4%} of the "
+                               f"test predictions against the float64 reference")
+                print(f"✗ Feature dtype gate exceeded: {dtype_results['dtype_mismatch_rate']:.4%} of the predictions differ")
+
+            # Share of the test set the fast linear tier answers, and what it costs in accuracy
+            cascade_results = {}
+            cascade_info = None
+            if os.path.exists('models/linear_model.pkl') and os.path.exists('models/cascade.json'):
+                with open('models/cascade.json', 'r') as file:
+                    cascade_info = json.load(file)
+            if cascade_info is not None and cascade_info.get('budget_met', True):
+                linear_model = load_model('models/linear_model.pkl')
+                cascade_results = evaluate_cascade(
+                    model, linear_model, cascade_info['threshold'], cascade_info['n_text_features'],
+                    iter_feature_batches(X_test, y_test, chunksize), cascade_info.get('linear_temperature', 1.0)
+                )
+                tracker.log_metrics(cascade_results)
+                print(f"Cascade: {cascade_results['cascade_fast_fraction']:.2%} answered by the linear model, "
+                      f"accuracy {cascade_results['cascade_test_accuracy']:.4f} ({cascade_results['cascade_accuracy_delta']:+.4f})")
+            elif cascade_info is not None:
+                print("Cascade: disabled, no threshold met the accuracy budget on validation")
+
+            save_model_info(run.info.run_id, artifact_path, 'experiment_info.json', {
+                'test_accuracy': accuracy,
+                'n_estimators': n_estimators,
+                'n_trees': n_trees,
+                'tracking_uri': tracking_uri,
+                'performance': profile,
+                'performance_gates_passed': not violations,
+                'performance_violations': violations,
+                'dtype_gate_passed': dtype_gate_passed,
+                'feature_dtype': str(vectorizer.dtype),
+                'feature_schema_hash': schema['schema_hash'],
+                **dtype_results,
+                **cascade_results
+            })
 
             # Log classification report metrics for the test data
             for label, metrics in report.items():
                 if isinstance(metrics, dict):
-                    mlflow.log_metrics({
+                    tracker.log_metrics({
                         f"test_{label}_precision": metrics['precision'],
                         f"test_{label}_recall": metrics['recall'],
                         f"test_{label}_f1-score": metrics['f1-score']
                     })
 
             # Log confusion matrix
-            log_confusion_matrix(cm, "Test Data")
+            log_confusion_matrix(cm, "Test Data", tracker)
 
             # Add important tags
-            mlflow.set_tag("model_type", "LightGBM")
-            mlflow.set_tag("task", "Sentiment Analysis")
-            mlflow.set_tag("dataset", "YouTube Comments")
+            tracker.set_tag("model_type", "LightGBM")
+            tracker.set_tag("task", "Sentiment Analysis")
+            tracker.set_tag("dataset", "YouTube Comments")
 
         except Exception as e:
             logger.error(f"Failed to complete model evaluation: {e}")
             print(f"Error: {e}")
+        finally:
+            tracker.flush()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
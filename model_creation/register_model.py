@@ -12,9 +12,7 @@ import json
 import mlflow
 import logging
 import os
-
-# Set up MLflow tracking URI
-mlflow.set_tracking_uri("http://3.29.129.159:5000/")
+from model_creation.mlflow_tracking import resolve_tracking_uri
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -94,10 +92,25 @@ def register_model(model_name: str, model_info: dict, alias: str = "staging"):
         raise
 
 def main():
+    from utilities import load_params
+
     try:
         model_info_path = 'experiment_info.json'
         model_info = load_model_info(model_info_path)
+
+        # Register on the backend the run was logged to (or synced to)
+        tracking_uri = model_info.get('tracking_uri') or resolve_tracking_uri(load_params('params.yaml'))
+        mlflow.set_tracking_uri(tracking_uri)
+        logger.debug(f'MLflow tracking URI: {tracking_uri}')
         
+        # The evaluation stage blocks models that exceed the serving latency/size budget
+        if model_info.get('performance_gates_passed') is False:
+            violations = '; '.join(model_info.get('performance_violations', []))
+            raise ValueError(f"Model exceeds the performance gates, not registering it: {violations}")
+        if model_info.get('dtype_gate_passed') is False:
+            raise ValueError(f"{model_info.get('feature_dtype')} features change {model_info.get('dtype_mismatch_rate', 0):.4%} "
+                             f"of the test predictions against float64, not registering the model")
+
         model_name = "yt_chrome_plugin_model"
         register_model(model_name, model_info)
     except Exception as e:
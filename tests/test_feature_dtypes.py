@@ -0,0 +1,69 @@
+import os, sys
+from os.path import dirname as up
+
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+lgb = pytest.importorskip('lightgbm')
+text = pytest.importorskip('sklearn.feature_extraction.text')
+for module in ('mlflow', 'matplotlib', 'seaborn', 'dotenv'):
+    pytest.importorskip(module)
+
+NUMERICAL_FEATURES = ['word_count', 'num_stop_words', 'num_chars', 'num_chars_cleaned']
+WORDS = {
+    -1: ['bad', 'boring', 'worst', 'awful', 'hate'],
+    0: ['video', 'today', 'watch', 'channel', 'part'],
+    1: ['great', 'love', 'best', 'amazing', 'nice']
+}
+
+
+def make_split(n_rows: int, seed: int) -> pd.DataFrame:
+    """Processed comments whose words lean towards their category."""
+    rng = np.random.default_rng(seed)
+    vocabulary = sum(WORDS.values(), [])
+    rows = []
+    for _ in range(n_rows):
+        category = int(rng.integers(-1, 2))
+        words = list(rng.choice(WORDS[category], size=rng.integers(1, 4))) + \
+            list(rng.choice(vocabulary, size=rng.integers(1, 6)))
+        comment = ' '.join(words)
+        rows.append({'clean_comment': comment, 'category': category, 'word_count': len(words),
+                     'num_stop_words': 0, 'num_chars': len(comment) + 3, 'num_chars_cleaned': len(comment)})
+    return pd.DataFrame(rows)
+
+
+def test_float32_features_predict_like_float64(tmp_path, monkeypatch):
+    """The float32 pipeline features give the same predictions as their float64 reference."""
+    monkeypatch.chdir(tmp_path)
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_DEFAULT_REGION'):
+        monkeypatch.setenv(name, os.environ.get(name, ''))
+    from model_creation.feature_store import featurize_split, float64_reference
+    from model_creation.model_evaluation import compare_feature_dtypes
+
+    train_data, test_data = make_split(1500, seed=0), make_split(500, seed=1)
+    test_path = str(tmp_path / 'test_processed.csv')
+    test_data.to_csv(test_path, index=False)
+
+    vectorizer = text.TfidfVectorizer(ngram_range=(1, 2), dtype=np.float32).fit(train_data['clean_comment'].values)
+    reference = float64_reference(vectorizer, train_data)
+    assert reference.vocabulary_ == vectorizer.vocabulary_
+    np.testing.assert_allclose(reference.idf_, vectorizer.idf_, rtol=1e-6)
+
+    X_test = featurize_split(test_path, vectorizer, 128)[0]
+    X_reference = featurize_split(test_path, reference, 128)[0]
+    assert X_test.dtype == np.float32 and X_reference.dtype == np.float64
+
+    train_path = str(tmp_path / 'train_processed.csv')
+    train_data.to_csv(train_path, index=False)
+    X_train, y_train, _ = featurize_split(train_path, vectorizer, 400)
+    model = lgb.LGBMClassifier(n_estimators=50, num_leaves=15, random_state=0, verbose=-1).fit(X_train, y_train)
+
+    results = compare_feature_dtypes(model, X_test, X_reference, chunksize=128)
+
+    assert results['dtype_n_rows'] == len(test_data)
+    assert results['dtype_n_mismatches'] == 0
+    assert results['dtype_mismatch_rate'] == 0.0
+    assert results['dtype_float32_mb'] == pytest.approx(results['dtype_float64_mb'] / 2)
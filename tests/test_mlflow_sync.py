@@ -0,0 +1,44 @@
+import os, sys
+from os.path import dirname as up
+
+sys.path.append(os.path.abspath(os.path.join(up(__file__), os.pardir)))
+
+import pytest
+
+mlflow = pytest.importorskip('mlflow')
+np = pytest.importorskip('numpy')
+linear_model = pytest.importorskip('sklearn.linear_model')
+
+import mlflow.sklearn
+from mlflow.models import infer_signature
+
+
+def test_synced_run_can_be_registered(tmp_path, monkeypatch):
+    """A run synced to another backend keeps its model, so register_model's runs:/ URI resolves there."""
+    monkeypatch.chdir(tmp_path)
+    from model_creation.mlflow_tracking import sync_run
+
+    source_uri = f"sqlite:///{tmp_path / 'source.db'}"
+    target_uri = f"sqlite:///{tmp_path / 'target.db'}"
+
+    X = np.array([[0.0, 1.0], [1.0, 0.0], [0.2, 0.9], [0.9, 0.1]])
+    y = np.array([0, 1, 0, 1])
+    model = linear_model.LogisticRegression().fit(X, y)
+
+    mlflow.set_tracking_uri(source_uri)
+    mlflow.set_experiment('sync-source')
+    with mlflow.start_run() as run:
+        mlflow.log_param('C', 1.0)
+        mlflow.log_metric('accuracy', 1.0)
+        mlflow.sklearn.log_model(sk_model=model, artifact_path='lgbm_model',
+                                 signature=infer_signature(X, model.predict(X)))
+
+    new_run_id = sync_run(run.info.run_id, source_uri, target_uri, 'sync-target', model_path='lgbm_model')
+
+    # Same URI as register_model.register_model, against the target only
+    mlflow.set_tracking_uri(target_uri)
+    version = mlflow.register_model(f"runs:/{new_run_id}/lgbm_model", 'synced-model')
+    registered = mlflow.sklearn.load_model(f"models:/synced-model/{version.version}")
+
+    np.testing.assert_array_equal(registered.predict(X), model.predict(X))
+    assert mlflow.get_run(new_run_id).data.params['C'] == '1.0'
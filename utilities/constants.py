@@ -9,3 +9,24 @@ RAW_DATA_PATH = "data/raw"
 INTERIM_DATA_PATH = "data/interim"
 PROCESSED_DATA_PATH = "data/processed"
 
+# Sentiment mapping, shared by the API (app.py) and the bulk scoring CLI (bulk_score.py)
+# Model output: 0=neutral, 1=positive, 2=negative
+# API output: 0=neutral, 1=positive, -1=negative
+SENTIMENT_MAP = {
+    0: 0,   # neutral
+    1: 1,   # positive
+    2: -1   # negative
+}
+
+SENTIMENT_LABELS = {
+    0: "neutral",
+    1: "positive",
+    -1: "negative"
+}
+
+# Column order of the probability matrices, and the sentiment of each column
+PROBABILITY_LABELS = ["negative", "neutral", "positive"]
+PROBABILITY_SENTIMENTS = [-1, 0, 1]
+
+# Trivial comments never reach the model, they are neutral with certainty
+TRIVIAL_PROBABILITIES = {"negative": 0.0, "neutral": 1.0, "positive": 0.0}